@@ -0,0 +1,95 @@
+"""Check that the CLI starts fast and leaves heavy dependencies unimported.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --runs 10 --budget-ms 150 --top 15
+
+Runs `python -m src.main --help` several times with -X importtime and
+reports the median wall time and the slowest top-level imports. Exits
+with status 1 if the median exceeds the budget or any module in
+HEAVY_MODULES was imported, so it can gate CI.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Startup budget for `python -m src.main --help`
+BUDGET_MS = 200
+
+# Modules that must only load when their feature is first used
+HEAVY_MODULES = (
+    'torch', 'whisperx', 'numpy', 'openai', 'tiktoken', 'sqlalchemy',
+    'yt_dlp', 'youtube_transcript_api'
+)
+
+def run_once(command):
+    """Run the command once; returns (wall seconds, -X importtime stderr)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + command,
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} exited with {result.returncode}:\n{result.stderr[-2000:]}")
+    return elapsed, result.stderr
+
+def parse_import_times(stderr):
+    """[(module, self us, cumulative us, nesting depth)] from -X importtime output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            depth = (len(name) - len(name.lstrip())) // 2
+            imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+        except ValueError:
+            continue
+    return imports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup and import time.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS)
+    parser.add_argument('--top', type=int, default=10, help="Slowest top-level imports to list")
+    parser.add_argument('--command', nargs='+', default=['-m', 'src.main', '--help'],
+                        help="Python arguments to time (default: -m src.main --help)")
+    args = parser.parse_args(argv)
+
+    # The first run warms the bytecode and file system caches
+    run_once(args.command)
+    times, stderr = [], ''
+    for _ in range(args.runs):
+        elapsed, stderr = run_once(args.command)
+        times.append(elapsed * 1000)
+
+    imports = parse_import_times(stderr)
+    heavy = sorted({name.split('.')[0] for name, _, _, _ in imports} & set(HEAVY_MODULES))
+    median = statistics.median(times)
+
+    print(f"python {' '.join(args.command)}")
+    print(f"Wall time over {args.runs} runs: median {median:.0f} ms, "
+          f"min {min(times):.0f} ms, max {max(times):.0f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"Import time: {sum(s for _, s, _, _ in imports) / 1000:.0f} ms in {len(imports)} modules")
+
+    top_level = sorted((i for i in imports if i[3] <= 1), key=lambda i: -i[2])[:args.top]
+    print(f"\n{'Module':<40} {'Cumulative (ms)':>16} {'Self (ms)':>10}")
+    for name, self_us, cumulative_us, _ in top_level:
+        print(f"{name:<40} {cumulative_us / 1000:>16.1f} {self_us / 1000:>10.1f}")
+
+    failed = False
+    if heavy:
+        print(f"\nHeavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"\nStartup is over budget by {median - args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
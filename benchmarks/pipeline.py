@@ -0,0 +1,407 @@
+"""Run the whole pipeline offline against fake YouTube, Whisper and OpenAI backends.
+
+    python -m benchmarks.pipeline
+    python -m benchmarks.pipeline --minutes 1 10 60 240 --videos 4 --whisper --llm-latency 0.5
+    python -m benchmarks.pipeline --json result.json
+    python -m benchmarks.pipeline --baseline result.json --tolerance 0.2
+
+Videos are synthetic: transcripts of the given lengths (about 150 words
+a minute, with the Whisper version differing from the auto transcript
+in a few words), or fixtures saved earlier with --save-fixtures and
+replayed with --fixtures. The fake extractors sleep for the configured
+latencies; completions come from the LLM stub server, run in-process.
+Everything is written to a scratch directory and database, so the run
+touches neither the network nor data/.
+
+Reports wall time, throughput in videos per minute, peak memory, time
+per stage and LLM tokens per video by transcript length. With
+--baseline, exits with status 1 if throughput, tokens per video or peak
+memory got worse than the baseline by more than the tolerance, so it can
+gate CI.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+# The stub server imports no project modules, so it can start before config is loaded
+from src.analyzers.llm_stub_server import StubLLM, _make_handler
+
+# Transcript lengths (minutes) benchmarked by default
+DEFAULT_MINUTES = (1, 10, 60)
+
+WORDS_PER_MINUTE = 150
+AUTO_SEGMENT_WORDS = 10      # youtube-transcript-api segments are a few seconds long
+WHISPER_SEGMENT_WORDS = 25
+WHISPER_DIFF_RATE = 0.02     # Fraction of words Whisper hears differently
+
+VOCABULARY = (
+    "the model data training network we can see that this is a very important result because "
+    "attention layer token gradient learning rate benchmark paper research question answer "
+    "people think about language vision robot agent policy reward compute memory latency "
+    "so basically what happens here is you take the input and you get the output right"
+).split()
+
+# Higher is better for these results; lower is better for the rest
+HIGHER_IS_BETTER = ('videos_per_minute',)
+COMPARED_RESULTS = ('videos_per_minute', 'tokens_per_video', 'peak_rss_mb')
+
+def synthetic_video(video_id, minutes, seed=0):
+    """A fixture for a video of `minutes` minutes: metadata and both transcripts."""
+    rng = random.Random(f"{seed}-{video_id}")
+    words = [rng.choice(VOCABULARY) for _ in range(int(minutes * WORDS_PER_MINUTE))]
+    seconds_per_word = 60 / WORDS_PER_MINUTE
+
+    auto_transcript = []
+    for i in range(0, len(words), AUTO_SEGMENT_WORDS):
+        chunk = words[i:i + AUTO_SEGMENT_WORDS]
+        auto_transcript.append({
+            'text': " ".join(chunk),
+            'start': round(i * seconds_per_word, 2),
+            'duration': round(len(chunk) * seconds_per_word, 2)
+        })
+
+    heard = [rng.choice(VOCABULARY) if rng.random() < WHISPER_DIFF_RATE else word for word in words]
+    segments = []
+    for i in range(0, len(heard), WHISPER_SEGMENT_WORDS):
+        chunk = heard[i:i + WHISPER_SEGMENT_WORDS]
+        segments.append({
+            'text': " " + " ".join(chunk),
+            'start': round(i * seconds_per_word, 2),
+            'end': round((i + len(chunk)) * seconds_per_word, 2),
+            'speaker': f"SPEAKER_0{(i // (WHISPER_SEGMENT_WORDS * 8)) % 2}"
+        })
+
+    return {
+        'id': video_id,
+        'minutes': minutes,
+        'metadata': {
+            'title': f"Synthetic video {video_id} ({minutes} min)",
+            'description': " ".join(rng.choice(VOCABULARY) for _ in range(120)),
+            'top_comments': [
+                {'author': f"viewer{n}", 'text': " ".join(rng.choice(VOCABULARY) for _ in range(20)),
+                 'like_count': 100 - n}
+                for n in range(5)
+            ]
+        },
+        'auto_transcript': auto_transcript,
+        'whisper_transcript': {
+            'text': ' '.join(s['text'] for s in segments),
+            'segments': segments
+        }
+    }
+
+def synthetic_videos(minutes, per_length, seed=0):
+    """`per_length` fixtures for each transcript length, with valid 11-character video IDs."""
+    lengths = [length for length in minutes for _ in range(per_length)]
+    return [synthetic_video(f"bench{n:06d}", length, seed) for n, length in enumerate(lengths)]
+
+def load_fixtures(path):
+    """Fixtures saved by save_fixtures (or recorded by hand, in the same shape)."""
+    return [json.loads(p.read_text(encoding='utf-8')) for p in sorted(Path(path).glob('*.json'))]
+
+def save_fixtures(videos, path):
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for video in videos:
+        (path / f"{video['id']}.json").write_text(json.dumps(video), encoding='utf-8')
+
+class FakeYouTubeExtractor:
+    """Stands in for YouTubeExtractor, answering from fixtures after `latency` seconds."""
+
+    def __init__(self, videos, latency=0.3):
+        self.videos = {video['id']: video for video in videos}
+        self.latency = latency
+        self.languages = ('en',)
+
+    def extract_video_id(self, url):
+        from src.extractors.youtube_extractor import parse_video_id
+        from src.metrics import metrics
+        with metrics.time('video_id'):
+            video_id = parse_video_id(url)
+        if video_id not in self.videos:
+            raise ValueError(f"No fixture for {url}")
+        return video_id
+
+    def get_info(self, url):
+        from src.extractors.youtube_extractor import parse_video_id
+        from src.metrics import metrics
+        video = self.videos[parse_video_id(url)]
+        with metrics.time('metadata', video['id']):
+            time.sleep(self.latency)
+        return {'id': video['id'], 'duration': video['minutes'] * 60,
+                'comments': video['metadata']['top_comments'], **video['metadata']}
+
+    def extract_metadata(self, url):
+        info = self.get_info(url)
+        return {'title': info['title'], 'description': info['description'], 'top_comments': info['comments']}
+
+    def get_auto_transcript(self, video_id):
+        from src.metrics import metrics
+        with metrics.time('auto_transcript', video_id):
+            time.sleep(self.latency)
+        return self.videos[video_id]['auto_transcript']
+
+    def prefetch_transcripts(self, video_ids):
+        pass
+
+    def forget(self, url_or_id):
+        pass
+
+    def close(self):
+        pass
+
+class FakeWhisperExtractor:
+    """Stands in for WhisperExtractor: downloads and transcribes at a given speed.
+
+    Audio is represented by the video ID, so the benchmark measures the
+    pipeline around Whisper, not decoded audio buffers.
+    """
+
+    def __init__(self, videos, download_latency=0.5, real_time_factor=0.002):
+        self.videos = {video['id']: video for video in videos}
+        self.download_latency = download_latency
+        self.real_time_factor = real_time_factor
+
+    def fetch_audio(self, url, info=None):
+        from src.metrics import metrics
+        with metrics.time('download'):
+            time.sleep(self.download_latency)
+        return {'url': url, 'audio': info['id'], 'work_dir': None}
+
+    def release_audio(self, audio_job):
+        pass
+
+    def transcribe_audio(self, audio):
+        from src.metrics import metrics
+        video = self.videos[audio]
+        with metrics.time('transcribe'):
+            time.sleep(video['minutes'] * 60 * self.real_time_factor)
+        return video['whisper_transcript']
+
+    def get_whisper_transcript(self, url, info=None):
+        audio_job = self.fetch_audio(url, info)
+        return self.transcribe_audio(audio_job['audio'])
+
+def start_llm_stub(latency, requests_per_minute=None, tokens_per_minute=None):
+    """Serve the LLM stub on a free local port from a background thread; returns (server, stub)."""
+    stub = StubLLM(
+        requests_per_minute=requests_per_minute or 10 ** 9,
+        tokens_per_minute=tokens_per_minute or 10 ** 12,
+        latency=latency
+    )
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(stub))
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server, stub
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def run(videos, args, work_dir):
+    """Analyze every fixture once; returns the results dict."""
+    server, stub = start_llm_stub(args.llm_latency, args.rpm, args.tpm)
+    # config reads these when first imported, which happens below
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+    os.environ['DATABASE_URL'] = f"sqlite:///{work_dir / 'videos.db'}"
+    # Reports go to OUTPUT_DIR, relative to the working directory
+    os.chdir(work_dir)
+
+    from src.main import YouTubeAnalyzer
+    from src.analyzers.async_client import AsyncLLMClient
+    from src.analyzers.budget import TokenBudget
+    from src.metrics import metrics, read_trace
+
+    budget = TokenBudget(
+        run_id=f"bench-{int(time.time())}", video_tokens=None, minute_tokens=None,
+        video_cost=None, policy='skip'
+    )
+    trace_path = work_dir / 'trace.jsonl'
+    analyzer = YouTubeAnalyzer(
+        interactive=False, use_cache=False, whisper_server=None, budget=budget,
+        stream=args.stream, trace_path=trace_path, metrics_port=None
+    )
+    analyzer.yt_extractor = FakeYouTubeExtractor(videos, args.youtube_latency)
+    analyzer.whisper_extractor = FakeWhisperExtractor(videos, args.download_latency, args.whisper_rtf)
+    # Limits are the stub's to enforce (--rpm/--tpm); none by default
+    analyzer.analyzer.llm = AsyncLLMClient(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+
+    if args.trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        results = analyzer.analyze_many(
+            [f"https://www.youtube.com/watch?v={video['id']}" for video in videos],
+            use_whisper=args.whisper,
+            transcript_workers=args.transcript_workers,
+            analysis_workers=args.analysis_workers
+        )
+    finally:
+        elapsed = time.perf_counter() - start
+        python_peak = None
+        if args.trace_memory:
+            python_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        analyzer.close()
+        server.shutdown()
+        server.server_close()
+
+    # Tokens per video, grouped by transcript length
+    tokens = defaultdict(lambda: defaultdict(float))
+    for event in read_trace(trace_path, budget.run_id):
+        if event.get('type') == 'count' and event['name'].startswith('llm_') \
+                and event['name'].endswith('_tokens'):
+            tokens[event.get('video')][event['name']] += event['value']
+    by_length = {}
+    for video in videos:
+        entry = by_length.setdefault(video['minutes'], {'videos': 0, 'prompt': 0.0, 'completion': 0.0})
+        entry['videos'] += 1
+        entry['prompt'] += tokens[video['id']]['llm_prompt_tokens']
+        entry['completion'] += tokens[video['id']]['llm_completion_tokens']
+    for entry in by_length.values():
+        entry['prompt'] /= entry['videos']
+        entry['completion'] /= entry['videos']
+
+    completed = len(results['completed'])
+    total_tokens = sum(sum(counts.values()) for counts in tokens.values())
+    return {
+        'videos': len(videos),
+        'completed': completed,
+        'failed': len(results['failed']),
+        'wall_seconds': elapsed,
+        'videos_per_minute': completed / elapsed * 60 if elapsed else 0.0,
+        'tokens_per_video': total_tokens / completed if completed else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'python_peak_mb': python_peak,
+        'llm_requests': stub.counts['ok'],
+        'stages': {stage: {'runs': runs, 'total': total, 'mean': total / runs}
+                   for stage, (runs, total) in metrics.stage_totals().items()},
+        'by_length': {str(minutes): entry for minutes, entry in sorted(by_length.items())},
+    }
+
+def format_report(result, args):
+    lengths = ", ".join(f"{minutes} min" for minutes in result['by_length'])
+    lines = [
+        "",
+        f"Pipeline benchmark: {result['videos']} videos ({lengths}), "
+        f"Whisper {'on' if args.whisper else 'off'}, stream {'on' if args.stream else 'off'}, "
+        f"LLM latency {args.llm_latency:.2f}s",
+        f"{result['completed']} completed, {result['failed']} failed in {result['wall_seconds']:.1f}s: "
+        f"{result['videos_per_minute']:.1f} videos/min, {result['llm_requests']} LLM requests",
+        f"Peak RSS {result['peak_rss_mb']:.0f} MB"
+        + (f", Python allocations peak {result['python_peak_mb']:.0f} MB"
+           if result['python_peak_mb'] is not None else ""),
+        "",
+        f"{'Stage':<20} {'Runs':>6} {'Total (s)':>10} {'Mean (s)':>9}",
+    ]
+    for stage, s in result['stages'].items():
+        lines.append(f"{stage:<20} {s['runs']:>6} {s['total']:>10.2f} {s['mean']:>9.3f}")
+    lines += ["", f"{'Minutes':>8} {'Videos':>7} {'Prompt tokens/video':>20} {'Completion tokens/video':>24}"]
+    for minutes, entry in result['by_length'].items():
+        lines.append(f"{minutes:>8} {entry['videos']:>7} {entry['prompt']:>20,.0f} {entry['completion']:>24,.0f}")
+    return "\n".join(lines)
+
+def compare(result, baseline, tolerance):
+    """Regressions beyond `tolerance` (a fraction) against a baseline result, as messages."""
+    regressions = []
+    for name in COMPARED_RESULTS:
+        old, new = baseline.get(name), result.get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if name in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append(f"{name}: {old:,.1f} -> {new:,.1f} ({change:+.0%})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline with fake backends.")
+    parser.add_argument('--minutes', type=float, nargs='+', default=DEFAULT_MINUTES,
+                        help="Synthetic transcript lengths in minutes")
+    parser.add_argument('--videos', type=int, default=2, help="Videos per transcript length")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fixtures', metavar='DIR', help="Replay fixtures from DIR instead of synthesizing")
+    parser.add_argument('--save-fixtures', metavar='DIR', help="Save the synthetic fixtures to DIR and exit")
+    parser.add_argument('--whisper', action='store_true', help="Include the (fake) Whisper stage")
+    parser.add_argument('--stream', action='store_true', help="Stream completions")
+    parser.add_argument('--youtube-latency', type=float, default=0.3,
+                        help="Seconds per metadata or transcript request")
+    parser.add_argument('--download-latency', type=float, default=0.5, help="Seconds per audio download")
+    parser.add_argument('--whisper-rtf', type=float, default=0.002,
+                        help="Transcription seconds per second of audio")
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="Seconds per completion")
+    parser.add_argument('--rpm', type=int, default=None, help="LLM requests per minute (default unlimited)")
+    parser.add_argument('--tpm', type=int, default=None, help="LLM tokens per minute (default unlimited)")
+    parser.add_argument('--transcript-workers', type=int, default=4)
+    parser.add_argument('--analysis-workers', type=int, default=4)
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Also measure peak Python allocations (slows the run down)")
+    parser.add_argument('--json', metavar='FILE', help="Write the results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="Results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed regression against the baseline, as a fraction")
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch directory")
+    args = parser.parse_args(argv)
+
+    if args.fixtures:
+        videos = load_fixtures(args.fixtures)
+    else:
+        minutes = [int(m) if float(m).is_integer() else m for m in args.minutes]
+        videos = synthetic_videos(minutes, args.videos, args.seed)
+    if args.save_fixtures:
+        save_fixtures(videos, args.save_fixtures)
+        print(f"Saved {len(videos)} fixtures to {args.save_fixtures}")
+        return 0
+    if not videos:
+        print("No videos to benchmark")
+        return 1
+
+    # Resolved before the benchmark changes directory
+    json_path = Path(args.json).resolve() if args.json else None
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+
+    cwd = os.getcwd()
+    work_dir = Path(tempfile.mkdtemp(prefix="yta-bench-"))
+    try:
+        result = run(videos, args, work_dir)
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"Scratch directory kept at {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(format_report(result, args))
+    if json_path:
+        json_path.write_text(json.dumps(result, indent=2))
+
+    failed = result['failed'] > 0
+    if baseline is not None:
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for message in regressions:
+                print(f"  {message}")
+            failed = True
+        else:
+            print(f"\nNo regressions against {args.baseline}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
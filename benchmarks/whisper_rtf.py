@@ -0,0 +1,94 @@
+"""Compare Whisper compute profiles by real-time factor and accuracy.
+
+    python -m benchmarks.whisper_rtf sample.wav --model medium
+    python -m benchmarks.whisper_rtf sample.wav --profiles cpu-int8 cpu-int8_float32 --reference ref.txt
+    python -m benchmarks.whisper_rtf podcast.wav --vad
+
+RTF is transcription time divided by audio duration (lower is faster).
+With --vad, each profile also transcribes the speech-only audio left by
+voice activity detection; its RTF is still relative to the full audio,
+and VAD time is included.
+Word error rate is measured against --reference when given, otherwise
+against the first profile's output.
+"""
+import argparse
+import sys
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import WHISPER_MODEL, detect_device
+from src.extractors.vad import detect_speech
+from src.extractors.whisper_extractor import WhisperExtractor
+from src.extractors.whisper_profiles import profiles_for_device
+
+SAMPLE_RATE = 16000
+
+def word_error_rate(reference, hypothesis):
+    """Approximate WER from a word-level diff (substitutions + insertions + deletions)."""
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    errors = 0
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, ref, hyp, autojunk=False).get_opcodes():
+        if tag != 'equal':
+            errors += max(i2 - i1, j2 - j1)
+    return errors / len(ref)
+
+def run_profile(audio_file, model_name, profile, batch_size, threads, vad=False):
+    extractor = WhisperExtractor(model_name, profile, batch_size=batch_size, threads=threads)
+    start = time.time()
+    extractor._load_models()
+    load_time = time.time() - start
+
+    audio = extractor._whisperx.load_audio(audio_file)
+    duration = len(audio) / SAMPLE_RATE
+
+    start = time.time()
+    if vad:
+        audio = detect_speech(audio, SAMPLE_RATE).compact(audio)
+    result = extractor.model.transcribe(audio, batch_size=extractor.profile['batch_size'])
+    elapsed = time.time() - start
+
+    return {
+        'profile': profile + (" +vad" if vad else ""),
+        'load_time': load_time,
+        'transcribe_time': elapsed,
+        'rtf': elapsed / duration if duration else 0.0,
+        'text': " ".join(s['text'].strip() for s in result['segments'])
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Whisper compute profiles.")
+    parser.add_argument('audio', help="Audio file to transcribe")
+    parser.add_argument('--model', default=WHISPER_MODEL)
+    parser.add_argument('--profiles', nargs='+', default=profiles_for_device(detect_device()))
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--reference', help="Text file with a reference transcript")
+    parser.add_argument('--vad', action='store_true',
+                        help="Also run each profile on the speech-only audio")
+    args = parser.parse_args(argv)
+
+    reference = Path(args.reference).read_text() if args.reference else None
+    results = []
+    for profile in args.profiles:
+        print(f"Running {profile}...")
+        results.append(run_profile(args.audio, args.model, profile, args.batch_size, args.threads))
+        if args.vad:
+            results.append(run_profile(args.audio, args.model, profile, args.batch_size, args.threads, vad=True))
+
+    if reference is None and results:
+        reference = results[0]['text']
+
+    print(f"\nModel: {args.model}  Device: {detect_device()}")
+    print(f"{'Profile':<24} {'Load (s)':>9} {'Transcribe (s)':>15} {'RTF':>7} {'WER':>7}")
+    for r in results:
+        wer = word_error_rate(reference, r['text'])
+        print(f"{r['profile']:<24} {r['load_time']:>9.1f} {r['transcribe_time']:>15.1f} {r['rtf']:>7.3f} {wer:>7.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import os
 from dotenv import load_dotenv
 from pathlib import Path
-import torch
+from functools import lru_cache
 
 load_dotenv()
 
@@ -20,12 +20,124 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 # Default settings
 DEFAULT_VIEWER_PROFILE = "the average humanist/idealist AI technology and enthusiast"
 
+# Comment settings
+TOP_COMMENTS = 5            # Number of comments kept per video
+MAX_COMMENTS = 500          # Cap on comments fetched from YouTube (0 disables comments)
+COMMENT_SORT = "top"        # "top" or "new"
+
+# YouTube transcripts: the first language with captions wins, manual captions before auto-generated
+TRANSCRIPT_LANGUAGES = tuple(os.getenv('TRANSCRIPT_LANGUAGES', 'en').split(','))  # e.g. "en,en-GB,de"
+TRANSCRIPT_WORKERS = 8              # Transcripts fetched at the same time (one shared HTTP session)
+TRANSCRIPT_MAX_RETRIES = 4
+TRANSCRIPT_BACKOFF_BASE = 1.0       # Seconds before the first retry; doubles each retry, with jitter
+TRANSCRIPT_BACKOFF_MAX = 30.0
+TRANSCRIPT_CACHE_PATH = DATA_DIR / 'transcripts.db'  # Raw transcripts by video ID and language
+TRANSCRIPT_RECHECK_TTL = 24 * 3600  # Seconds a choice short of manual captions in the first language is trusted
+
 # Whisper settings
-WHISPER_MODEL = "large-v3"
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', "large-v3")  # e.g. "medium", "small" or "distil-large-v3" for CPU
+WHISPER_DEVICE = os.getenv('WHISPER_DEVICE')  # "cuda" or "cpu"; None detects it on first use
+WHISPER_COMPUTE_PROFILE = os.getenv('WHISPER_COMPUTE_PROFILE')  # None picks the device default
+WHISPER_BATCH_SIZE = int(os.getenv('WHISPER_BATCH_SIZE', 0)) or None  # None uses the profile's value
+WHISPER_THREADS = int(os.getenv('WHISPER_THREADS', 0)) or None        # None uses every CPU core
+WHISPER_STREAM_AUDIO = True          # Decode audio into memory instead of downloading a WAV
+WHISPER_MEMMAP_SECONDS = 2 * 3600    # Longer audio is memory-mapped from a raw sample file
+TEMP_AUDIO_DIR = PROJECT_ROOT / 'temp_audio_files'  # Each Whisper job gets its own subdirectory
+
+# Voice activity detection before Whisper: long silences, intros and music beds are cut
+# out once, and transcription, alignment and diarization run on the speech only
+WHISPER_VAD = os.getenv('WHISPER_VAD', '1') != '0'
+WHISPER_VAD_THRESHOLD = 0.5     # Speech probability above which audio counts as speech
+WHISPER_VAD_MIN_SILENCE = 2.0   # Seconds of non-speech before it is cut out
+WHISPER_VAD_PAD = 0.4           # Seconds kept around each speech region
+WHISPER_VAD_GAP = 0.5           # Seconds of silence left between joined speech regions
+WHISPER_VAD_MIN_SAVING = 0.05   # Fraction of the audio that must be cut to use the speech-only buffer
+
+# Resident Whisper server (python -m src.extractors.whisper_server);
+# when WHISPER_SERVER_URL is set, analyzers send Whisper jobs there
+WHISPER_SERVER_HOST = "127.0.0.1"
+WHISPER_SERVER_PORT = 8765
+WHISPER_SERVER_URL = os.getenv('WHISPER_SERVER_URL')
 
 # Output settings
 OUTPUT_DIR = "output"
+TRANSCRIPT_FORMATS = ("md", "srt", "vtt", "jsonl")  # Files written per video: transcript.<format>
 
 # Add to existing config.py
-MAX_TOKENS_THRESHOLD = 1000  # Adjust this value as needed 
\ No newline at end of file
+MAX_TOKENS_THRESHOLD = 1000  # Adjust this value as needed
+
+# Long transcripts are corrected in windows of this many prompt tokens
+CHUNK_MAX_TOKENS = 3000
+CHUNK_OVERLAP_SECONDS = 15   # Preceding context given to each window
+CHUNK_CONCURRENCY = 4        # Windows sent to the API at the same time
+LLM_REQUESTS_PER_MINUTE = 60
+LLM_TOKENS_PER_MINUTE = 150000
+
+# Async OpenAI client: one connection pool, token bucket and retry policy
+# shared by every request. OPENAI_BASE_URL can point at a local stub server
+# (python -m src.analyzers.llm_stub_server) for testing without API access
+LLM_ASYNC = True
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')
+LLM_MAX_CONNECTIONS = 64     # Size of the keep-alive pool, and requests in flight
+LLM_MAX_RETRIES = 6
+LLM_BACKOFF_BASE = 1.0       # Seconds before the first retry; doubles each retry, with jitter
+LLM_BACKOFF_MAX = 60.0
+LLM_TIMEOUT = 120.0          # Seconds per request
+
+# Token and cost budgets for LLM calls (None disables a limit). Spend is
+# recorded in the database, so limits hold across workers and processes
+BUDGET_VIDEO_TOKENS = 200000    # Per video, within one run
+BUDGET_RUN_TOKENS = None        # Per run (all videos)
+BUDGET_MINUTE_TOKENS = 150000   # Across everything sharing the database, per rolling minute
+BUDGET_VIDEO_COST = 2.00        # USD per video, within one run
+BUDGET_RUN_COST = None          # USD per run
+BUDGET_POLICY = "defer"         # Over budget: "skip", "truncate", "chunk" or "defer"
+MODEL_PRICES = {                # USD per 1K prompt / completion tokens
+    "gpt-4-1106-preview": (0.01, 0.03),
+}
+
+# OpenAI Batch API (--batch-api): requests are submitted as JSONL files and
+# answered within the completion window at a discount
+BATCH_API_DIR = DATA_DIR / 'batches'         # JSONL request and result files
+BATCH_API_POLL_SECONDS = 60
+BATCH_API_COMPLETION_WINDOW = "24h"
+BATCH_API_MAX_REQUESTS = 50000               # Per batch file (API limit)
+BATCH_API_MAX_BYTES = 190 * 1024 * 1024      # Per batch file (API limit is 200 MB)
+BATCH_API_PRICE_FACTOR = 0.5                 # Batch price relative to MODEL_PRICES
+BATCH_API_MAX_ROUNDS = 4                     # Submit rounds before leftover videos are left waiting
+
+# Playlist/channel sync (python -m src.main --sync sources.txt)
+SYNC_PAGE_SIZE = 25          # New videos processed per pipeline run
+SYNC_INITIAL_LIMIT = 50      # Newest uploads taken from a channel on its first sync (None takes all)
+SYNC_MAX_SCAN = 1000         # Most entries listed per source and poll
+SYNC_MARK_IDS = 20           # IDs kept from the top of each listing as the source's mark
+SYNC_MAX_ATTEMPTS = 3        # Syncs that try a failing video before giving up on it
+SYNC_WORKERS = 16            # Sources listed at the same time
+
+# Metrics: per-stage timings and counters (python -m src.metrics summarizes the trace)
+METRICS_TRACE_PATH = DATA_DIR / 'trace.jsonl'  # JSONL trace of every stage run; None disables it
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0)) or None  # Prometheus /metrics endpoint; None disables it
+
+# LLM response cache
+LLM_CACHE_PATH = DATA_DIR / 'llm_cache.db'
+LLM_CACHE_TTL = 30 * 24 * 3600          # Seconds before a cached response expires
+LLM_CACHE_MAX_BYTES = 500 * 1024 * 1024  # Least recently used responses are evicted past this
+
+@lru_cache(maxsize=None)
+def detect_device():
+    """The Whisper device: WHISPER_DEVICE, else "cuda" if torch sees a GPU, else "cpu".
+
+    Importing torch takes seconds, so it only happens here, the first time
+    a Whisper model is actually needed.
+    """
+    if WHISPER_DEVICE:
+        return WHISPER_DEVICE
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def __getattr__(name):
+    # `from config import DEVICE` still works, detecting the device when asked
+    if name == 'DEVICE':
+        return detect_device()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,179 @@
+import re
+from difflib import SequenceMatcher
+
+# Seconds of both transcripts diffed per step, and at most this many words of either;
+# keeps the matcher near-linear on multi-hour transcripts
+DIFF_WINDOW = 120.0
+DIFF_BLOCK = 400
+# Agreeing runs shorter than this between two disagreements are merged into them
+MIN_AGREEMENT = 3
+# Words of agreed text shown around each disagreement
+CONTEXT_WORDS = 8
+
+def _normalize(word):
+    return re.sub(r"[^\w']", '', word.lower()) or word
+
+def _words(segments, end_key):
+    """Expand segments into words with times interpolated across each segment."""
+    words = []
+    for index, segment in enumerate(segments or []):
+        tokens = str(segment['text']).split()
+        if not tokens:
+            continue
+        start = float(segment.get('start', 0))
+        if end_key == 'duration':
+            end = start + float(segment.get('duration', 0))
+        else:
+            end = float(segment.get('end', start))
+        step = (end - start) / len(tokens)
+        for n, token in enumerate(tokens):
+            words.append({
+                'text': token,
+                'norm': _normalize(token),
+                'start': start + n * step,
+                'end': start + (n + 1) * step,
+                'speaker': segment.get('speaker'),
+                'segment': index
+            })
+    return words
+
+def _window_end(words, start, limit, block):
+    """Index just past the words from `start` that begin before `limit`, at most `block` of them."""
+    end, last = start, min(len(words), start + block)
+    while end < last and words[end]['start'] < limit:
+        end += 1
+    return end
+
+def _opcodes(a_words, b_words, block=DIFF_BLOCK, window=DIFF_WINDOW):
+    """difflib opcodes for two long timed word lists, computed window by window.
+
+    Each step diffs the words of both lists that start in the same time
+    window (at most `block` of either) and commits everything up to the
+    last solid match, then continues from there, so the cost grows
+    linearly with length instead of quadratically. A window without any
+    match is committed whole: both sides then stand at the same time, so
+    a stretch only one side has (an uncaptioned section, a sponsor read)
+    is passed over on that side alone and the two stay in step.
+    """
+    a, b = [w['norm'] for w in a_words], [w['norm'] for w in b_words]
+    ops = []
+    i = j = 0
+    while i < len(a) or j < len(b):
+        now = min(words[n]['start'] for words, n in ((a_words, i), (b_words, j)) if n < len(words))
+        limit = now + window
+        a_end, b_end = _window_end(a_words, i, limit, block), _window_end(b_words, j, limit, block)
+        # A side cut short by `block` ends the window for both
+        for words, end in ((a_words, a_end), (b_words, b_end)):
+            if end < len(words) and words[end]['start'] < limit:
+                limit = words[end]['start']
+        if limit > now:
+            a_end, b_end = _window_end(a_words, i, limit, block), _window_end(b_words, j, limit, block)
+
+        codes = SequenceMatcher(None, a[i:a_end], b[j:b_end], autojunk=False).get_opcodes()
+        if not (a_end == len(a) and b_end == len(b)):
+            # Commit through the last match long enough to be a reliable anchor
+            anchors = [n for n, c in enumerate(codes) if c[0] == 'equal' and c[2] - c[1] >= MIN_AGREEMENT]
+            if anchors:
+                codes = codes[:anchors[-1] + 1]
+
+        for tag, i1, i2, j1, j2 in codes:
+            ops.append((tag, i + i1, i + i2, j + j1, j + j2))
+        i, j = i + codes[-1][2], j + codes[-1][4]
+    return _merge_ops(ops)
+
+def _merge_ops(ops):
+    """Fold adjacent disagreements, and short agreements between them, together."""
+    merged = []
+    for op in ops:
+        if merged and op[0] != 'equal' and merged[-1][0] != 'equal':
+            prev = merged.pop()
+            op = ('replace', prev[1], op[2], prev[3], op[4])
+        elif (len(merged) >= 2 and op[0] != 'equal' and merged[-1][0] == 'equal'
+              and merged[-1][2] - merged[-1][1] < MIN_AGREEMENT and merged[-2][0] != 'equal'):
+            merged.pop()
+            prev = merged.pop()
+            op = ('replace', prev[1], op[2], prev[3], op[4])
+        merged.append(op)
+    return merged
+
+def align_transcripts(auto_segments, whisper_segments):
+    """Align auto and Whisper segments locally and mark where they disagree.
+
+    Returns a list of time-ordered units. Agreeing units hold the Whisper
+    wording (it keeps punctuation and casing) and are split at Whisper
+    segment boundaries; disagreeing units hold both versions of the
+    disputed words plus a few words of context on each side.
+    """
+    auto_words = _words(auto_segments, 'duration')
+    whisper_words = _words(whisper_segments, 'end')
+    ops = _opcodes(auto_words, whisper_words)
+
+    units = []
+    for tag, i1, i2, j1, j2 in ops:
+        if tag == 'equal':
+            run = whisper_words[j1:j2]
+            start = 0
+            for n in range(1, len(run) + 1):
+                if n == len(run) or run[n]['segment'] != run[start]['segment']:
+                    piece = run[start:n]
+                    units.append({
+                        'agree': True,
+                        'text': " ".join(w['text'] for w in piece),
+                        'start': piece[0]['start'],
+                        'end': piece[-1]['end'],
+                        'speaker': piece[0]['speaker'],
+                        'segment': piece[0]['segment']
+                    })
+                    start = n
+            continue
+
+        disputed = auto_words[i1:i2] + whisper_words[j1:j2]
+        anchor = whisper_words[j1] if j1 < len(whisper_words) else (whisper_words[-1] if whisper_words else None)
+        units.append({
+            'agree': False,
+            'auto': " ".join(w['text'] for w in auto_words[i1:i2]),
+            'whisper': " ".join(w['text'] for w in whisper_words[j1:j2]),
+            'before': " ".join(w['text'] for w in whisper_words[max(0, j1 - CONTEXT_WORDS):j1]),
+            'after': " ".join(w['text'] for w in whisper_words[j2:j2 + CONTEXT_WORDS]),
+            'start': min(w['start'] for w in disputed),
+            'end': max(w['end'] for w in disputed),
+            'speaker': anchor['speaker'] if anchor else None,
+            'segment': anchor['segment'] if anchor else 0
+        })
+    return units
+
+def disagreements(units):
+    """The units the two sources disagree on."""
+    return [unit for unit in units if not unit['agree']]
+
+def build_segments(units, resolutions):
+    """Turn aligned units into corrected segments, one per Whisper segment.
+
+    `resolutions` maps the index of a disagreeing unit to its corrected
+    text; unresolved disagreements fall back to the Whisper wording.
+    """
+    segments = []
+    for index, unit in enumerate(units):
+        if unit['agree']:
+            text = unit['text']
+        else:
+            text = resolutions.get(index)
+            if text is None:
+                text = unit['whisper'] or unit['auto']
+        text = text.strip()
+        if not text:
+            continue
+        if segments and segments[-1]['segment'] == unit['segment']:
+            segments[-1]['text'] += " " + text
+            segments[-1]['end'] = max(segments[-1]['end'], unit['end'])
+        else:
+            segments.append({
+                'text': text,
+                'start': unit['start'],
+                'end': unit['end'],
+                'speaker': unit['speaker'],
+                'segment': unit['segment']
+            })
+    for segment in segments:
+        del segment['segment']
+    return segments
@@ -0,0 +1,303 @@
+import asyncio
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_CONNECTIONS, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_TIMEOUT
+)
+
+# Statuses worth retrying; anything else (bad request, auth) fails at once
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+def parse_duration(value):
+    """Seconds in a rate-limit header value such as '20ms', '1s', '6m0s' or '2.5'."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    parts = re.findall(r'([\d.]+)(ms|s|m|h)', value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+class TokenBucket:
+    """Requests-per-minute and tokens-per-minute limiter for one event loop.
+
+    Both buckets refill continuously at their per-minute rate; acquire()
+    waits until a request slot and the estimated tokens are available.
+    The provider's x-ratelimit-* response headers correct the local view:
+    when they report less headroom than the bucket holds, the bucket drops
+    to match, and an exhausted limit pauses everyone until its reset time.
+    A falsy limit disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.capacity = {'requests': requests_per_minute, 'tokens': tokens_per_minute}
+        self.level = {name: float(limit or 0) for name, limit in self.capacity.items()}
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        # Created on first use, inside the loop that will own it
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self.updated = now - self.updated, now
+        for name, limit in self.capacity.items():
+            if limit:
+                self.level[name] = min(limit, self.level[name] + elapsed * limit / 60)
+
+    async def acquire(self, tokens=0):
+        """Wait for room for one request of about `tokens` tokens, then take it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                need = {'requests': 1, 'tokens': min(tokens, self.capacity['tokens'] or 0)}
+                wait = self.blocked_until - time.monotonic()
+                for name, amount in need.items():
+                    limit = self.capacity[name]
+                    if limit and self.level[name] < amount:
+                        wait = max(wait, (amount - self.level[name]) * 60 / limit)
+                if wait <= 0:
+                    for name, amount in need.items():
+                        self.level[name] -= amount
+                    return
+                await asyncio.sleep(wait)
+
+    def reconcile(self, estimated, actual):
+        """Correct the token bucket once a request's real usage is known."""
+        if self.capacity['tokens']:
+            self.level['tokens'] = min(self.capacity['tokens'], self.level['tokens'] + estimated - actual)
+
+    def pause(self, seconds):
+        """Hold every request back for `seconds`."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        """Apply x-ratelimit-remaining-* / x-ratelimit-reset-* response headers."""
+        for name in ('requests', 'tokens'):
+            remaining = headers.get(f'x-ratelimit-remaining-{name}')
+            if remaining is None or not self.capacity[name]:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            self.level[name] = min(self.level[name], remaining)
+            if remaining <= 0:
+                reset = parse_duration(headers.get(f'x-ratelimit-reset-{name}'))
+                if reset:
+                    self.pause(reset)
+
+class AsyncLLMClient:
+    """AsyncOpenAI with a shared connection pool, a token bucket and retries.
+
+    One instance serves any number of concurrent chat completions: they
+    share one client's keep-alive connection pool (`max_connections`
+    connections, and as many requests in flight), wait on one
+    requests/tokens per minute bucket, and retry 429s, timeouts and server
+    errors with exponential backoff and full jitter (never sooner than a
+    Retry-After header asks). A 429 pauses every request, not just the one
+    that got it.
+
+    Coroutines can be awaited on one event loop of the caller's, or sent
+    from ordinary threads with run(), which uses a private loop running in
+    a background thread. Use one or the other per instance. Streamed text
+    is handed to callbacks on a separate thread, so slow callbacks never
+    hold up the event loop.
+    """
+
+    def __init__(self, api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL,
+                 requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 max_connections=LLM_MAX_CONNECTIONS, max_retries=LLM_MAX_RETRIES,
+                 backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX, timeout=LLM_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.bucket = TokenBucket(requests_per_minute, tokens_per_minute)
+        self.retries = 0
+        self._client = None
+        # Bounds requests in flight; created on first use, inside the owning loop
+        self._slots = None
+        # Runs stream() callbacks one at a time, in order; created on first use
+        self._callbacks = None
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _get_client(self):
+        # One AsyncOpenAI instance, so every request reuses its keep-alive pool
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                # Retries are handled here, where they can see the shared bucket
+                max_retries=0,
+                timeout=self.timeout,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections),
+                    timeout=self.timeout
+                )
+            )
+            # Requests wait here rather than in the pool, where they could hit its timeout
+            self._slots = asyncio.Semaphore(self.max_connections)
+        return self._client
+
+    def _callback_thread(self):
+        with self._start_lock:
+            if self._callbacks is None:
+                self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-callbacks")
+            return self._callbacks
+
+    async def complete(self, estimated_tokens=0, **request):
+        """Send one chat completion request and return the parsed completion.
+
+        `request` holds the chat.completions.create arguments;
+        `estimated_tokens` is what the request is expected to use in total.
+        """
+        async def send(client):
+            response = await client.chat.completions.with_raw_response.create(**request)
+            self.bucket.update_from_headers(response.headers)
+            return response.parse()
+
+        completion = await self._send(send, estimated_tokens)
+        if completion.usage is not None:
+            self.bucket.reconcile(estimated_tokens, completion.usage.total_tokens)
+        return completion
+
+    async def stream(self, on_delta, estimated_tokens=0, **request):
+        """Stream a chat completion, passing each piece of text to `on_delta`.
+
+        Returns (content, usage); usage is None if the server did not report
+        it. Failures are retried like complete() until the first text has
+        arrived; a stream cut off after that raises. `on_delta` runs on the
+        client's callback thread, never on the event loop, and every call
+        has returned by the time this does.
+        """
+        callbacks = self._callback_thread()
+        parts = []
+        delivered = []
+
+        async def send(client):
+            response = await client.chat.completions.with_raw_response.create(
+                stream=True, stream_options={"include_usage": True}, **request
+            )
+            self.bucket.update_from_headers(response.headers)
+            usage = None
+            async for chunk in response.parse():
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    delivered.append(callbacks.submit(on_delta, delta))
+            return usage
+
+        usage = await self._send(send, estimated_tokens, retry=lambda: not parts)
+        if delivered:
+            # Callbacks run in order on one thread: once the last is done, all are
+            await asyncio.wrap_future(delivered[-1])
+            for future in delivered:
+                future.result()
+        if usage is not None:
+            self.bucket.reconcile(estimated_tokens, usage.total_tokens)
+        return "".join(parts), usage
+
+    async def _send(self, send, estimated_tokens, retry=lambda: True):
+        """Run `send(client)` within the rate limits, retrying transient failures.
+
+        The request's tokens are taken from the bucket once; each retry
+        only takes another request slot. If the request fails before any
+        text was generated, the tokens are returned.
+        """
+        from openai import APIConnectionError, APIStatusError
+        client = self._get_client()
+        await self.bucket.acquire(estimated_tokens)
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await self.bucket.acquire()
+            try:
+                async with self._slots:
+                    return await send(client)
+            except (APIStatusError, APIConnectionError) as e:
+                status = getattr(e, 'status_code', None)
+                if ((status is not None and status not in RETRY_STATUSES)
+                        or attempt == self.max_retries or not retry()):
+                    if retry():
+                        # Nothing was generated, so the tokens were not spent
+                        self.bucket.reconcile(estimated_tokens, 0)
+                    raise
+                headers = e.response.headers if getattr(e, 'response', None) is not None else {}
+                self.bucket.update_from_headers(headers)
+                delay = self._backoff(attempt, headers)
+                if status == 429:
+                    self.bucket.pause(delay)
+                self.retries += 1
+                print(f"LLM request failed ({status or type(e).__name__}), "
+                      f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def _backoff(self, attempt, headers):
+        """Seconds to wait before retry number `attempt` + 1."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = parse_duration(headers.get('retry-after-ms'))
+        if retry_after is not None:
+            retry_after /= 1000
+        else:
+            retry_after = parse_duration(headers.get('retry-after'))
+        return max(delay, retry_after or 0)
+
+    def run(self, coroutine):
+        """Run a coroutine on the client's background loop and wait for its result."""
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="llm-loop", daemon=True)
+                self._thread.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def aclose(self):
+        """Close the connection pool from the caller's own event loop."""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        self._close_callbacks()
+
+    def _close_callbacks(self):
+        with self._start_lock:
+            callbacks, self._callbacks = self._callbacks, None
+        if callbacks is not None:
+            callbacks.shutdown(wait=True)
+
+    def close(self):
+        """Close the connection pool and stop the background loop."""
+        if self._client is not None:
+            if self._loop is not None:
+                self.run(self._client.close())
+            self._client = None
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+        self._close_callbacks()
@@ -0,0 +1,177 @@
+import json
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, BATCH_API_DIR, BATCH_API_POLL_SECONDS,
+    BATCH_API_COMPLETION_WINDOW, BATCH_API_MAX_REQUESTS, BATCH_API_MAX_BYTES,
+    BATCH_API_PRICE_FACTOR
+)
+
+# Batch states after which nothing more will happen
+FINAL_STATES = ('completed', 'failed', 'expired', 'cancelled')
+
+class BatchPending(BaseException):
+    """A request was queued for the Batch API instead of being sent.
+
+    Derives from BaseException so the analyzer's generic error handlers
+    let it pass; the batch driver catches it and retries the video once
+    the batch results are in the response cache.
+    """
+
+class BatchCollector:
+    """Requests recorded while the analyzer runs in batch mode.
+
+    Each request is keyed by its response-cache key, which doubles as the
+    Batch API custom_id, so ingested results land exactly where the next
+    analyzer pass looks for them.
+    """
+
+    def __init__(self):
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, body, reservation):
+        """Queue a request; returns False if an identical one is already queued."""
+        with self._lock:
+            if key in self.requests:
+                return False
+            self.requests[key] = {'body': body, 'reservation': reservation}
+            return True
+
+class BatchRunner:
+    """Submit collected requests to the Batch API and ingest the results.
+
+    Requests are written as JSONL files (split to stay within the API's
+    per-file limits), uploaded and submitted; submitted batch IDs are kept
+    in the database so a later run can resume waiting for them. Ingesting
+    stores every answer in the response cache and settles its token
+    reservation at the batch price.
+    """
+
+    def __init__(self, cache, budget, db_handler, model, poll_interval=BATCH_API_POLL_SECONDS,
+                 batch_dir=BATCH_API_DIR, client=None):
+        self.cache = cache
+        self.budget = budget
+        self.db_handler = db_handler
+        self.model = model
+        self.poll_interval = poll_interval
+        self.batch_dir = Path(batch_dir)
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+        self.client = client
+
+    def write_files(self, requests):
+        """Write requests as JSONL files; returns [(path, {custom_id: reservation})]."""
+        self.batch_dir.mkdir(parents=True, exist_ok=True)
+        files = []
+        lines, reservations, size = [], {}, 0
+
+        def flush():
+            path = self.batch_dir / f"requests-{uuid.uuid4().hex[:12]}.jsonl"
+            path.write_text("".join(lines), encoding='utf-8')
+            files.append((path, dict(reservations)))
+
+        for custom_id, request in requests.items():
+            line = json.dumps({
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': request['body']
+            }, ensure_ascii=False) + "\n"
+            line_size = len(line.encode('utf-8'))
+            if lines and (len(lines) >= BATCH_API_MAX_REQUESTS or size + line_size > BATCH_API_MAX_BYTES):
+                flush()
+                lines, reservations, size = [], {}, 0
+            lines.append(line)
+            reservations[custom_id] = request['reservation']
+            size += line_size
+        if lines:
+            flush()
+        return files
+
+    def submit(self, requests):
+        """Upload and submit collected requests; returns the new batch IDs."""
+        batch_ids = []
+        for path, reservations in self.write_files(requests):
+            with open(path, 'rb') as f:
+                uploaded = self.client.files.create(file=f, purpose='batch')
+            batch = self.client.batches.create(
+                input_file_id=uploaded.id,
+                endpoint='/v1/chat/completions',
+                completion_window=BATCH_API_COMPLETION_WINDOW
+            )
+            self.db_handler.save_llm_batch(batch.id, reservations)
+            print(f"Submitted batch {batch.id} with {len(reservations)} requests")
+            batch_ids.append(batch.id)
+        return batch_ids
+
+    def wait(self, batch_ids):
+        """Poll until every batch is done, ingesting each as it finishes."""
+        pending = list(batch_ids)
+        reservations = self.db_handler.pending_llm_batches()
+        while pending:
+            for batch_id in list(pending):
+                batch = self.client.batches.retrieve(batch_id)
+                if batch.status not in FINAL_STATES:
+                    continue
+                pending.remove(batch_id)
+                self.ingest(batch, reservations.get(batch_id, {}))
+            if pending:
+                print(f"Waiting for {len(pending)} batch(es)...")
+                time.sleep(self.poll_interval)
+
+    def resume(self):
+        """Wait for batches submitted by an earlier run that were never ingested."""
+        batch_ids = list(self.db_handler.pending_llm_batches())
+        if batch_ids:
+            print(f"Resuming {len(batch_ids)} submitted batch(es)")
+            self.wait(batch_ids)
+
+    def ingest(self, batch, reservations):
+        """Store a finished batch's answers in the response cache; returns the number stored."""
+        stored = 0
+        if batch.output_file_id:
+            output = self.client.files.content(batch.output_file_id).text
+            # A resumed run may not have written any requests itself
+            self.batch_dir.mkdir(parents=True, exist_ok=True)
+            (self.batch_dir / f"results-{batch.id}.jsonl").write_text(output, encoding='utf-8')
+            for line in output.splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                custom_id = result.get('custom_id')
+                response = result.get('response') or {}
+                reservation = reservations.pop(custom_id, None)
+                if response.get('status_code') != 200:
+                    if reservation is not None:
+                        self.budget.release(reservation)
+                    continue
+                body = response['body']
+                content = body['choices'][0]['message']['content']
+                usage = body.get('usage') or {}
+                tokens = usage.get('total_tokens', 0)
+                self.cache.set(custom_id, {'content': content, 'tokens_used': tokens})
+                if reservation is not None:
+                    self.budget.settle(
+                        reservation, self.model,
+                        usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0),
+                        price_factor=BATCH_API_PRICE_FACTOR
+                    )
+                stored += 1
+
+        # Requests without an answer are collected again by the next pass
+        for reservation in reservations.values():
+            if reservation is not None:
+                self.budget.release(reservation)
+        status = 'ingested' if batch.status == 'completed' else 'failed'
+        self.db_handler.finish_llm_batch(batch.id, status)
+        print(f"Batch {batch.id} {batch.status}: {stored} responses stored")
+        return stored
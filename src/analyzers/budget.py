@@ -0,0 +1,165 @@
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from config import (
+    BUDGET_VIDEO_TOKENS, BUDGET_RUN_TOKENS, BUDGET_MINUTE_TOKENS,
+    BUDGET_VIDEO_COST, BUDGET_RUN_COST, BUDGET_POLICY, MODEL_PRICES
+)
+
+# What to do with a call that would go over a limit:
+#   ask      - interactive runs: confirm large calls at the prompt, skip over-limit ones
+#   skip     - fail the stage for this video
+#   truncate - shorten the prompt to what the budget still allows
+#   chunk    - split work into requests that fit the per-minute limit, and
+#              leave the pieces the budget cannot cover uncorrected
+#   defer    - fail the stage as deferred, so a later run picks the video up
+POLICIES = ('ask', 'skip', 'truncate', 'chunk', 'defer')
+
+class BudgetExceeded(Exception):
+    """A call would go over a token or cost limit.
+
+    `limit` names the limit that was hit (e.g. 'video_tokens') and
+    `remaining` is how many more tokens that limit allows.
+    """
+
+    def __init__(self, message, limit=None, remaining=0):
+        super().__init__(message)
+        self.limit = limit
+        self.remaining = remaining
+
+class BudgetDeferred(BudgetExceeded):
+    """Over-budget work put off to a later run (policy 'defer')."""
+
+class TokenBudget:
+    """Per-video, per-run and per-minute token and cost limits for LLM calls.
+
+    Each call reserves its estimated tokens (prompt plus expected
+    completion) before it is sent and is settled with the actual usage
+    afterwards. Reservations are rows in the database, checked and written
+    in one statement, so every worker thread and every process sharing the
+    database draws on the same limits. Processes that should share per-run
+    limits must use the same `run_id`.
+    """
+
+    def __init__(self, run_id=None, video_tokens=BUDGET_VIDEO_TOKENS, run_tokens=BUDGET_RUN_TOKENS,
+                 minute_tokens=BUDGET_MINUTE_TOKENS, video_cost=BUDGET_VIDEO_COST,
+                 run_cost=BUDGET_RUN_COST, policy=BUDGET_POLICY, prices=MODEL_PRICES,
+                 db_handler=None, max_wait=120):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown budget policy: {policy}")
+        if db_handler is None:
+            from src.database.db_handler import DatabaseHandler
+            db_handler = DatabaseHandler()
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.policy = policy
+        self.prices = prices
+        self.db_handler = db_handler
+        # Longest a call waits for room in the per-minute window
+        self.max_wait = max_wait
+        self.limits = {
+            name: limit for name, limit in (
+                ('video_tokens', video_tokens),
+                ('run_tokens', run_tokens),
+                ('minute_tokens', minute_tokens),
+                ('video_cost', video_cost),
+                ('run_cost', run_cost),
+            ) if limit is not None
+        }
+
+    def cost(self, model, prompt_tokens, completion_tokens=0):
+        """USD cost of a call; models without a listed price cost 0."""
+        prompt_price, completion_price = self.prices.get(model, (0, 0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+    def max_request_tokens(self):
+        """Largest single request (prompt plus completion) the per-minute limit admits."""
+        return self.limits.get('minute_tokens')
+
+    def reserve(self, model, video_id, stage, prompt_tokens, completion_tokens):
+        """Reserve a call's estimated tokens and return the reservation ID.
+
+        A full per-minute window is waited out (up to max_wait seconds);
+        any other limit raises BudgetExceeded, or BudgetDeferred under the
+        'defer' policy.
+        """
+        tokens = prompt_tokens + completion_tokens
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        deadline = time.time() + self.max_wait
+        while True:
+            reservation = self.db_handler.reserve_spend(
+                self.run_id, video_id, stage, model,
+                prompt_tokens, completion_tokens, cost, self.limits
+            )
+            if reservation is not None:
+                return reservation
+
+            blocked = self._blocking_limit(model, video_id, tokens, cost)
+            if blocked is None:
+                # Room was freed between the insert and the check; retry, but
+                # only until the deadline, in case the two never agree
+                if time.time() < deadline:
+                    time.sleep(0.1)
+                    continue
+                limit, remaining, over = None, 0, "the budget"
+            else:
+                limit, remaining = blocked
+                over = f"the {limit.replace('_', ' ')} limit of {self.limits[limit]}"
+                if (limit.startswith('minute_') and time.time() < deadline
+                        and tokens <= self.limits.get('minute_tokens', tokens)):
+                    # Older calls age out of the window; wait for them
+                    time.sleep(1.0)
+                    continue
+
+            error = BudgetDeferred if self.policy == 'defer' else BudgetExceeded
+            raise error(
+                f"{'Deferred: ' if self.policy == 'defer' else ''}{stage} call needs ~{tokens} tokens "
+                f"(${cost:.4f}), over {over}",
+                limit,
+                remaining
+            )
+
+    def _blocking_limit(self, model, video_id, tokens, cost):
+        """(limit name, tokens still allowed) for the first limit the call breaks, or None."""
+        totals = self.db_handler.spend_totals(self.run_id, video_id)
+        blocked = None
+        remaining = None
+        # Convert cost headroom to tokens at the dearer of the two prices
+        price = max(self.prices.get(model, (0, 0))) / 1000
+        for name, limit in self.limits.items():
+            if name not in totals:
+                continue
+            if name.endswith('_tokens'):
+                left = limit - totals[name]
+                over = tokens > left
+            else:
+                left = (limit - totals[name]) / price if price else tokens
+                over = cost > limit - totals[name]
+            remaining = left if remaining is None else min(remaining, left)
+            if over and blocked is None:
+                blocked = name
+        if blocked is None:
+            return None
+        return blocked, max(0, int(remaining))
+
+    def settle(self, reservation, model, prompt_tokens, completion_tokens, price_factor=1.0):
+        """Record the actual usage reported for a reserved call.
+
+        `price_factor` scales the listed prices, e.g. for Batch API discounts.
+        """
+        self.db_handler.settle_spend(
+            reservation, prompt_tokens, completion_tokens,
+            self.cost(model, prompt_tokens, completion_tokens) * price_factor
+        )
+
+    def release(self, reservation):
+        """Give back a reservation whose call failed."""
+        self.db_handler.release_spend(reservation)
+
+    def spent(self, video_id=None):
+        """Tokens and cost spent so far in this run (and on `video_id`)."""
+        return self.db_handler.spend_totals(self.run_id, video_id)
@@ -0,0 +1,136 @@
+import re
+from difflib import SequenceMatcher
+
+def _entries(auto_segments, whisper_segments):
+    """Merge both segment lists into one time-ordered list of entries."""
+    entries = []
+    for segment in auto_segments or []:
+        start = float(segment.get('start', 0))
+        entries.append({
+            'source': 'auto',
+            'start': start,
+            'end': start + float(segment.get('duration', 0)),
+            'text': str(segment['text']).strip()
+        })
+    for segment in whisper_segments or []:
+        start = float(segment.get('start', 0))
+        entries.append({
+            'source': 'whisper',
+            'start': start,
+            'end': float(segment.get('end', start)),
+            'text': str(segment['text']).strip()
+        })
+    entries.sort(key=lambda e: (e['start'], e['source']))
+    return entries
+
+def _texts(entries):
+    """Join entry text per source."""
+    auto = " ".join(e['text'] for e in entries if e['source'] == 'auto' and e['text'])
+    whisper = " ".join(e['text'] for e in entries if e['source'] == 'whisper' and e['text'])
+    return auto, whisper
+
+def build_windows(auto_segments, whisper_segments, count_tokens, max_tokens, overlap_seconds=15):
+    """Split both transcripts into token-bounded windows cut at shared timestamps.
+
+    Segments from both sources are merged by start time and packed greedily
+    until `max_tokens` is reached, so each window covers the same time span
+    in the auto and Whisper transcripts. Every window after the first also
+    carries up to `overlap_seconds` of the preceding segments as read-only
+    context (capped at a quarter of the budget), so the model sees what
+    came just before without being asked to correct it twice.
+    """
+    entries = _entries(auto_segments, whisper_segments)
+    tokens = [count_tokens(e['text']) for e in entries]
+
+    cores = []
+    current, current_tokens = [], 0
+    for index, count in enumerate(tokens):
+        if current and current_tokens + count > max_tokens:
+            cores.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += count
+    if current:
+        cores.append(current)
+
+    windows = []
+    for core in cores:
+        first = core[0]
+        core_start = entries[first]['start']
+
+        # Walk back from the window start to collect overlap context
+        context, context_tokens = [], 0
+        index = first - 1
+        while index >= 0 and entries[index]['start'] >= core_start - overlap_seconds:
+            if context_tokens + tokens[index] > max_tokens // 4:
+                break
+            context.insert(0, index)
+            context_tokens += tokens[index]
+            index -= 1
+
+        core_entries = [entries[i] for i in core]
+        auto_text, whisper_text = _texts(core_entries)
+        context_auto, context_whisper = _texts([entries[i] for i in context])
+        windows.append({
+            'start': core_start,
+            'end': max(e['end'] for e in core_entries),
+            'auto_text': auto_text,
+            'whisper_text': whisper_text,
+            'context_auto': context_auto,
+            'context_whisper': context_whisper
+        })
+    return windows
+
+def split_response(text):
+    """Split a '# Corrected Transcript / # Changes Made' response into its two parts."""
+    text = text or ''
+    match = re.search(r'^\s*#+\s*Changes Made\s*$', text, flags=re.IGNORECASE | re.MULTILINE)
+    transcript, changes = (text[:match.start()], text[match.end():]) if match else (text, '')
+    transcript = re.sub(r'^\s*#+\s*Corrected Transcript\s*$', '', transcript,
+                        count=1, flags=re.IGNORECASE | re.MULTILINE)
+    return transcript.strip(), changes.strip()
+
+def trim_overlap(previous, current, max_words=60, min_words=4):
+    """Drop words at the start of `current` that repeat the end of `previous`.
+
+    Guards the seams between windows in case the model echoed some of the
+    overlap context back into its corrected text.
+    """
+    previous_words = previous.split()[-max_words:]
+    spans = [m.span() for m in re.finditer(r'\S+', current)][:max_words]
+    current_words = [current[a:b] for a, b in spans]
+    if not previous_words or not current_words:
+        return current
+
+    normalize = lambda words: [re.sub(r'\W', '', w).lower() for w in words]
+    match = SequenceMatcher(
+        None, normalize(previous_words), normalize(current_words), autojunk=False
+    ).find_longest_match(0, len(previous_words), 0, len(current_words))
+
+    touches_seam = (
+        match.a + match.size >= len(previous_words) - 1 and match.b <= 1
+    )
+    if match.size < min_words or not touches_seam:
+        return current
+    return current[spans[match.b + match.size - 1][1]:].lstrip()
+
+def stitch_responses(responses):
+    """Join per-window responses into one '# Corrected Transcript / # Changes Made' document."""
+    transcript_parts, changes = [], []
+    seen_changes = set()
+    for response in responses:
+        transcript, change_report = split_response(response)
+        if transcript_parts and transcript:
+            transcript = trim_overlap(transcript_parts[-1], transcript)
+        if transcript:
+            transcript_parts.append(transcript)
+        for line in change_report.splitlines():
+            key = line.strip()
+            if key and key not in seen_changes:
+                seen_changes.add(key)
+                changes.append(line.rstrip())
+
+    return "# Corrected Transcript\n{}\n# Changes Made\n{}".format(
+        "\n\n".join(transcript_parts),
+        "\n".join(changes) if changes else "No changes reported"
+    )
@@ -0,0 +1,289 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubLLM:
+    """Stand-in for the chat completions endpoint, for testing without API access.
+
+    Answers in the shapes the analyzer expects (corrected transcript,
+    JSON resolutions, JSON analysis), enforces its own requests and tokens
+    per minute with 429s and x-ratelimit-* headers like the real API, and
+    can add latency and random server errors. Also accepts Batch API jobs
+    (file upload, batch create/retrieve, output download); a batch completes
+    `batch_delay` seconds after it is created.
+    """
+
+    def __init__(self, requests_per_minute=60, tokens_per_minute=150000,
+                 latency=0.2, error_rate=0.0, batch_delay=5.0):
+        self.limits = {'requests': requests_per_minute, 'tokens': tokens_per_minute}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.batch_delay = batch_delay
+        self.window = []  # (time, tokens) of requests in the last minute
+        self.counts = {'ok': 0, 'rate_limited': 0, 'errors': 0, 'batched': 0}
+        self.files = {}
+        self.batches = {}
+        self._lock = threading.Lock()
+
+    def admit(self, tokens):
+        """Record a request; return (accepted, rate-limit headers)."""
+        with self._lock:
+            now = time.time()
+            self.window = [(t, n) for t, n in self.window if t > now - 60]
+            used = {'requests': len(self.window), 'tokens': sum(n for _, n in self.window)}
+            over = [name for name, need in (('requests', 1), ('tokens', tokens))
+                    if used[name] + need > self.limits[name]]
+            if not over:
+                self.window.append((now, tokens))
+                used['requests'] += 1
+                used['tokens'] += tokens
+            reset = (self.window[0][0] + 60 - now) if self.window else 0
+            headers = {}
+            for name, limit in self.limits.items():
+                headers[f'x-ratelimit-limit-{name}'] = str(limit)
+                headers[f'x-ratelimit-remaining-{name}'] = str(max(0, limit - used[name]))
+                headers[f'x-ratelimit-reset-{name}'] = f"{reset:.3f}s"
+            if over:
+                headers['retry-after'] = f"{max(1, int(reset) + 1)}"
+                self.counts['rate_limited'] += 1
+            return not over, headers
+
+    def respond(self, request):
+        """Build a chat completion for a request body."""
+        system = request['messages'][0]['content']
+        user = request['messages'][-1]['content']
+        if 'resolutions' in system:
+            # Resolve each item to its Whisper wording
+            items = re.findall(r'^\[(\d+)\].*?Whisper: "(.*?)">>', user, flags=re.MULTILINE)
+            content = json.dumps({'resolutions': [{'id': int(i), 'text': text} for i, text in items]})
+        elif request.get('response_format', {}).get('type') == 'json_object':
+            content = json.dumps({
+                'salient_points': ["Stub point"],
+                'counterfactuals': [],
+                'bias': "none detected (stub)",
+                'claims_to_review': [],
+                'info_quality': 5,
+                'viewer_interest': 5
+            })
+        else:
+            # Echo the auto text of the section to correct (not the context before it)
+            section = user.split('Section', 1)[-1].split('Auto:', 1)[-1]
+            words = section.split('Whisper:', 1)[0].split()
+            text = "\n".join(" ".join(words[i:i + 40]) for i in range(0, len(words), 40))
+            content = f"# Corrected Transcript\n{text}\n# Changes Made\nNo changes (stub)"
+        prompt_tokens = sum(len(m['content'].split()) for m in request['messages'])
+        completion_tokens = len(content.split())
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+
+    def add_file(self, content, purpose):
+        """Store an uploaded (or generated) file; returns its file object."""
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self._lock:
+            self.files[file_id] = content
+        return {'id': file_id, 'object': 'file', 'bytes': len(content),
+                'created_at': int(time.time()), 'filename': f"{file_id}.jsonl", 'purpose': purpose}
+
+    def create_batch(self, request):
+        """Register a batch job for an uploaded JSONL file."""
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            'id': batch_id,
+            'object': 'batch',
+            'endpoint': request['endpoint'],
+            'input_file_id': request['input_file_id'],
+            'completion_window': request.get('completion_window', '24h'),
+            'status': 'in_progress',
+            'output_file_id': None,
+            'error_file_id': None,
+            'created_at': int(time.time()),
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0}
+        }
+        with self._lock:
+            self.batches[batch_id] = batch
+        return batch
+
+    def retrieve_batch(self, batch_id):
+        """A batch's current state, running it once its delay has passed."""
+        with self._lock:
+            batch = self.batches[batch_id]
+            if batch['status'] != 'in_progress' or time.time() < batch['created_at'] + self.batch_delay:
+                return batch
+            lines = self.files[batch['input_file_id']].decode('utf-8').splitlines()
+        output = []
+        for line in lines:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            output.append(json.dumps({
+                'id': f"batch_req_{uuid.uuid4().hex[:24]}",
+                'custom_id': item['custom_id'],
+                'response': {'status_code': 200, 'request_id': uuid.uuid4().hex,
+                             'body': self.respond(item['body'])},
+                'error': None
+            }))
+        output_file = self.add_file(("\n".join(output) + "\n").encode('utf-8'), 'batch_output')
+        with self._lock:
+            self.counts['batched'] += len(output)
+            batch.update(
+                status='completed',
+                output_file_id=output_file['id'],
+                completed_at=int(time.time()),
+                request_counts={'total': len(output), 'completed': len(output), 'failed': 0}
+            )
+            return batch
+
+def _make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, code, payload, headers=None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(length)
+            path = self.path.rstrip('/')
+            if path.endswith('/files'):
+                return self._upload(body)
+            if path.endswith('/batches'):
+                try:
+                    return self._send(200, stub.create_batch(json.loads(body)))
+                except (ValueError, KeyError) as e:
+                    return self._send(400, {'error': {'message': f"invalid batch: {str(e)}"}})
+            if not path.endswith('/chat/completions'):
+                return self._send(404, {'error': {'message': 'not found'}})
+            try:
+                request = json.loads(body)
+                tokens = sum(len(m['content'].split()) for m in request['messages']) * 2
+            except (ValueError, KeyError, TypeError) as e:
+                return self._send(400, {'error': {'message': f"invalid request: {str(e)}"}})
+
+            accepted, headers = stub.admit(tokens)
+            if not accepted:
+                return self._send(429, {'error': {'message': 'Rate limit reached (stub)',
+                                                  'type': 'requests', 'code': 'rate_limit_exceeded'}}, headers)
+            time.sleep(stub.latency)
+            if random.random() < stub.error_rate:
+                stub.counts['errors'] += 1
+                return self._send(500, {'error': {'message': 'Internal error (stub)'}}, headers)
+            stub.counts['ok'] += 1
+            completion = stub.respond(request)
+            if request.get('stream'):
+                return self._stream(completion, request, headers)
+            self._send(200, completion, headers)
+
+        def _stream(self, completion, request, headers):
+            """Send a completion as server-sent events, a few words per chunk."""
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.close_connection = True
+
+            def event(choices, usage=None):
+                chunk = {key: completion[key] for key in ('id', 'created', 'model')}
+                chunk.update(object='chat.completion.chunk', choices=choices, usage=usage)
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            words = re.split(r'(?<=\s)', completion['choices'][0]['message']['content'])
+            for i in range(0, len(words), 8):
+                delta = {'content': "".join(words[i:i + 8])}
+                if i == 0:
+                    delta['role'] = 'assistant'
+                event([{'index': 0, 'delta': delta, 'finish_reason': None}])
+                time.sleep(stub.latency / 10)
+            event([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+            if (request.get('stream_options') or {}).get('include_usage'):
+                event([], completion['usage'])
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def _upload(self, body):
+            """Accept a multipart file upload (files.create)."""
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode('latin-1') + body
+            )
+            fields = {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+                      for part in message.iter_parts()}
+            if 'file' not in fields:
+                return self._send(400, {'error': {'message': 'missing file'}})
+            purpose = (fields.get('purpose') or b'batch').decode('utf-8')
+            self._send(200, stub.add_file(fields['file'], purpose))
+
+        def do_GET(self):
+            path = self.path.rstrip('/')
+            if path == '/health':
+                return self._send(200, stub.counts)
+            match = re.search(r'/files/([^/]+)/content$', path)
+            if match and match.group(1) in stub.files:
+                body = stub.files[match.group(1)]
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                return self.wfile.write(body)
+            match = re.search(r'/batches/([^/]+)$', path)
+            if match and match.group(1) in stub.batches:
+                return self._send(200, stub.retrieve_batch(match.group(1)))
+            self._send(404, {'error': {'message': 'not found'}})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(host='127.0.0.1', port=8766, **options):
+    """Run the stub until interrupted; point OPENAI_BASE_URL at http://host:port/v1."""
+    stub = StubLLM(**options)
+    server = ThreadingHTTPServer((host, port), _make_handler(stub))
+    print(f"Stub LLM listening on http://{host}:{port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nShutting down stub LLM: {stub.counts}")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat completions API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--rpm', type=int, default=60, help="Requests per minute before 429s")
+    parser.add_argument('--tpm', type=int, default=150000, help="Tokens per minute before 429s")
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds per response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument('--batch-delay', type=float, default=5.0, help="Seconds until a Batch API job completes")
+    args = parser.parse_args()
+    serve(args.host, args.port, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+          latency=args.latency, error_rate=args.error_rate, batch_delay=args.batch_delay)
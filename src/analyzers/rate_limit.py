@@ -0,0 +1,25 @@
+import threading
+import time
+
+class RateLimiter:
+    """Space out calls so that at most `per_minute` start in any minute.
+
+    Shared between threads; each call to wait() reserves the next free
+    slot and sleeps until it arrives. A falsy limit disables limiting.
+    """
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        """Block until the caller may start its request."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
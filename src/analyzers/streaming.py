@@ -0,0 +1,165 @@
+import re
+import threading
+
+from src.analyzers.chunking import trim_overlap
+
+_HEADING = re.compile(r'^\s*#+\s*Corrected Transcript\s*$', re.IGNORECASE)
+_CHANGES = re.compile(r'^\s*#+\s*Changes Made\s*$', re.IGNORECASE)
+
+class TranscriptStream:
+    """Reassemble streamed window corrections into one transcript, in order.
+
+    Windows are corrected concurrently, but text is released strictly in
+    window order: complete lines of the earliest unfinished window are
+    passed on as they arrive, and later windows are held back until they
+    become the earliest. The '# Corrected Transcript' heading is dropped,
+    the '# Changes Made' part of each window is collected separately and
+    reported in window order, and the first line of each window is trimmed
+    where it repeats the end of the previous one. `on_text` receives every
+    released piece, one call at a time.
+    """
+
+    def __init__(self, windows, on_text):
+        self.on_text = on_text
+        self._changes = [[] for _ in range(windows)]
+        self._partial = [''] * windows
+        self._lines = [[] for _ in range(windows)]
+        self._in_changes = [False] * windows
+        self._trimmed = [False] * windows
+        self._done = [False] * windows
+        self._head = 0
+        self._released = []
+        self._lock = threading.Lock()
+
+    def feed(self, window, delta):
+        """Add streamed text for a window."""
+        with self._lock:
+            text = self._partial[window] + delta
+            *lines, self._partial[window] = text.split('\n')
+            for line in lines:
+                self._add_line(window, line)
+            if window == self._head:
+                self._release(window)
+
+    def finish(self, window):
+        """Mark a window's stream complete and release whatever is now in order."""
+        with self._lock:
+            if self._partial[window]:
+                self._add_line(window, self._partial[window])
+                self._partial[window] = ''
+            self._done[window] = True
+            while self._head < len(self._done):
+                self._release(self._head)
+                if not self._done[self._head]:
+                    break
+                self._head += 1
+
+    def _add_line(self, window, line):
+        if _CHANGES.match(line):
+            self._in_changes[window] = True
+        elif self._in_changes[window]:
+            if line.strip():
+                self._changes[window].append(line.rstrip())
+        elif not _HEADING.match(line):
+            self._lines[window].append(line)
+
+    def _release(self, window):
+        lines, self._lines[window] = self._lines[window], []
+        for line in lines:
+            if not self._trimmed[window] and line.strip():
+                # Guard the seam against overlap context echoed by the model
+                if window > 0 and self._released:
+                    line = trim_overlap(" ".join(self._released[-3:]), line)
+                self._trimmed[window] = True
+            self._released.append(line)
+            self.on_text(line + "\n")
+
+    def changes(self):
+        """Reported changes in transcript order: window by window, without repeats."""
+        with self._lock:
+            changes = {}
+            for lines in self._changes:
+                for line in lines:
+                    changes.setdefault(line.strip(), line)
+            return list(changes.values())
+
+    def document(self):
+        """The full '# Corrected Transcript / # Changes Made' text released so far."""
+        changes = self.changes()
+        with self._lock:
+            return "# Corrected Transcript\n{}\n# Changes Made\n{}".format(
+                "\n".join(self._released).strip(),
+                "\n".join(changes) if changes else "No changes reported"
+            )
+
+class ChunkedAnalysis:
+    """Start content analysis on corrected text while it is still streaming in.
+
+    Text is collected into pieces of about `chunk_tokens` tokens, cut at
+    line ends; `analyze(text, part)` runs on the executor for each piece as
+    soon as it is complete. finish() analyzes the remainder, waits for all
+    pieces and merges their results.
+    """
+
+    def __init__(self, analyze, count_tokens, chunk_tokens, executor):
+        self.analyze = analyze
+        self.count_tokens = count_tokens
+        self.chunk_tokens = chunk_tokens
+        self.executor = executor
+        self._buffer = []
+        self._tokens = 0
+        self._futures = []
+
+    def add(self, text):
+        self._buffer.append(text)
+        self._tokens += self.count_tokens(text)
+        if self._tokens >= self.chunk_tokens and text.endswith("\n"):
+            self._submit()
+
+    def _submit(self):
+        text = "".join(self._buffer).strip()
+        if text:
+            part = len(self._futures) + 1
+            self._futures.append((self.executor.submit(self.analyze, text, part), self._tokens))
+        self._buffer, self._tokens = [], 0
+
+    def finish(self):
+        """Analyze the remaining text and return the merged analysis (None if there was no text)."""
+        self._submit()
+        results = [(future.result(), weight) for future, weight in self._futures]
+        results = [(analysis, weight) for analysis, weight in results if analysis is not None]
+        if not results:
+            return None
+        return merge_analyses([a for a, _ in results], [w for _, w in results])
+
+def merge_analyses(analyses, weights=None):
+    """Combine per-part analyses into one.
+
+    Lists are concatenated without duplicates, distinct bias notes are
+    joined, and the scores are averaged, weighted by the size of each part.
+    """
+    if len(analyses) == 1:
+        return analyses[0]
+    weights = weights or [1] * len(analyses)
+    merged = {}
+    for field in ('salient_points', 'counterfactuals', 'claims_to_review'):
+        items = []
+        for analysis in analyses:
+            for item in analysis.get(field) or []:
+                if item not in items:
+                    items.append(item)
+        merged[field] = items
+
+    notes = []
+    for analysis in analyses:
+        note = analysis.get('bias')
+        if note and str(note) not in notes:
+            notes.append(str(note))
+    merged['bias'] = " ".join(notes)
+
+    total = sum(weights) or 1
+    for field in ('info_quality', 'viewer_interest'):
+        merged[field] = int(round(
+            sum(int(analysis[field]) * weight for analysis, weight in zip(analyses, weights)) / total
+        ))
+    return merged
@@ -1,93 +1,392 @@
 import os
-from openai import OpenAI
 import sys
 from pathlib import Path
 import json
-import tiktoken
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 
 # Add the project root directory to Python path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from config import OPENAI_API_KEY, MAX_TOKENS_THRESHOLD
+from config import (
+    OPENAI_API_KEY, MAX_TOKENS_THRESHOLD, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_SECONDS,
+    CHUNK_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, BUDGET_POLICY, LLM_ASYNC
+)
+from src.analyzers.response_cache import ResponseCache
+from src.analyzers.rate_limit import RateLimiter
+from src.analyzers.chunking import build_windows, stitch_responses, split_response
+from src.analyzers.streaming import TranscriptStream
+from src.analyzers.batch_api import BatchPending
+from src.analyzers.alignment import align_transcripts, build_segments
+from src.analyzers.budget import TokenBudget, BudgetExceeded
+from src.metrics import metrics
 
-# Initialize the OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# The synchronous OpenAI client, created on first use (importing openai is slow)
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """The shared synchronous OpenAI client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(api_key=OPENAI_API_KEY)
+        return _client
 
 # Use GPT-4 Turbo for text analysis
 MODEL = "gpt-4-1106-preview"
 TEMPERATURE = 0.7
+# Longest completion the model returns; caps the expected output of a call
+COMPLETION_TOKEN_CAP = 4096
+
+COMPARE_SYSTEM_PROMPT = """You are a transcript editor. Create a corrected transcript and change report in this format:
+        # Corrected Transcript
+        [transcript]
+        # Changes Made
+        [changes]"""
+
+CHUNK_SYSTEM_PROMPT = COMPARE_SYSTEM_PROMPT + """
+        Only correct the Section. Context is the text just before it, for reference only; never repeat it."""
+
+RESOLVE_SYSTEM_PROMPT = """Two transcripts of the same audio disagree on the marked words. For each numbered item, give the correct wording of the disputed part only, using the surrounding context. Return JSON: {"resolutions": [{"id": number, "text": string}]}"""
 
 class TranscriptAnalyzer:
-    def __init__(self):
-        self.encoding = tiktoken.encoding_for_model(MODEL)
+    def __init__(self, interactive=True, use_cache=True, refresh_cache=False, budget=None,
+                 async_llm=LLM_ASYNC):
+        # Loaded by the first token count; see the encoding property
+        self._encoding = None
+        self._encoding_lock = threading.Lock()
+        # Unattended (batch) runs must never block on input()
+        self.interactive = interactive
+        # Token and cost limits; only interactive runs ask at the prompt
+        self.budget = budget or TokenBudget(policy='ask' if interactive else BUDGET_POLICY)
+        # Byte-identical requests are answered from disk instead of the API
+        self.cache = ResponseCache(bypass=refresh_cache) if use_cache else None
+        # Shared by every request this analyzer sends, across threads
+        self.rate_limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE)
+        # Requests from every worker thread go through one event loop, with a
+        # shared connection pool, RPM/TPM bucket and retries on 429s and timeouts
+        self.llm = None
+        if async_llm:
+            from src.analyzers.async_client import AsyncLLMClient
+            self.llm = AsyncLLMClient()
+        self.chunk_max_tokens = CHUNK_MAX_TOKENS
+        self.chunk_concurrency = CHUNK_CONCURRENCY
+        # Reconcile auto and Whisper locally, sending only disagreements to the LLM
+        self.use_alignment = True
+        # A BatchCollector while requests are being gathered for the Batch API
+        self.batch = None
 
     def _format_time(self, seconds):
         """Format seconds into human readable time."""
         return str(timedelta(seconds=int(seconds)))
 
-    def _time_operation(self, operation, *args, **kwargs):
-        """Time an operation and return its result with timing info."""
-        start_time = time.time()
-        result = operation(*args, **kwargs)
-        elapsed = time.time() - start_time
-        print(f"\nOperation completed in: {self._format_time(elapsed)}")
-        return result
-
-    def compare_transcripts(self, auto_transcript, whisper_transcript):
+    def compare_transcripts(self, auto_transcript, whisper_transcript, video_id=None):
         """Compare and synthesize transcripts using AI."""
         print("\nStarting transcript comparison...")
+
+        if (self.use_alignment and auto_transcript and whisper_transcript
+                and whisper_transcript.get('segments')):
+            return self._compare_aligned(auto_transcript, whisper_transcript, video_id)
         
         # Format transcripts
         auto_text = self._format_transcript(auto_transcript)
         whisper_text = whisper_transcript['text'] if whisper_transcript else None
 
         # Optimize prompts for efficiency
-        system_prompt = """You are a transcript editor. Create a corrected transcript and change report in this format:
-        # Corrected Transcript
-        [transcript]
-        # Changes Made
-        [changes]"""
+        system_prompt = COMPARE_SYSTEM_PROMPT
 
         user_prompt = f"""Compare and correct:
         Auto: {auto_text}
         {'Whisper: ' + whisper_text if whisper_text else ''}"""
 
-        # Token counting and approval
-        total_tokens = self.count_tokens(system_prompt) + self.count_tokens(user_prompt)
-        print(f"\nEstimated token count: {total_tokens}")
-        
-        if not self._confirm_token_usage(total_tokens):
-            return None
+        # Long videos exceed the context and output limits in one request
+        if self.count_tokens(user_prompt) > self._chunk_tokens():
+            return self._compare_in_chunks(auto_transcript, whisper_transcript, video_id)
 
         try:
-            def api_call():
-                return client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    model=MODEL,
-                    temperature=TEMPERATURE
-                )
+            completion = self._chat_completion(
+                system_prompt, user_prompt, video_id=video_id, stage='correction'
+            )
+            if completion is None:
+                return None
 
-            completion = self._time_operation(api_call)
-            actual_tokens = completion.usage.total_tokens
-            print(f"Actual tokens used: {actual_tokens}")
-            
             return {
-                'text': completion.choices[0].message.content,
+                'text': completion['content'],
                 'whisper_used': bool(whisper_text),
-                'tokens_used': actual_tokens
+                'tokens_used': completion['tokens_used']
             }
 
+        except BudgetExceeded:
+            if self.budget.policy != 'chunk':
+                raise
+            # Correct as much of it as the budget covers, window by window
+            return self._compare_in_chunks(auto_transcript, whisper_transcript, video_id)
+        except Exception as e:
+            print(f"OpenAI API error: {str(e)}")
+            raise
+
+    def _compare_aligned(self, auto_transcript, whisper_transcript, video_id=None):
+        """Merge both transcripts by time and let the LLM settle only where they differ."""
+        units = align_transcripts(auto_transcript, whisper_transcript['segments'])
+        disputed = [(index, unit) for index, unit in enumerate(units) if not unit['agree']]
+        print(f"\nTranscripts aligned: {len(disputed)} of {len(units)} regions disagree")
+
+        batches = self._resolution_batches(disputed)
+        total_tokens = sum(
+            self.count_tokens(RESOLVE_SYSTEM_PROMPT) + self.count_tokens(prompt)
+            for prompt, _ in batches
+        )
+        if batches:
+            print(f"\nEstimated token count: {total_tokens}")
+            if not self._confirm_token_usage(total_tokens):
+                return None
+
+        def resolve(batch):
+            prompt, ids = batch
+            try:
+                completion = self._chat_completion(
+                    RESOLVE_SYSTEM_PROMPT,
+                    prompt,
+                    confirm=False,
+                    video_id=video_id,
+                    stage='correction',
+                    response_format={"type": "json_object"}
+                )
+            except BudgetExceeded:
+                if self.budget.policy != 'chunk':
+                    raise
+                # Out of budget: these disagreements keep the Whisper wording
+                return None, 0
+            try:
+                items = json.loads(completion['content']).get('resolutions', [])
+                resolved = {int(item['id']): str(item['text']) for item in items}
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError) as e:
+                # Keep the Whisper wording for this batch rather than failing the video
+                print(f"Error parsing resolutions: {str(e)}")
+                resolved = {}
+            return {k: v for k, v in resolved.items() if k in ids}, completion['tokens_used']
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.chunk_concurrency) as executor:
+                results = self._map_requests(executor, resolve, batches)
         except Exception as e:
             print(f"OpenAI API error: {str(e)}")
             raise
 
-    def analyze_content(self, metadata, corrected_transcript, viewer_profile):
-        """Analyze video content and generate insights."""
+        resolutions = {}
+        for resolved, _ in results:
+            resolutions.update(resolved or {})
+        segments = build_segments(units, resolutions)
+
+        changes = []
+        for index, unit in disputed:
+            final = resolutions.get(index, unit['whisper'] or unit['auto'])
+            if final.strip() != unit['auto'].strip():
+                changes.append(
+                    f"- [{self._format_time(unit['start'])}] \"{unit['auto']}\" -> \"{final}\""
+                )
+
+        return {
+            'text': self._render_segments(segments, changes),
+            'whisper_used': True,
+            'tokens_used': sum(tokens for _, tokens in results),
+            'segments': segments,
+            'disagreements': len(disputed),
+            'partial': any(resolved is None for resolved, _ in results)
+        }
+
+    def _resolution_batches(self, disputed):
+        """Group disagreements into prompts of at most chunk_max_tokens tokens."""
+        batches = []
+        lines, ids, tokens = [], set(), 0
+        for index, unit in disputed:
+            line = (
+                f"[{index}] {unit['before']} <<Auto: \"{unit['auto']}\" | "
+                f"Whisper: \"{unit['whisper']}\">> {unit['after']}"
+            )
+            count = self.count_tokens(line)
+            if lines and tokens + count > self._chunk_tokens():
+                batches.append(("\n".join(lines), ids))
+                lines, ids, tokens = [], set(), 0
+            lines.append(line)
+            ids.add(index)
+            tokens += count
+        if lines:
+            batches.append(("\n".join(lines), ids))
+        return batches
+
+    def _render_segments(self, segments, changes):
+        """Render corrected segments in the '# Corrected Transcript / # Changes Made' layout."""
+        paragraphs = []
+        speaker = None
+        for segment in segments:
+            if not paragraphs or segment['speaker'] != speaker:
+                speaker = segment['speaker']
+                label = f"{speaker}: " if speaker and speaker != 'Unknown' else ""
+                paragraphs.append(label + segment['text'])
+            else:
+                paragraphs[-1] += " " + segment['text']
+        return "# Corrected Transcript\n{}\n# Changes Made\n{}".format(
+            "\n\n".join(paragraphs),
+            "\n".join(changes) if changes else "No changes made"
+        )
+
+    def _chunk_tokens(self):
+        """Prompt tokens per window; the 'chunk' policy also fits each request in the per-minute limit."""
+        limit = self.chunk_max_tokens
+        per_request = self.budget.max_request_tokens() if self.budget.policy == 'chunk' else None
+        if per_request:
+            # Leave room for the completion, which is about as long as the prompt
+            limit = min(limit, max(1, per_request // 2 - self.count_tokens(CHUNK_SYSTEM_PROMPT)))
+        return limit
+
+    def _compare_in_chunks(self, auto_transcript, whisper_transcript, video_id=None):
+        """Correct a long transcript as concurrent, timestamp-aligned windows."""
+        windows = build_windows(
+            auto_transcript,
+            whisper_transcript['segments'] if whisper_transcript else None,
+            self.count_tokens,
+            self._chunk_tokens(),
+            CHUNK_OVERLAP_SECONDS
+        )
+        prompts = [self._chunk_prompt(window) for window in windows]
+
+        # Ask once for the whole transcript rather than once per window
+        total_tokens = sum(
+            self.count_tokens(CHUNK_SYSTEM_PROMPT) + self.count_tokens(prompt)
+            for prompt in prompts
+        )
+        print(f"\nSplit transcript into {len(windows)} windows, estimated token count: {total_tokens}")
+        if not self._confirm_token_usage(total_tokens):
+            return None
+
+        def correct(window, prompt):
+            try:
+                return self._chat_completion(
+                    CHUNK_SYSTEM_PROMPT, prompt, confirm=False, video_id=video_id, stage='correction'
+                )
+            except BudgetExceeded:
+                if self.budget.policy != 'chunk':
+                    raise
+                return self._uncorrected_window(window)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.chunk_concurrency) as executor:
+                completions = self._map_requests(executor, correct, windows, prompts)
+        except Exception as e:
+            print(f"OpenAI API error: {str(e)}")
+            raise
+
+        return {
+            'text': stitch_responses(c['content'] for c in completions),
+            'whisper_used': bool(whisper_transcript),
+            'tokens_used': sum(c['tokens_used'] for c in completions),
+            'chunks': len(windows),
+            'partial': any(c.get('partial') for c in completions)
+        }
+
+    def _uncorrected_window(self, window):
+        """Stand-in response for a window the budget could not cover: its own text, uncorrected."""
+        content = "# Corrected Transcript\n{}\n# Changes Made\n- [{}] Section left uncorrected: token budget reached".format(
+            window['whisper_text'] or window['auto_text'],
+            self._format_time(window['start'])
+        )
+        return {'content': content, 'tokens_used': 0, 'cached': False, 'partial': True}
+
+    def compare_transcripts_streaming(self, auto_transcript, whisper_transcript, on_text, video_id=None):
+        """Like compare_transcripts, but hand corrected text to `on_text` as it is generated.
+
+        Completions are streamed; long transcripts are still corrected as
+        concurrent windows, with their text released in order (see
+        TranscriptStream). When both sources have segments, the local
+        alignment path is used and its text is released once it is built.
+        """
+        if (self.use_alignment and auto_transcript and whisper_transcript
+                and whisper_transcript.get('segments')):
+            result = self._compare_aligned(auto_transcript, whisper_transcript, video_id)
+            if result is not None:
+                on_text(split_response(result['text'])[0] + "\n")
+            return result
+
+        print("\nStarting streamed transcript comparison...")
+        auto_text = self._format_transcript(auto_transcript)
+        whisper_text = whisper_transcript['text'] if whisper_transcript else None
+        user_prompt = f"""Compare and correct:
+        Auto: {auto_text}
+        {'Whisper: ' + whisper_text if whisper_text else ''}"""
+
+        windows = [None]
+        jobs = [(COMPARE_SYSTEM_PROMPT, user_prompt)]
+        # The 'chunk' policy needs windows to fall back on when the budget runs out
+        if self.count_tokens(user_prompt) > self._chunk_tokens() or self.budget.policy == 'chunk':
+            windows = build_windows(
+                auto_transcript,
+                whisper_transcript['segments'] if whisper_transcript else None,
+                self.count_tokens,
+                self._chunk_tokens(),
+                CHUNK_OVERLAP_SECONDS
+            )
+            jobs = [(CHUNK_SYSTEM_PROMPT, self._chunk_prompt(window)) for window in windows]
+
+        total_tokens = sum(self.count_tokens(system) + self.count_tokens(prompt) for system, prompt in jobs)
+        print(f"\nStreaming {len(jobs)} request(s), estimated token count: {total_tokens}")
+        if not self._confirm_token_usage(total_tokens):
+            return None
+
+        stream = TranscriptStream(len(jobs), on_text)
+
+        def correct(index):
+            system, prompt = jobs[index]
+            try:
+                completion = self._chat_completion(
+                    system, prompt, confirm=False, video_id=video_id, stage='correction',
+                    on_delta=lambda delta: stream.feed(index, delta)
+                )
+            except BudgetExceeded:
+                if self.budget.policy != 'chunk' or windows[index] is None:
+                    raise
+                completion = self._uncorrected_window(windows[index])
+                stream.feed(index, completion['content'])
+            stream.finish(index)
+            return completion
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.chunk_concurrency) as executor:
+                completions = self._map_requests(executor, correct, range(len(jobs)))
+        except Exception as e:
+            print(f"OpenAI API error: {str(e)}")
+            raise
+
+        return {
+            'text': stream.document(),
+            'whisper_used': bool(whisper_text),
+            'tokens_used': sum(c['tokens_used'] for c in completions),
+            'chunks': len(jobs),
+            'partial': any(c.get('partial') for c in completions)
+        }
+
+    def _chunk_prompt(self, window):
+        """Build the user prompt for one transcript window."""
+        prompt = ""
+        if window['context_auto'] or window['context_whisper']:
+            prompt += f"""Context:
+        Auto: {window['context_auto']}
+        {'Whisper: ' + window['context_whisper'] if window['context_whisper'] else ''}
+        """
+        prompt += f"""Section ({self._format_time(window['start'])} - {self._format_time(window['end'])}), compare and correct:
+        Auto: {window['auto_text']}
+        {'Whisper: ' + window['whisper_text'] if window['whisper_text'] else ''}"""
+        return prompt
+
+    def analyze_content(self, metadata, corrected_transcript, viewer_profile, video_id=None, part=None):
+        """Analyze video content and generate insights.
+
+        `part` marks the transcript as one numbered piece of a longer video
+        whose other pieces are analyzed separately (see ChunkedAnalysis).
+        """
         print("\nStarting content analysis...")
 
         # Optimize prompts for efficiency
@@ -96,34 +395,32 @@ class TranscriptAnalyzer:
         user_prompt = f"""Title: {metadata['title']}
         Description: {metadata['description']}
         Profile: {viewer_profile}
-        Transcript: {corrected_transcript}"""
+        {'Transcript' if part is None else f'Transcript (part {part} of the video)'}: {corrected_transcript}"""
 
-        # Token counting and approval
-        total_tokens = self.count_tokens(system_prompt) + self.count_tokens(user_prompt)
-        print(f"\nEstimated token count: {total_tokens}")
-        
-        if not self._confirm_token_usage(total_tokens):
-            return None
+        def analyze(truncate=False):
+            return self._chat_completion(
+                system_prompt,
+                user_prompt,
+                video_id=video_id,
+                stage='analysis',
+                truncate=truncate,
+                response_format={"type": "json_object"}
+            )
 
         try:
-            def api_call():
-                return client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    model=MODEL,
-                    temperature=TEMPERATURE,
-                    response_format={"type": "json_object"}
-                )
-
-            completion = self._time_operation(api_call)
-            actual_tokens = completion.usage.total_tokens
-            print(f"Actual tokens used: {actual_tokens}")
+            try:
+                completion = analyze()
+            except BudgetExceeded:
+                # One JSON analysis cannot be split, so 'chunk' shortens the transcript instead
+                if self.budget.policy != 'chunk':
+                    raise
+                completion = analyze(truncate=True)
+            if completion is None:
+                return None
 
             # Parse and validate JSON response
             try:
-                analysis = json.loads(completion.choices[0].message.content)
+                analysis = json.loads(completion['content'])
                 # Ensure numeric scores
                 analysis['info_quality'] = int(analysis['info_quality'])
                 analysis['viewer_interest'] = int(analysis['viewer_interest'])
@@ -136,17 +433,191 @@ class TranscriptAnalyzer:
             print(f"OpenAI API error: {str(e)}")
             raise
 
+    def _chat_completion(self, system_prompt, user_prompt, confirm=True, video_id=None,
+                         stage='llm', truncate=False, on_delta=None, **options):
+        """Run a chat completion, answering from the response cache when possible.
+
+        The estimated tokens are reserved against the budget before the
+        call and settled with the reported usage after it. Over budget,
+        the 'truncate' policy (or `truncate`) shortens the user prompt to
+        fit; otherwise BudgetExceeded (or BudgetDeferred) is raised.
+
+        With `on_delta`, the completion is streamed and each piece of text
+        is passed to it as it arrives (a cached response arrives whole).
+
+        Returns a dict with the message `content`, `tokens_used` (0 for a
+        cache hit) and `cached`, or None if the user declined the token cost.
+        """
+        cached = self._cached_completion(system_prompt, user_prompt, options, on_delta)
+        if cached is not None:
+            metrics.count('llm_cache_hits', 1, video_id, call=stage)
+            return cached
+        if self.cache is not None:
+            metrics.count('llm_cache_misses', 1, video_id, call=stage)
+
+        # Token counting and approval
+        total_tokens = self.count_tokens(system_prompt) + self.count_tokens(user_prompt)
+        print(f"\nEstimated token count: {total_tokens}")
+
+        if confirm and not self._confirm_token_usage(total_tokens):
+            return None
+
+        try:
+            reservation = self._reserve(video_id, stage, total_tokens, options)
+        except BudgetExceeded as e:
+            if not (truncate or self.budget.policy == 'truncate'):
+                raise
+            user_prompt = self._truncate_prompt(system_prompt, user_prompt, e.remaining)
+            if user_prompt is None:
+                raise
+            total_tokens = self.count_tokens(system_prompt) + self.count_tokens(user_prompt)
+            print(f"Prompt truncated to {total_tokens} tokens to fit the budget")
+            cached = self._cached_completion(system_prompt, user_prompt, options, on_delta)
+            if cached is not None:
+                return cached
+            reservation = self._reserve(video_id, stage, total_tokens, options)
+
+        key = None
+        if self.cache is not None:
+            key = ResponseCache.make_key(MODEL, TEMPERATURE, system_prompt, user_prompt, **options)
+
+        request = dict(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            model=MODEL,
+            temperature=TEMPERATURE,
+            **options
+        )
+        expected_tokens = total_tokens + min(total_tokens, COMPLETION_TOKEN_CAP)
+
+        if self.batch is not None:
+            # Batch API mode: queue the request; its answer comes back through the cache
+            if not self.batch.record(key, request, reservation):
+                self.budget.release(reservation)
+            raise BatchPending(key)
+
+        def api_call():
+            if self.llm is not None:
+                if on_delta is not None:
+                    return self.llm.run(self.llm.stream(on_delta, estimated_tokens=expected_tokens, **request))
+                completion = self.llm.run(self.llm.complete(estimated_tokens=expected_tokens, **request))
+            else:
+                self.rate_limiter.wait()
+                if on_delta is not None:
+                    return self._stream_sync(request, on_delta)
+                completion = get_client().chat.completions.create(**request)
+            return completion.choices[0].message.content, completion.usage
+
+        try:
+            with metrics.time(stage if stage == 'llm' else f"llm_{stage}", video_id, model=MODEL):
+                content, usage = api_call()
+        except BaseException:
+            self.budget.release(reservation)
+            raise
+        if usage is None:
+            # Some servers omit usage on streams; fall back to the local count
+            prompt_used, completion_used = total_tokens, self.count_tokens(content)
+        else:
+            prompt_used, completion_used = usage.prompt_tokens, usage.completion_tokens
+        self.budget.settle(reservation, MODEL, prompt_used, completion_used)
+        actual_tokens = prompt_used + completion_used
+        print(f"Actual tokens used: {actual_tokens}")
+        metrics.count('llm_prompt_tokens', prompt_used, video_id, call=stage)
+        metrics.count('llm_completion_tokens', completion_used, video_id, call=stage)
+
+        if key is not None:
+            self.cache.set(key, {'content': content, 'tokens_used': actual_tokens})
+        return {'content': content, 'tokens_used': actual_tokens, 'cached': False}
+
+    def _stream_sync(self, request, on_delta):
+        """Stream a completion with the synchronous client; returns (content, usage)."""
+        parts, usage = [], None
+        for chunk in get_client().chat.completions.create(
+                stream=True, stream_options={"include_usage": True}, **request):
+            if chunk.usage is not None:
+                usage = chunk.usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+        return "".join(parts), usage
+
+    def _cached_completion(self, system_prompt, user_prompt, options, on_delta=None):
+        """The cached completion for this exact request, or None."""
+        if self.cache is None:
+            return None
+        key = ResponseCache.make_key(MODEL, TEMPERATURE, system_prompt, user_prompt, **options)
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        print("\nUsing cached response (0 tokens used)")
+        if on_delta is not None:
+            on_delta(cached['content'])
+        return {'content': cached['content'], 'tokens_used': 0, 'cached': True}
+
+    def _reserve(self, video_id, stage, prompt_tokens, options):
+        """Reserve a call's prompt tokens plus its expected completion."""
+        expected = options.get('max_tokens') or min(prompt_tokens, COMPLETION_TOKEN_CAP)
+        return self.budget.reserve(MODEL, video_id, stage, prompt_tokens, expected)
+
+    def _truncate_prompt(self, system_prompt, user_prompt, remaining):
+        """Cut the user prompt so prompt and expected completion fit in `remaining` tokens.
+
+        Returns None if not even a useful part of the prompt fits.
+        """
+        # The completion is expected to be about as long as the prompt, up to the cap
+        if remaining >= 2 * COMPLETION_TOKEN_CAP:
+            prompt_tokens = remaining - COMPLETION_TOKEN_CAP
+        else:
+            prompt_tokens = remaining // 2
+        keep = prompt_tokens - self.count_tokens(system_prompt)
+        if keep < 100:
+            return None
+        return self.encoding.decode(self.encoding.encode(str(user_prompt))[:keep])
+
+    def close(self):
+        """Release the response cache and the async client's connections."""
+        if self.cache is not None:
+            self.cache.close()
+        if self.llm is not None:
+            self.llm.close()
+
+    def _map_requests(self, executor, fn, *iterables):
+        """executor.map for concurrent LLM calls.
+
+        In Batch API mode every call runs before the first BatchPending is
+        raised, so all of a video's requests are collected in one pass
+        (executor.map would cancel the calls not yet started).
+        """
+        if self.batch is None:
+            return list(executor.map(fn, *iterables))
+        futures = [executor.submit(fn, *args) for args in zip(*iterables)]
+        wait(futures)
+        return [future.result() for future in futures]
+
     def _format_transcript(self, transcript):
         """Format transcript for comparison."""
-        return " ".join(str(entry['text']) for entry in transcript)
+        return " ".join(str(entry['text']) for entry in transcript or [])
+
+    @property
+    def encoding(self):
+        """The model's tiktoken encoding, loaded on first use."""
+        if self._encoding is None:
+            with self._encoding_lock:
+                if self._encoding is None:
+                    import tiktoken
+                    self._encoding = tiktoken.encoding_for_model(MODEL)
+        return self._encoding
 
     def count_tokens(self, text):
         """Count tokens in text using the model's tokenizer."""
         return len(self.encoding.encode(str(text)))
 
     def _confirm_token_usage(self, token_count):
-        """Ask for user confirmation if token count is high."""
-        if token_count > MAX_TOKENS_THRESHOLD:
+        """Ask for user confirmation if token count is high (interactive 'ask' policy only)."""
+        if self.interactive and self.budget.policy == 'ask' and token_count > MAX_TOKENS_THRESHOLD:
             response = input(f"\nThis will use approximately {token_count} tokens. Continue? (y/N): ")
             return response.lower() == 'y'
         return True
\ No newline at end of file
@@ -1,42 +1,408 @@
-from .models import Session, Video
+from .models import (
+    Session, SessionFactory, Video, StageRecord, TranscriptSegment, VideoAnalysis, TokenSpend, LLMBatch,
+    SyncSource
+)
 from datetime import datetime
 from pathlib import Path
+import hashlib
+import json
+import threading
+import time
+from sqlalchemy import select, exists, or_, delete, insert, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Rows per INSERT ... ON CONFLICT statement and IDs per IN (...) lookup,
+# kept well under SQLite's bound-parameter limit
+UPSERT_CHUNK = 500
+LOOKUP_CHUNK = 900
+
+# Bump a stage's version when its logic or prompt changes, so stored
+# results from the old version are recomputed on the next reprocess
+STAGE_VERSIONS = {
+    'metadata': 1,
+    'auto_transcript': 1,
+    'whisper': 1,
+    'correction': 1,
+    'analysis': 1,
+}
+
+# Columns compared to decide whether an existing row needs an update
+COMPARED_COLUMNS = (
+    'url', 'title', 'description', 'top_comments', 'transcript_file',
+    'analysis_file', 'info_quality_score', 'viewer_interest_score'
+)
+
+# Rows of token_spend each budget scope sums over; see reserve_spend
+SPEND_SCOPES = {
+    'video': "run_id = :run_id AND video_id = :video_id",
+    'run': "run_id = :run_id",
+    'minute': "created_at >= :window_start",
+}
+SPEND_MEASURES = {'tokens': 'total_tokens', 'cost': 'cost'}
+
+def content_hash(value):
+    """Stable SHA-256 of any JSON-serializable value."""
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
 
 class DatabaseHandler:
-    def __init__(self):
-        self.session = Session()
+    """Video store that can be shared by many threads across many videos.
+
+    Queries and writes use short-lived sessions from the connection pool;
+    `session` is the calling thread's own session for ORM access.
+    Writes are upserts, either one at a time (add_video) or buffered and
+    flushed in bulk (buffer_video / flush).
+    """
+
+    def __init__(self, batch_size=50):
+        self.batch_size = batch_size
+        self._pending = []
+        self._pending_lock = threading.Lock()
+
+    @property
+    def session(self):
+        return Session()
+
+    def _row(self, video_data):
+        """Map pipeline video data onto Video columns."""
+        return {
+            'id': video_data['video_id'],
+            'url': video_data['url'],
+            'title': video_data['metadata']['title'],
+            'description': video_data['metadata']['description'],
+            'top_comments': video_data['metadata']['top_comments'],
+            'transcript_file': video_data['transcript_file'],
+            'analysis_file': video_data['analysis_file'],
+            'info_quality_score': video_data.get('info_quality_score'),
+            'viewer_interest_score': video_data.get('viewer_interest_score'),
+            'processed_at': datetime.utcnow()
+        }
 
     def add_video(self, video_data):
         """Add or update video entry in database."""
-        try:
-            video = Video(
-                id=video_data['video_id'],
-                url=video_data['url'],
-                title=video_data['metadata']['title'],
-                description=video_data['metadata']['description'],
-                top_comments=video_data['metadata']['top_comments'],
-                transcript_file=video_data['transcript_file'],
-                analysis_file=video_data['analysis_file'],
-                info_quality_score=video_data.get('info_quality_score'),
-                viewer_interest_score=video_data.get('viewer_interest_score'),
-                processed_at=datetime.utcnow()
+        row = self._row(video_data)
+        self.add_videos([video_data])
+        return Video(**row)
+
+    def add_videos(self, videos):
+        """Insert or update many videos with INSERT ... ON CONFLICT DO UPDATE.
+
+        Existing rows are only rewritten when a compared column actually
+        changed; processed_at moves only along with such a change.
+        """
+        rows = [self._row(video_data) for video_data in videos]
+        if not rows:
+            return
+        with SessionFactory() as session:
+            try:
+                for i in range(0, len(rows), UPSERT_CHUNK):
+                    statement = sqlite_insert(Video).values(rows[i:i + UPSERT_CHUNK])
+                    statement = statement.on_conflict_do_update(
+                        index_elements=[Video.id],
+                        set_={
+                            column: statement.excluded[column]
+                            for column in rows[0] if column != 'id'
+                        },
+                        where=or_(*[
+                            Video.__table__.c[column].is_distinct_from(statement.excluded[column])
+                            for column in COMPARED_COLUMNS
+                        ])
+                    )
+                    session.execute(statement)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def buffer_video(self, video_data):
+        """Queue a video for the next bulk write; flushes every batch_size videos."""
+        with self._pending_lock:
+            self._pending.append(video_data)
+            if len(self._pending) < self.batch_size:
+                return
+            batch, self._pending = self._pending, []
+        self.add_videos(batch)
+
+    def flush(self):
+        """Write any buffered videos."""
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        self.add_videos(batch)
+
+    def load_stage(self, video_id, stage, input_hash):
+        """Return {'output': ...} if the stage already ran on these inputs, else None."""
+        with SessionFactory() as session:
+            record = session.get(StageRecord, (video_id, stage))
+            if (record is not None and record.input_hash == input_hash
+                    and record.version == STAGE_VERSIONS.get(stage, 1)):
+                return {'output': record.output}
+        return None
+
+    def save_stage(self, video_id, stage, input_hash, output):
+        """Record a stage's result together with the hash of its inputs."""
+        with SessionFactory() as session:
+            try:
+                statement = sqlite_insert(StageRecord).values(
+                    video_id=video_id,
+                    stage=stage,
+                    input_hash=input_hash,
+                    version=STAGE_VERSIONS.get(stage, 1),
+                    output=output,
+                    updated_at=datetime.utcnow()
+                )
+                statement = statement.on_conflict_do_update(
+                    index_elements=[StageRecord.video_id, StageRecord.stage],
+                    set_={
+                        column: statement.excluded[column]
+                        for column in ('input_hash', 'version', 'output', 'updated_at')
+                    }
+                )
+                session.execute(statement)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def save_transcripts(self, video_id, auto_transcript=None, whisper_transcript=None,
+                         corrected_segments=None):
+        """Replace a video's stored transcript segments, per source."""
+        sources = {}
+        if auto_transcript:
+            sources['auto'] = [{
+                'start_time': segment.get('start'),
+                'end_time': segment.get('start', 0) + segment.get('duration', 0),
+                'speaker': None,
+                'text': str(segment['text'])
+            } for segment in auto_transcript]
+        if whisper_transcript and whisper_transcript.get('segments'):
+            sources['whisper'] = [self._segment_row(s) for s in whisper_transcript['segments']]
+        if corrected_segments:
+            sources['corrected'] = [self._segment_row(s) for s in corrected_segments]
+        if not sources:
+            return
+
+        with SessionFactory() as session:
+            try:
+                for source, rows in sources.items():
+                    session.execute(delete(TranscriptSegment).where(
+                        TranscriptSegment.video_id == video_id,
+                        TranscriptSegment.source == source
+                    ))
+                    rows = [dict(row, video_id=video_id, source=source) for row in rows if row['text'].strip()]
+                    if rows:
+                        session.execute(insert(TranscriptSegment), rows)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def _segment_row(self, segment):
+        return {
+            'start_time': segment.get('start'),
+            'end_time': segment.get('end'),
+            'speaker': segment.get('speaker'),
+            'text': str(segment['text'])
+        }
+
+    def save_analysis(self, video_id, viewer_profile, analysis):
+        """Store (or replace) the analysis fields for a video."""
+        row = {
+            'video_id': video_id,
+            'viewer_profile': viewer_profile,
+            'salient_points': analysis.get('salient_points'),
+            'counterfactuals': analysis.get('counterfactuals'),
+            'bias': str(analysis.get('bias')) if analysis.get('bias') is not None else None,
+            'claims_to_review': analysis.get('claims_to_review'),
+            'info_quality': analysis.get('info_quality'),
+            'viewer_interest': analysis.get('viewer_interest'),
+            'created_at': datetime.utcnow()
+        }
+        with SessionFactory() as session:
+            try:
+                statement = sqlite_insert(VideoAnalysis).values(row)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[VideoAnalysis.video_id],
+                    set_={column: statement.excluded[column] for column in row if column != 'video_id'}
+                )
+                session.execute(statement)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def search(self, query, limit=20, source=None):
+        """Full-text search over transcript segments.
+
+        `query` uses SQLite FTS5 syntax (words, "exact phrases", OR, NOT,
+        prefix*). Returns the best matches as dicts with video_id, source,
+        start/end seconds, speaker and a highlighted snippet.
+        """
+        sql = """
+            SELECT s.video_id, s.source, s.start_time, s.end_time, s.speaker,
+                   snippet(segments_fts, 0, '[', ']', '...', 16) AS snippet
+            FROM segments_fts
+            JOIN transcript_segments s ON s.id = segments_fts.rowid
+            WHERE segments_fts MATCH :query
+        """
+        params = {'query': query, 'limit': limit}
+        if source:
+            sql += " AND s.source = :source"
+            params['source'] = source
+        sql += " ORDER BY rank LIMIT :limit"
+        with SessionFactory() as session:
+            rows = session.execute(text(sql), params).mappings().all()
+        return [dict(row) for row in rows]
+
+    def reserve_spend(self, run_id, video_id, stage, model, prompt_tokens,
+                      completion_tokens, cost, limits, window=60):
+        """Record an estimated LLM spend if it keeps every limit; return its row id or None.
+
+        `limits` maps names like 'video_tokens' or 'run_cost' (scope_measure,
+        see SPEND_SCOPES) to maximums. The check and the insert are a single
+        INSERT ... SELECT ... WHERE statement, which SQLite runs atomically,
+        so concurrent workers and processes can never overshoot together.
+        """
+        now = time.time()
+        params = {
+            'run_id': run_id,
+            'video_id': video_id,
+            'stage': stage,
+            'model': model,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'tokens': prompt_tokens + completion_tokens,
+            'cost': cost,
+            'now': now,
+            'window_start': now - window
+        }
+        conditions = []
+        for name, limit in limits.items():
+            scope, measure = name.split('_')
+            if scope == 'video' and video_id is None:
+                continue
+            conditions.append(
+                f"(SELECT COALESCE(SUM({SPEND_MEASURES[measure]}), 0) FROM token_spend "
+                f"WHERE {SPEND_SCOPES[scope]}) + :{measure} <= :{name}"
             )
-            
-            existing = self.session.query(Video).filter_by(id=video.id).first()
-            if existing:
-                # Update existing entry
-                for key, value in video_data.items():
-                    setattr(existing, key, value)
-            else:
-                # Add new entry
-                self.session.add(video)
-                
-            self.session.commit()
-            return video
-            
-        except Exception as e:
-            self.session.rollback()
-            raise e
+            params[name] = limit
+
+        sql = """
+            INSERT INTO token_spend (run_id, video_id, stage, model, prompt_tokens,
+                                     completion_tokens, total_tokens, cost, status, created_at)
+            SELECT :run_id, :video_id, :stage, :model, :prompt_tokens,
+                   :completion_tokens, :tokens, :cost, 'reserved', :now
+        """
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with SessionFactory() as session:
+            try:
+                result = session.execute(text(sql), params)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+        return result.lastrowid if result.rowcount else None
+
+    def settle_spend(self, spend_id, prompt_tokens, completion_tokens, cost):
+        """Replace a reservation's estimate with the call's actual usage."""
+        with SessionFactory() as session:
+            try:
+                session.query(TokenSpend).filter_by(id=spend_id).update({
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                    'cost': cost,
+                    'status': 'spent'
+                })
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def release_spend(self, spend_id):
+        """Drop a reservation whose call never completed."""
+        with SessionFactory() as session:
+            try:
+                session.query(TokenSpend).filter_by(id=spend_id).delete()
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def spend_totals(self, run_id, video_id=None, window=60):
+        """Tokens and cost so far per scope, keyed like reserve_spend's limits."""
+        params = {'run_id': run_id, 'video_id': video_id, 'window_start': time.time() - window}
+        totals = {}
+        with SessionFactory() as session:
+            for scope, where in SPEND_SCOPES.items():
+                if scope == 'video' and video_id is None:
+                    continue
+                row = session.execute(text(
+                    f"SELECT COALESCE(SUM(total_tokens), 0), COALESCE(SUM(cost), 0) "
+                    f"FROM token_spend WHERE {where}"
+                ), params).one()
+                totals[f'{scope}_tokens'], totals[f'{scope}_cost'] = int(row[0]), float(row[1])
+        return totals
+
+    def save_llm_batch(self, batch_id, requests):
+        """Record a submitted Batch API job and the reservations of its requests."""
+        with SessionFactory() as session:
+            try:
+                session.add(LLMBatch(id=batch_id, status='submitted', requests=requests))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def finish_llm_batch(self, batch_id, status):
+        """Mark a Batch API job as ingested or failed."""
+        with SessionFactory() as session:
+            try:
+                session.query(LLMBatch).filter_by(id=batch_id).update(
+                    {'status': status, 'finished_at': datetime.utcnow()}
+                )
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def pending_llm_batches(self):
+        """Submitted Batch API jobs whose results have not been ingested yet, as {id: requests}."""
+        with SessionFactory() as session:
+            batches = session.query(LLMBatch).filter_by(status='submitted').all()
+            return {batch.id: batch.requests or {} for batch in batches}
+
+    def sync_sources(self, urls):
+        """Marks of the given sync sources, as {url: {'kind', 'seen_ids', 'attempts'}}."""
+        urls = list(dict.fromkeys(urls))
+        marks = {}
+        with SessionFactory() as session:
+            for i in range(0, len(urls), LOOKUP_CHUNK):
+                chunk = urls[i:i + LOOKUP_CHUNK]
+                for source in session.scalars(select(SyncSource).where(SyncSource.url.in_(chunk))):
+                    marks[source.url] = {
+                        'kind': source.kind,
+                        'seen_ids': source.seen_ids or [],
+                        'attempts': source.attempts or {}
+                    }
+        return marks
+
+    def save_sync_source(self, url, kind, seen_ids=None, attempts=None):
+        """Record a sync source's mark and the videos it still owes."""
+        row = {'url': url, 'kind': kind, 'seen_ids': list(seen_ids or []), 'attempts': dict(attempts or {}),
+               'synced_at': datetime.utcnow()}
+        with SessionFactory() as session:
+            try:
+                statement = sqlite_insert(SyncSource).values(row)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[SyncSource.url],
+                    set_={column: statement.excluded[column] for column in row if column != 'url'}
+                )
+                session.execute(statement)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
 
     def get_video(self, video_id):
         """Retrieve video entry from database."""
@@ -44,8 +410,22 @@ class DatabaseHandler:
 
     def video_exists(self, video_id):
         """Check if video has been processed before."""
-        return self.session.query(Video).filter_by(id=video_id).count() > 0
+        with SessionFactory() as session:
+            return session.query(exists().where(Video.id == video_id)).scalar()
+
+    def existing_ids(self, video_ids):
+        """Return the subset of video_ids already in the database, in one pass."""
+        video_ids = list(dict.fromkeys(video_ids))
+        found = set()
+        with SessionFactory() as session:
+            for i in range(0, len(video_ids), LOOKUP_CHUNK):
+                chunk = video_ids[i:i + LOOKUP_CHUNK]
+                found.update(session.scalars(select(Video.id).where(Video.id.in_(chunk))))
+        return found
 
     def close(self):
-        """Close the database session."""
-        self.session.close() 
\ No newline at end of file
+        """Flush buffered writes and close this thread's database session."""
+        try:
+            self.flush()
+        finally:
+            Session.remove()
@@ -1,6 +1,6 @@
-from sqlalchemy import create_engine, Column, String, DateTime, Integer, JSON
+from sqlalchemy import create_engine, event, Column, String, DateTime, Integer, Float, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 from datetime import datetime
 import os
 from pathlib import Path
@@ -9,9 +9,25 @@ from pathlib import Path
 db_dir = Path(__file__).parent.parent.parent / 'data'
 db_dir.mkdir(exist_ok=True)
 
-# Create database engine
-DATABASE_URL = f"sqlite:///{db_dir}/videos.db"
-engine = create_engine(DATABASE_URL)
+# Create database engine; DATABASE_URL points elsewhere, e.g. a scratch database for benchmarks
+DATABASE_URL = os.getenv('DATABASE_URL', f"sqlite:///{db_dir}/videos.db")
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=10,
+    max_overflow=20,
+    connect_args={'check_same_thread': False, 'timeout': 30}
+)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent batch writers."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")     # Readers don't block the writer
+    cursor.execute("PRAGMA synchronous=NORMAL")   # Safe with WAL, far fewer fsyncs
+    cursor.execute("PRAGMA busy_timeout=30000")   # Wait for locks instead of failing
+    cursor.execute("PRAGMA cache_size=-65536")    # 64 MB page cache
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
 
 # Create declarative base
 Base = declarative_base()
@@ -30,8 +46,109 @@ class Video(Base):
     info_quality_score = Column(Integer)
     viewer_interest_score = Column(Integer)
 
+class StageRecord(Base):
+    """What a pipeline stage last produced for a video, and from which inputs."""
+    __tablename__ = 'video_stages'
+
+    video_id = Column(String, primary_key=True)
+    stage = Column(String, primary_key=True)
+    input_hash = Column(String, nullable=False)  # Hash of everything the stage read
+    version = Column(Integer, nullable=False)    # Stage version it was produced with
+    output = Column(JSON)                        # Stage result, reused when inputs are unchanged
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class TranscriptSegment(Base):
+    """One timed piece of a transcript; indexed for full-text search."""
+    __tablename__ = 'transcript_segments'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    video_id = Column(String, nullable=False)
+    source = Column(String, nullable=False)  # 'auto', 'whisper' or 'corrected'
+    start_time = Column(Float)               # Seconds from the start of the video
+    end_time = Column(Float)
+    speaker = Column(String)
+    text = Column(String, nullable=False)
+
+    __table_args__ = (Index('idx_segments_video_source', 'video_id', 'source'),)
+
+class VideoAnalysis(Base):
+    __tablename__ = 'video_analyses'
+
+    video_id = Column(String, primary_key=True)
+    viewer_profile = Column(String)
+    salient_points = Column(JSON)
+    counterfactuals = Column(JSON)
+    bias = Column(String)
+    claims_to_review = Column(JSON)
+    info_quality = Column(Integer)
+    viewer_interest = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class TokenSpend(Base):
+    """Tokens and cost of one LLM call, reserved before it is sent and settled after."""
+    __tablename__ = 'token_spend'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String, nullable=False)
+    video_id = Column(String)
+    stage = Column(String)
+    model = Column(String)
+    prompt_tokens = Column(Integer, nullable=False)
+    completion_tokens = Column(Integer, nullable=False)
+    total_tokens = Column(Integer, nullable=False)
+    cost = Column(Float, nullable=False)
+    status = Column(String, nullable=False)  # 'reserved' (estimate) or 'spent' (actual usage)
+    created_at = Column(Float, nullable=False)  # Unix time, for the per-minute window
+
+    __table_args__ = (
+        Index('idx_spend_run_video', 'run_id', 'video_id'),
+        Index('idx_spend_created', 'created_at'),
+    )
+
+class LLMBatch(Base):
+    """A request file submitted to the OpenAI Batch API, kept until its results are ingested."""
+    __tablename__ = 'llm_batches'
+
+    id = Column(String, primary_key=True)      # Batch ID from the API
+    status = Column(String, nullable=False)    # 'submitted', 'ingested' or 'failed'
+    requests = Column(JSON)                    # custom_id -> budget reservation ID
+    submitted_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+class SyncSource(Base):
+    """A playlist or channel kept in sync, with how far it has been listed."""
+    __tablename__ = 'sync_sources'
+
+    url = Column(String, primary_key=True)     # Normalized source URL
+    kind = Column(String, nullable=False)      # 'channel' (newest first) or 'playlist' (either order)
+    seen_ids = Column(JSON)                    # IDs at the top of the last listing (the mark)
+    attempts = Column(JSON)                    # video_id -> failed attempts, for videos still owed
+    synced_at = Column(DateTime)
+
 # Create all tables
 Base.metadata.create_all(engine)
 
-# Create session factory
-Session = sessionmaker(bind=engine) 
\ No newline at end of file
+# FTS5 index over segment text, kept in sync with triggers
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+        text, content='transcript_segments', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS transcript_segments_ai AFTER INSERT ON transcript_segments BEGIN
+        INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transcript_segments_ad AFTER DELETE ON transcript_segments BEGIN
+        INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transcript_segments_au AFTER UPDATE ON transcript_segments BEGIN
+        INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+with engine.begin() as connection:
+    for statement in FTS_DDL:
+        connection.exec_driver_sql(statement)
+
+# Create session factories: SessionFactory() opens a new short-lived session,
+# Session() returns the calling thread's long-lived one
+SessionFactory = sessionmaker(bind=engine)
+Session = scoped_session(SessionFactory)
\ No newline at end of file
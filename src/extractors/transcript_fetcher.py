@@ -0,0 +1,274 @@
+import json
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from config import (
+    TRANSCRIPT_LANGUAGES, TRANSCRIPT_WORKERS, TRANSCRIPT_MAX_RETRIES, TRANSCRIPT_BACKOFF_BASE,
+    TRANSCRIPT_BACKOFF_MAX, TRANSCRIPT_CACHE_PATH, TRANSCRIPT_RECHECK_TTL
+)
+from src.metrics import metrics
+
+class TranscriptCache:
+    """Raw YouTube transcripts on disk, keyed by video ID and language.
+
+    Transcripts do not change once published, so they are kept for good.
+    Which transcript a preference list resolved to is kept separately,
+    per list: a choice other than manual captions in the first preferred
+    language (including "none") is only trusted for `recheck_ttl` seconds,
+    since better captions can be added later.
+    """
+
+    def __init__(self, path=TRANSCRIPT_CACHE_PATH, recheck_ttl=TRANSCRIPT_RECHECK_TTL):
+        self.path = Path(path)
+        self.recheck_ttl = recheck_ttl
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS transcripts (
+                video_id TEXT NOT NULL,
+                language TEXT NOT NULL,
+                generated INTEGER NOT NULL,
+                segments TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (video_id, language, generated)
+            )
+        """)
+        # language is NULL when the video has no transcript in any preferred language
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS choices (
+                video_id TEXT NOT NULL,
+                languages TEXT NOT NULL,
+                language TEXT,
+                generated INTEGER,
+                chosen_at REAL NOT NULL,
+                PRIMARY KEY (video_id, languages)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, video_id, languages):
+        """(found, segments) for the transcript `languages` resolved to when last fetched.
+
+        `found` is False on a miss, or when the choice is due to be
+        checked again; segments is None if the video is known to have no
+        transcript in these languages.
+        """
+        languages = list(languages)
+        with self._lock:
+            choice = self._conn.execute(
+                "SELECT language, generated, chosen_at FROM choices WHERE video_id = ? AND languages = ?",
+                (video_id, json.dumps(languages))
+            ).fetchone()
+        if choice is None:
+            return False, None
+        language, generated, chosen_at = choice
+        # Nothing can be preferred to manual captions in the first language
+        best = bool(languages) and language == languages[0] and not generated
+        if not best and time.time() - chosen_at >= self.recheck_ttl:
+            return False, None
+        if language is None:
+            return True, None
+        segments = self.transcript(video_id, language, generated)
+        return segments is not None, segments
+
+    def transcript(self, video_id, language, generated):
+        """A stored transcript's segments, or None if it is not cached."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT segments FROM transcripts WHERE video_id = ? AND language = ? AND generated = ?",
+                (video_id, language, int(generated))
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, video_id, language, generated, segments):
+        """Store a fetched transcript."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts (video_id, language, generated, segments, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (video_id, language, int(generated), json.dumps(segments, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def choose(self, video_id, languages, language=None, generated=False):
+        """Remember which transcript `languages` resolved to (language None: there is none)."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO choices (video_id, languages, language, generated, chosen_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (video_id, json.dumps(list(languages)), language,
+                 None if language is None else int(generated), time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class TranscriptFetcher:
+    """Fetch YouTube transcripts for many videos at once.
+
+    Requests go through a bounded pool of `workers` threads sharing one
+    HTTP session, and failed requests (network errors, YouTube throttling)
+    are retried with exponential backoff and full jitter. For each video
+    the first language in `languages` with captions wins, taking manual
+    captions before auto-generated ones. Every transcript is cached on
+    disk, so reprocessing a video never downloads it again.
+    """
+
+    def __init__(self, languages=TRANSCRIPT_LANGUAGES, workers=TRANSCRIPT_WORKERS,
+                 max_retries=TRANSCRIPT_MAX_RETRIES, backoff_base=TRANSCRIPT_BACKOFF_BASE,
+                 backoff_max=TRANSCRIPT_BACKOFF_MAX, cache=None):
+        self.languages = tuple(languages)
+        self.workers = max(1, int(workers))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache if cache is not None else TranscriptCache()
+        self.retries = 0
+        # Created on first use; youtube-transcript-api and requests are slow to import
+        self._api = None
+        self._executor = None
+        self._futures = {}  # video_id -> Future of a prefetch in progress
+        self._lock = threading.Lock()
+
+    def _client(self):
+        with self._lock:
+            if self._api is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from youtube_transcript_api import YouTubeTranscriptApi
+                session = requests.Session()
+                # One pooled connection per worker
+                adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._api = YouTubeTranscriptApi(http_client=session)
+            return self._api
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix="transcripts")
+            return self._executor
+
+    def fetch(self, video_id):
+        """A video's transcript as [{'text', 'start', 'duration'}], or None if it has none."""
+        with self._lock:
+            future = self._futures.get(video_id)
+        if future is not None:
+            # Already being fetched by prefetch()
+            return future.result()
+        return self._fetch(video_id)
+
+    def fetch_many(self, video_ids):
+        """{video_id: transcript or None} for many videos, fetched concurrently."""
+        futures = self.prefetch(video_ids)
+        return {video_id: future.result() for video_id, future in futures.items()}
+
+    def prefetch(self, video_ids):
+        """Start fetching transcripts in the background; returns {video_id: Future}.
+
+        fetch() for a video being prefetched waits for that request instead
+        of sending its own.
+        """
+        pool = self._pool()
+        futures, started = {}, []
+        with self._lock:
+            for video_id in dict.fromkeys(video_ids):
+                future = self._futures.get(video_id)
+                if future is None:
+                    future = pool.submit(self._fetch, video_id)
+                    self._futures[video_id] = future
+                    started.append(video_id)
+                futures[video_id] = future
+        # Outside the lock: a finished future runs its callback right away
+        for video_id in started:
+            futures[video_id].add_done_callback(lambda _, video_id=video_id: self._done(video_id))
+        return futures
+
+    def _done(self, video_id):
+        # The result is in the cache now
+        with self._lock:
+            self._futures.pop(video_id, None)
+
+    def _fetch(self, video_id):
+        found, segments = self.cache.get(video_id, self.languages)
+        if found:
+            metrics.count('transcript_cache_hits', 1, video_id)
+            return segments
+        metrics.count('transcript_cache_misses', 1, video_id)
+
+        from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled
+        try:
+            with metrics.time('auto_transcript', video_id):
+                transcript = self._with_retries(lambda: self._select(video_id))
+                segments = None
+                if transcript is not None:
+                    # Chosen before under another preference list
+                    segments = self.cache.transcript(video_id, transcript.language_code, transcript.is_generated)
+                    if segments is None:
+                        segments = self._with_retries(lambda: transcript.fetch().to_raw_data())
+                        self.cache.set(video_id, transcript.language_code, transcript.is_generated, segments)
+        except (NoTranscriptFound, TranscriptsDisabled):
+            transcript = None
+        except Exception as e:
+            # Not cached: a later run tries again
+            print(f"Error getting transcript for {video_id}: {e}")
+            return None
+
+        if transcript is None:
+            print(f"No transcript for {video_id} in {', '.join(self.languages)}")
+            self.cache.choose(video_id, self.languages)
+            return None
+        self.cache.choose(video_id, self.languages, transcript.language_code, transcript.is_generated)
+        return segments
+
+    def _select(self, video_id):
+        """The preferred transcript of a video, or None if none is in a preferred language."""
+        transcripts = {}
+        for transcript in self._client().list(video_id):
+            transcripts[(transcript.language_code, transcript.is_generated)] = transcript
+        for language in self.languages:
+            for generated in (False, True):
+                if (language, generated) in transcripts:
+                    return transcripts[(language, generated)]
+        return None
+
+    def _with_retries(self, call):
+        """Run `call`, retrying transient failures with exponential backoff and full jitter."""
+        import requests
+        from youtube_transcript_api import YouTubeRequestFailed, RequestBlocked
+        attempt = 0
+        while True:
+            try:
+                return call()
+            except (requests.RequestException, YouTubeRequestFailed, RequestBlocked) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                print(f"Transcript request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                with self._lock:
+                    self.retries += 1
+                attempt += 1
+                time.sleep(delay)
+
+    def close(self):
+        """Cancel outstanding prefetches and close the cache."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self.cache.close()
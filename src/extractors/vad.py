@@ -0,0 +1,100 @@
+import sys
+from bisect import bisect_right
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from config import WHISPER_VAD_THRESHOLD, WHISPER_VAD_MIN_SILENCE, WHISPER_VAD_PAD, WHISPER_VAD_GAP
+
+class SpeechMap:
+    """Speech regions of a recording, and the offset map of its speech-only version.
+
+    `compact()` joins the regions, with `gap` samples of silence between
+    them, into a shorter buffer; `to_original()` maps a time in that
+    buffer back to the original recording. Regions are (start, end)
+    sample offsets, sorted and not overlapping.
+    """
+
+    def __init__(self, regions, total, sample_rate, gap=0):
+        self.regions = list(regions)
+        self.total = total
+        self.sample_rate = sample_rate
+        self.gap = gap
+        # Where each region starts in the compacted buffer
+        self.starts = []
+        position = 0
+        for start, end in self.regions:
+            self.starts.append(position)
+            position += end - start + gap
+        self.length = max(0, position - gap)
+
+    @property
+    def removed_seconds(self):
+        """Audio left out of the compacted buffer."""
+        return (self.total - self.length) / self.sample_rate
+
+    def compact(self, audio):
+        """The speech-only buffer: the regions of `audio`, joined by short silences."""
+        compacted = np.zeros(self.length, dtype=np.float32)
+        for (start, end), position in zip(self.regions, self.starts):
+            compacted[position:position + end - start] = audio[start:end]
+        return compacted
+
+    def to_original(self, seconds):
+        """Map a time in the compacted buffer to the original recording."""
+        if not self.regions:
+            return seconds
+        sample = seconds * self.sample_rate
+        index = max(0, bisect_right(self.starts, sample) - 1)
+        start, end = self.regions[index]
+        # Times in the silence after a region map to that region's end
+        offset = min(max(0.0, sample - self.starts[index]), end - start)
+        return round((start + offset) / self.sample_rate, 3)
+
+    def map_segments(self, segments):
+        """Copies of timed segments (and their words) with times in the original recording."""
+        mapped = []
+        for segment in segments:
+            segment = dict(segment)
+            for key in ('start', 'end'):
+                if segment.get(key) is not None:
+                    segment[key] = self.to_original(segment[key])
+            if segment.get('words'):
+                segment['words'] = [
+                    {**word, **{key: self.to_original(word[key]) for key in ('start', 'end')
+                                if word.get(key) is not None}}
+                    for word in segment['words']
+                ]
+            mapped.append(segment)
+        return mapped
+
+def detect_speech(audio, sample_rate, threshold=WHISPER_VAD_THRESHOLD, min_silence=WHISPER_VAD_MIN_SILENCE,
+                  pad=WHISPER_VAD_PAD, gap=WHISPER_VAD_GAP):
+    """Find the speech in 16 kHz mono audio with the Silero VAD bundled with faster-whisper.
+
+    Silence, music and other non-speech lasting at least `min_silence`
+    seconds is left out; `pad` seconds are kept around each speech region.
+    Returns a SpeechMap whose compacted buffer keeps `gap` seconds of
+    silence between regions, so words on either side of a cut stay apart.
+    """
+    # Imported here: faster-whisper loads onnxruntime
+    from faster_whisper.vad import get_speech_timestamps
+    timestamps = get_speech_timestamps(
+        np.asarray(audio, dtype=np.float32),
+        threshold=threshold,
+        min_silence_duration_ms=int(min_silence * 1000),
+        speech_pad_ms=int(pad * 1000)
+    )
+
+    # Padding can make neighbouring regions overlap
+    regions = []
+    for stamp in timestamps:
+        start, end = int(stamp['start']), min(int(stamp['end']), len(audio))
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        elif end > start:
+            regions.append((start, end))
+    return SpeechMap(regions, len(audio), sample_rate, int(gap * sample_rate))
@@ -1,23 +1,54 @@
 import os
 import sys
+import copy
 from pathlib import Path
 from tqdm import tqdm
 import time
 from datetime import datetime, timedelta
 import signal
-import whisperx
-import torch
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import yt_dlp
 
 # Add the project root directory to Python path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from config import WHISPER_MODEL, DEVICE
+from config import (
+    WHISPER_MODEL, WHISPER_COMPUTE_PROFILE, WHISPER_BATCH_SIZE, WHISPER_THREADS,
+    WHISPER_STREAM_AUDIO, WHISPER_MEMMAP_SECONDS, TEMP_AUDIO_DIR, WHISPER_VAD, WHISPER_VAD_MIN_SAVING,
+    detect_device
+)
+from src.extractors.vad import detect_speech
+from src.extractors.whisper_profiles import select_profile
+from src.metrics import metrics
+
+# WhisperX works on 16 kHz mono float32 audio
+SAMPLE_RATE = 16000
 
 class WhisperExtractor:
-    def __init__(self):
+    def __init__(self, model_name=None, profile=None, batch_size=None, threads=None,
+                 stream_audio=WHISPER_STREAM_AUDIO, vad=WHISPER_VAD):
+        self.model_name = model_name or WHISPER_MODEL
+        self.profile = select_profile(
+            detect_device(),
+            profile or WHISPER_COMPUTE_PROFILE,
+            batch_size=batch_size or WHISPER_BATCH_SIZE,
+            threads=threads or WHISPER_THREADS
+        )
+        # Decode the audio stream straight into memory instead of writing a WAV
+        self.stream_audio = stream_audio
+        # Transcribe only the speech found by voice activity detection
+        self.vad = vad
         self.model = None
         self.diarize_model = None
-        self._whisperx = None  # Add this to lazy load the entire module
+        self.align_models = {}  # language code -> (model, metadata)
+        # whisperx and torch take seconds to import; see _load_dependencies
+        self._whisperx = None
         self._torch = None
         self.ydl_opts = {
             'format': 'bestaudio/best',
@@ -28,9 +59,7 @@ class WhisperExtractor:
             }],
             'quiet': True,
             'no_warnings': True,
-            'progress_hooks': [self._download_progress_hook],
         }
-        self.pbar = None
         self.cancelled = False
 
     def _load_dependencies(self):
@@ -46,41 +75,67 @@ class WhisperExtractor:
         """Lazy load the WhisperX models when needed."""
         if self.model is None:
             self._load_dependencies()
-            print("\nLoading WhisperX models...")
+            print(f"\nLoading WhisperX models ({self.model_name}, {self.profile['name']})...")
             try:
                 self.model = self._whisperx.load_model(
-                    WHISPER_MODEL,
-                    device=DEVICE,
-                    compute_type="float16"
+                    self.model_name,
+                    device=self.profile['device'],
+                    compute_type=self.profile['compute_type'],
+                    threads=self.profile['threads']
                 )
                 
                 self.diarize_model = self._whisperx.DiarizationPipeline(
                     use_auth_token=None,
-                    device=DEVICE
+                    device=self.profile['device']
                 )
             except Exception as e:
                 print(f"Error loading models: {str(e)}")
                 raise
 
-    def _download_progress_hook(self, d):
-        if d['status'] == 'downloading':
-            if self.pbar is None:
-                total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                self.pbar = tqdm(
-                    total=total,
-                    unit='iB',
-                    unit_scale=True,
-                    desc="Downloading audio"
-                )
-            downloaded = d.get('downloaded_bytes', 0)
-            self.pbar.update(downloaded - self.pbar.n)
-        elif d['status'] == 'finished':
-            if self.pbar:
-                self.pbar.close()
-                self.pbar = None
-
-    def download_audio(self, url, output_path):
-        """Download audio from YouTube video."""
+    def _get_align_model(self, language):
+        """Load (once per language) the alignment model for a transcript."""
+        if language not in self.align_models:
+            self.align_models[language] = self._whisperx.load_align_model(
+                language_code=language,
+                device=self.profile['device']
+            )
+        return self.align_models[language]
+
+    def _make_progress_hook(self):
+        """Build a yt-dlp progress hook with its own bar, so downloads can run concurrently."""
+        state = {'pbar': None}
+
+        def hook(d):
+            if d['status'] == 'finished':
+                metrics.count('bytes_downloaded', d.get('downloaded_bytes') or d.get('total_bytes') or 0)
+            if d['status'] == 'downloading':
+                if state['pbar'] is None:
+                    total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
+                    state['pbar'] = tqdm(
+                        total=total,
+                        unit='iB',
+                        unit_scale=True,
+                        desc="Downloading audio"
+                    )
+                downloaded = d.get('downloaded_bytes', 0)
+                state['pbar'].update(downloaded - state['pbar'].n)
+            elif d['status'] == 'finished':
+                close()
+
+        def close():
+            if state['pbar']:
+                state['pbar'].close()
+                state['pbar'] = None
+
+        return hook, close
+
+    def download_audio(self, url, output_path, info=None):
+        """Download audio from YouTube video.
+
+        If an info dict from an earlier extraction is given, only the audio
+        format selection and download run here, with no second extraction.
+        """
+        hook, close_pbar = self._make_progress_hook()
         try:
             # Ensure the directory exists
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -88,104 +143,236 @@ class WhisperExtractor:
             # Modify options to include the output path
             opts = dict(self.ydl_opts)
             opts['outtmpl'] = output_path
+            opts['progress_hooks'] = [hook]
             
-            with yt_dlp.YoutubeDL(opts) as ydl:
+            with yt_dlp.YoutubeDL(opts) as ydl, metrics.time('download'):
                 # Download the file
-                ydl.download([url])
+                if info is not None:
+                    # Comments are not needed to pick a format
+                    info = copy.deepcopy({k: v for k, v in info.items() if k != 'comments'})
+                    ydl.process_ie_result(info, download=True)
+                else:
+                    ydl.download([url])
                 
                 # The file should exist with .mp3 extension due to the postprocessor
                 if os.path.exists(output_path):
                     return output_path
-                # If not found, try with .mp3 extension
-                mp3_path = f"{os.path.splitext(output_path)[0]}.mp3"
-                if os.path.exists(mp3_path):
-                    return mp3_path
-                raise FileNotFoundError(f"Could not find downloaded audio file at {output_path} or {mp3_path}")
+                # If not found, try the extensions the postprocessor may have used
+                for ext in ('.wav', '.mp3'):
+                    candidate = f"{os.path.splitext(output_path)[0]}{ext}"
+                    if os.path.exists(candidate):
+                        return candidate
+                raise FileNotFoundError(f"Could not find downloaded audio file at {output_path}")
                 
         except Exception as e:
             print(f"Error downloading audio: {str(e)}")
             raise
         finally:
-            if self.pbar:
-                self.pbar.close()
-                self.pbar = None
+            close_pbar()
+
+    def load_audio_stream(self, url, info=None, temp_dir=None):
+        """Decode a video's audio stream to a 16 kHz mono float32 array.
+
+        The selected audio format is piped through a single ffmpeg decode
+        with no intermediate file. Audio longer than WHISPER_MEMMAP_SECONDS
+        is written as raw samples to `temp_dir` and memory-mapped instead of
+        held in RAM. Returns (audio, raw_path), where raw_path is the file
+        backing a memory map, or None.
+        """
+        with yt_dlp.YoutubeDL({k: v for k, v in self.ydl_opts.items() if k != 'postprocessors'}) as ydl:
+            if info is not None:
+                # Only the format choice runs here; no second extraction
+                info = copy.deepcopy({k: v for k, v in info.items() if k != 'comments'})
+                selected = ydl.process_ie_result(info, download=False)
+            else:
+                selected = ydl.extract_info(url, download=False)
+
+        command = ['ffmpeg', '-nostdin', '-loglevel', 'error']
+        headers = selected.get('http_headers') or {}
+        if headers:
+            command += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())]
+        command += ['-i', selected['url'], '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 'f32le', 'pipe:1']
+
+        duration = selected.get('duration') or 0
+        raw_path = None
+        if temp_dir and duration > WHISPER_MEMMAP_SECONDS:
+            raw_path = os.path.join(temp_dir, "audio.f32")
+            sink = open(raw_path, 'wb')
+        else:
+            sink = None
+            buffer = bytearray()
+
+        # Decoding streams the download, so this is download and decode time
+        with metrics.time('download'):
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                with tqdm(total=int(duration * SAMPLE_RATE * 4) or None, unit='iB',
+                          unit_scale=True, desc="Decoding audio") as pbar:
+                    for chunk in iter(lambda: process.stdout.read(1 << 20), b''):
+                        if sink:
+                            sink.write(chunk)
+                        else:
+                            buffer.extend(chunk)
+                        pbar.update(len(chunk))
+                process.wait()
+                if process.returncode != 0:
+                    raise RuntimeError(f"ffmpeg failed: {process.stderr.read().decode(errors='replace').strip()}")
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                process.stdout.close()
+                process.stderr.close()
+                if sink:
+                    sink.close()
+
+        # ffmpeg does not report its input size; the format's size is the best estimate
+        metrics.count('bytes_downloaded', selected.get('filesize') or selected.get('filesize_approx') or 0)
+
+        if raw_path:
+            return np.memmap(raw_path, dtype=np.float32, mode='r'), raw_path
+        return np.frombuffer(buffer, dtype=np.float32), None
+
+    def fetch_audio(self, url, info=None):
+        """Get a video's audio as a 16 kHz array in a private work directory.
+
+        Every call gets its own directory under TEMP_AUDIO_DIR, so concurrent
+        jobs never share files. Returns an audio job dict; pass it to
+        release_audio() once it has been transcribed.
+        """
+        os.makedirs(TEMP_AUDIO_DIR, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix="job-", dir=TEMP_AUDIO_DIR)
+        try:
+            if self.stream_audio:
+                audio, _ = self.load_audio_stream(url, info, work_dir)
+            else:
+                actual_file = self.download_audio(url, os.path.join(work_dir, "audio"), info=info)
+                self._load_dependencies()
+                audio = self._whisperx.load_audio(actual_file)
+        except BaseException:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        return {'url': url, 'audio': audio, 'work_dir': work_dir}
+
+    def release_audio(self, audio_job):
+        """Remove an audio job's work directory."""
+        try:
+            shutil.rmtree(audio_job['work_dir'])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error during cleanup: {str(e)}")
+
+    def _detect_speech(self, audio):
+        """A SpeechMap for the audio, or None to transcribe all of it."""
+        if not self.vad:
+            return None
+        try:
+            with metrics.time('vad'):
+                speech = detect_speech(audio, SAMPLE_RATE)
+        except Exception as e:
+            print(f"Voice activity detection failed, transcribing all audio: {str(e)}")
+            return None
+        if not speech.regions or speech.total - speech.length < WHISPER_VAD_MIN_SAVING * speech.total:
+            # No speech found (better let Whisper decide), or too little to cut
+            return None
+        print(f"Voice activity detection: cut {speech.removed_seconds:.0f}s of "
+              f"{speech.total / SAMPLE_RATE:.0f}s without speech")
+        metrics.count('audio_seconds_cut', speech.removed_seconds)
+        return speech
+
+    def transcribe_audio(self, audio):
+        """Transcribe, align and diarize a decoded audio buffer.
+
+        With voice activity detection on, all three steps run on a
+        speech-only copy of the audio, and segment times are mapped back
+        to the original recording.
+        """
+        self._load_models()
+        speech = self._detect_speech(audio)
+        if speech is not None:
+            audio = speech.compact(audio)
+
+        with tqdm(total=4, desc="Processing", unit="step") as pbar:
+            # Transcribe with original whisper model
+            with metrics.time('transcribe'):
+                result = self.model.transcribe(audio, batch_size=self.profile['batch_size'])
+            pbar.update(1)
+
+            if self.cancelled:
+                raise KeyboardInterrupt("WhisperX transcription cancelled")
+
+            # Align whisper output
+            with metrics.time('align'):
+                align_model, align_metadata = self._get_align_model(result["language"])
+                result = self._whisperx.align(
+                    result["segments"],
+                    align_model,
+                    align_metadata,
+                    audio,
+                    self.profile['device'],
+                    return_char_alignments=False
+                )
+            pbar.update(1)
+
+            if self.cancelled:
+                raise KeyboardInterrupt("WhisperX transcription cancelled")
+
+            # Get speaker diarization
+            with metrics.time('diarize'):
+                diarize_segments = self.diarize_model(audio)
+            pbar.update(1)
+
+            if self.cancelled:
+                raise KeyboardInterrupt("WhisperX transcription cancelled")
+
+            # Assign speaker labels
+            with metrics.time('assign_speakers'):
+                result = self._whisperx.assign_word_speakers(
+                    diarize_segments,
+                    result
+                )
+            pbar.update(1)
 
-    def get_whisper_transcript(self, url):
+        # Format the result
+        segments = []
+        timed = result["segments"] if speech is None else speech.map_segments(result["segments"])
+        for segment in timed:
+            segments.append({
+                'text': segment['text'],
+                'start': segment['start'],
+                'end': segment['end'],
+                'speaker': segment.get('speaker', 'Unknown')
+            })
+
+        return {
+            'text': ' '.join(s['text'] for s in segments),
+            'segments': segments
+        }
+
+    def get_whisper_transcript(self, url, info=None):
         """Get transcript using WhisperX."""
         self._load_models()
         
         self.cancelled = False
-        temp_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "temp_audio_files")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        temp_audio = os.path.join(temp_dir, "temp_audio")
-        actual_file = None
+        audio_job = None
         
+        # Signal handlers can only be installed from the main thread
+        on_main_thread = threading.current_thread() is threading.main_thread()
         original_handler = signal.getsignal(signal.SIGINT)
         
         try:
-            actual_file = self.download_audio(url, temp_audio)
-            if not os.path.exists(actual_file):
-                raise FileNotFoundError(f"Downloaded audio file not found: {actual_file}")
-                
-            print(f"\nTranscribing audio file: {actual_file}")
-            
             def signal_handler(signum, frame):
                 self.cancelled = True
                 signal.signal(signal.SIGINT, original_handler)
                 print("\nCancelling WhisperX transcription...")
             
-            signal.signal(signal.SIGINT, signal_handler)
-            
-            with tqdm(total=4, desc="Processing", unit="step") as pbar:
-                # Transcribe with original whisper model
-                result = self.model.transcribe(actual_file, batch_size=16)
-                pbar.update(1)
-                
-                if self.cancelled:
-                    raise KeyboardInterrupt("WhisperX transcription cancelled")
-
-                # Align whisper output
-                result = whisperx.align(
-                    result["segments"],
-                    self.model,
-                    actual_file,
-                    DEVICE,
-                    return_char_alignments=False
-                )
-                pbar.update(1)
-                
-                if self.cancelled:
-                    raise KeyboardInterrupt("WhisperX transcription cancelled")
+            if on_main_thread:
+                signal.signal(signal.SIGINT, signal_handler)
 
-                # Get speaker diarization
-                diarize_segments = self.diarize_model(actual_file)
-                pbar.update(1)
-                
-                if self.cancelled:
-                    raise KeyboardInterrupt("WhisperX transcription cancelled")
-
-                # Assign speaker labels
-                result = whisperx.assign_word_speakers(
-                    diarize_segments,
-                    result
-                )
-                pbar.update(1)
-
-                # Format the result
-                segments = []
-                for segment in result["segments"]:
-                    segments.append({
-                        'text': segment['text'],
-                        'start': segment['start'],
-                        'end': segment['end'],
-                        'speaker': segment.get('speaker', 'Unknown')
-                    })
-
-                return {
-                    'text': ' '.join(s['text'] for s in segments),
-                    'segments': segments
-                }
+            # Decode once; transcribe, align and diarize all share this buffer
+            audio_job = self.fetch_audio(url, info)
+            print("\nTranscribing audio")
+            return self.transcribe_audio(audio_job['audio'])
             
         except KeyboardInterrupt:
             print("\nWhisperX transcription cancelled")
@@ -194,11 +381,54 @@ class WhisperExtractor:
             print(f"Error in get_whisper_transcript: {str(e)}")
             return None
         finally:
-            signal.signal(signal.SIGINT, original_handler)
+            if on_main_thread:
+                signal.signal(signal.SIGINT, original_handler)
+            if audio_job:
+                self.release_audio(audio_job)
+
+    def transcribe_many(self, jobs, prefetch=2):
+        """Transcribe many videos, fetching audio for the next ones meanwhile.
+
+        `jobs` is an iterable of (url, info) pairs (info may be None).
+        Up to `prefetch` audio fetches run in background threads while the
+        current video is on the model. Yields (index, transcript) in input
+        order; transcript is None for a video that failed. Work directories
+        are removed as soon as each video is done, even on failure.
+        """
+        self._load_models()
+        self.cancelled = False
+        jobs = iter(enumerate(jobs))
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=max(1, prefetch)) as executor:
+            def submit_next():
+                for index, (url, info) in jobs:
+                    pending.append((index, url, executor.submit(self.fetch_audio, url, info)))
+                    return
+
             try:
-                if actual_file and os.path.exists(actual_file):
-                    os.remove(actual_file)
-                if os.path.exists(temp_dir) and not os.listdir(temp_dir):
-                    os.rmdir(temp_dir)
-            except Exception as e:
-                print(f"Error during cleanup: {str(e)}") 
\ No newline at end of file
+                for _ in range(max(1, prefetch)):
+                    submit_next()
+
+                while pending:
+                    index, url, future = pending.popleft()
+                    submit_next()
+                    audio_job = None
+                    try:
+                        audio_job = future.result()
+                        yield index, self.transcribe_audio(audio_job['audio'])
+                    except Exception as e:
+                        print(f"Error transcribing {url}: {str(e)}")
+                        yield index, None
+                    finally:
+                        if audio_job:
+                            self.release_audio(audio_job)
+            finally:
+                # Clean up prefetched audio if the caller stopped early
+                while pending:
+                    _, _, future = pending.popleft()
+                    if not future.cancel():
+                        try:
+                            self.release_audio(future.result())
+                        except Exception:
+                            pass
@@ -0,0 +1,40 @@
+import os
+
+# Compute profiles for WhisperX (faster-whisper / CTranslate2).
+# CTranslate2 only runs float16 kernels on CUDA, so CPU profiles use int8
+# weights with int8 or float32 activations.
+COMPUTE_PROFILES = {
+    'gpu-float16': {'device': 'cuda', 'compute_type': 'float16', 'batch_size': 16},
+    'gpu-int8_float16': {'device': 'cuda', 'compute_type': 'int8_float16', 'batch_size': 16},
+    'cpu-int8': {'device': 'cpu', 'compute_type': 'int8', 'batch_size': 4},
+    'cpu-int8_float32': {'device': 'cpu', 'compute_type': 'int8_float32', 'batch_size': 4},
+}
+
+# Used when no profile is requested
+DEFAULT_PROFILES = {
+    'cuda': 'gpu-float16',
+    'cpu': 'cpu-int8',
+}
+
+def profiles_for_device(device):
+    """Names of the profiles that can run on a device."""
+    return [name for name, profile in COMPUTE_PROFILES.items() if profile['device'] == device]
+
+def select_profile(device, name=None, batch_size=None, threads=None):
+    """Resolve the compute settings for a device.
+
+    `name` picks a profile from COMPUTE_PROFILES (default: the device's
+    default); `batch_size` and `threads` override the profile's values.
+    Raises ValueError if the profile cannot run on the device.
+    """
+    name = name or DEFAULT_PROFILES[device]
+    if name not in COMPUTE_PROFILES:
+        raise ValueError(f"Unknown Whisper compute profile: {name}")
+    profile = dict(COMPUTE_PROFILES[name], name=name)
+    if profile['device'] != device:
+        raise ValueError(f"Compute profile {name} needs {profile['device']}, but the device is {device}")
+    if batch_size:
+        profile['batch_size'] = batch_size
+    # CPU inference threads; CTranslate2 ignores this on GPU
+    profile['threads'] = threads or (os.cpu_count() or 4)
+    return profile
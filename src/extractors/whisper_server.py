@@ -0,0 +1,239 @@
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from config import WHISPER_SERVER_URL, WHISPER_SERVER_HOST, WHISPER_SERVER_PORT
+from src.metrics import metrics
+
+# Finished jobs nobody collected are dropped after this many seconds
+RESULT_TTL = 3600
+
+class TranscriptionService:
+    """Queue of Whisper jobs served by one resident WhisperExtractor.
+
+    The WhisperX, alignment and diarization models are loaded once at
+    startup and reused for every job, so many analyzer processes share one
+    copy of the models. A single worker transcribes queued jobs one after
+    another; inference is not batched across jobs, but audio for up to
+    `prefetch` queued jobs is downloaded and decoded while the current one
+    is on the model.
+    """
+
+    def __init__(self, extractor=None, prefetch=2):
+        if extractor is None:
+            from src.extractors.whisper_extractor import WhisperExtractor
+            extractor = WhisperExtractor()
+        self.extractor = extractor
+        self.prefetch = prefetch
+        self.jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def start(self):
+        """Load the models and start the worker thread."""
+        self.extractor._load_models()
+        self._worker = threading.Thread(target=self._run, name="whisper-worker", daemon=True)
+        self._worker.start()
+
+    def submit(self, url, info=None):
+        """Queue a transcription job and return its ID."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self.jobs[job_id] = {
+                'status': 'queued',
+                'url': url,
+                'info': info,
+                'submitted_at': time.time()
+            }
+        self._queue.put(job_id)
+        return job_id
+
+    def status(self, job_id):
+        """Return a job's public state.
+
+        Finished jobs are kept for RESULT_TTL seconds, so a poll whose
+        response was lost can be repeated.
+        """
+        with self._lock:
+            self._prune()
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: job[k] for k in ('status', 'result', 'error') if k in job}
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {
+            'status': 'ok',
+            'models_loaded': self.extractor.model is not None,
+            'jobs': counts
+        }
+
+    def _prune(self):
+        cutoff = time.time() - RESULT_TTL
+        for job_id in [k for k, job in self.jobs.items()
+                       if job['status'] in ('done', 'failed') and job.get('finished_at', 0) < cutoff]:
+            del self.jobs[job_id]
+
+    def _run(self):
+        while True:
+            self._process(self._queue.get())
+
+    def _drain(self, job_id, jobs):
+        """(url, info) of `job_id`, then of every job queued meanwhile, until the queue is empty.
+
+        Pulled lazily by transcribe_many, so jobs submitted while others
+        are being transcribed join the same pass and have their audio
+        prefetched; each job taken is appended to `jobs`.
+        """
+        while True:
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job is not None:
+                    job['status'] = 'running'
+                    jobs.append(job)
+                    pair = (job['url'], job.pop('info', None))
+            if job is not None:
+                yield pair
+            try:
+                job_id = self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _process(self, job_id):
+        jobs = []
+        results = self.extractor.transcribe_many(self._drain(job_id, jobs), prefetch=self.prefetch)
+        try:
+            for index, result in results:
+                update = {'status': 'done', 'result': result}
+                if result is None:
+                    update = {'status': 'failed', 'error': 'Whisper transcription failed'}
+                with self._lock:
+                    jobs[index].update(update, finished_at=time.time())
+        except Exception as e:
+            with self._lock:
+                for job in jobs:
+                    if job['status'] == 'running':
+                        job.update(status='failed', error=str(e), finished_at=time.time())
+
+def _make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                return self._send(200, service.stats())
+            if self.path == '/metrics':
+                # Download/transcribe/align/diarize timings of this server's jobs
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                return self.wfile.write(body)
+            if self.path.startswith('/jobs/'):
+                state = service.status(self.path[len('/jobs/'):])
+                if state is None:
+                    return self._send(404, {'error': 'unknown job'})
+                return self._send(200, state)
+            self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/jobs':
+                return self._send(404, {'error': 'not found'})
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                url = payload['url']
+            except (ValueError, KeyError) as e:
+                return self._send(400, {'error': f"invalid job: {str(e)}"})
+            self._send(202, {'id': service.submit(url, payload.get('info'))})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(host=WHISPER_SERVER_HOST, port=WHISPER_SERVER_PORT, prefetch=2):
+    """Run the transcription server until interrupted."""
+    service = TranscriptionService(prefetch=prefetch)
+    print("Loading Whisper models (once for this host)...")
+    service.start()
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    print(f"Whisper server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down Whisper server")
+    finally:
+        server.server_close()
+
+class WhisperClient:
+    """Drop-in replacement for WhisperExtractor that uses a running server."""
+
+    def __init__(self, server_url=WHISPER_SERVER_URL, poll_interval=2.0, timeout=30):
+        self.server_url = server_url.rstrip('/')
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        data = json.dumps(payload, default=str).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(
+            self.server_url + path,
+            data=data,
+            method=method,
+            headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def get_whisper_transcript(self, url, info=None):
+        """Get transcript from the server, or None if transcription failed."""
+        try:
+            payload = {'url': url}
+            if info is not None:
+                # Lets the server skip its own extraction; comments are not needed
+                payload['info'] = {k: v for k, v in info.items() if k != 'comments'}
+            # Queueing plus the server's download and transcription
+            with metrics.time('whisper_remote'):
+                job_id = self._request('POST', '/jobs', payload)['id']
+                while True:
+                    state = self._request('GET', f'/jobs/{job_id}')
+                    if state['status'] == 'done':
+                        return state['result']
+                    if state['status'] == 'failed':
+                        print(f"Error in get_whisper_transcript: {state.get('error')}")
+                        return None
+                    time.sleep(self.poll_interval)
+        except Exception as e:
+            print(f"Error contacting Whisper server: {str(e)}")
+            return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve WhisperX transcription with resident models.")
+    parser.add_argument('--host', default=WHISPER_SERVER_HOST)
+    parser.add_argument('--port', type=int, default=WHISPER_SERVER_PORT)
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help="Queued jobs whose audio is fetched while another is transcribed")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.prefetch)
@@ -1,48 +1,242 @@
-import yt_dlp
-from youtube_transcript_api import YouTubeTranscriptApi
+import re
+import sys
+import heapq
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from config import TOP_COMMENTS, MAX_COMMENTS, COMMENT_SORT, TRANSCRIPT_LANGUAGES
+from src.metrics import metrics
+
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_YOUTUBE_HOSTS = {
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+    'youtube-nocookie.com', 'www.youtube-nocookie.com',
+}
+_SHORT_HOSTS = {'youtu.be', 'www.youtu.be'}
+_PATH_PREFIXES = {'shorts', 'embed', 'live', 'v'}
+
+def parse_video_id(url):
+    """Get the video ID from a standard YouTube URL without any network call.
+
+    Handles watch, youtu.be, shorts, embed and live URLs. Returns None for
+    anything else (playlists, channels, other sites) so callers can fall
+    back to yt-dlp.
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = f"https://{url}"
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower()
+    parts = [part for part in parsed.path.split('/') if part]
+
+    candidate = ''
+    if host in _SHORT_HOSTS:
+        candidate = parts[0] if parts else ''
+    elif host in _YOUTUBE_HOSTS:
+        if parsed.path.rstrip('/') == '/watch':
+            candidate = parse_qs(parsed.query).get('v', [''])[0]
+        elif len(parts) >= 2 and parts[0] in _PATH_PREFIXES:
+            candidate = parts[1]
+
+    return candidate if _VIDEO_ID_RE.match(candidate) else None
+
+_CHANNEL_PREFIXES = {'channel', 'c', 'user'}
+
+def parse_source(url):
+    """Classify a playlist or channel URL for syncing, without any network call.
+
+    Returns (kind, normalized URL): ('playlist', .../playlist?list=ID), or
+    ('channel', .../videos) for @handle, /channel/, /c/ and /user/ URLs, so
+    flat extraction lists the channel's uploads, newest first. A channel's
+    uploads playlist (UU...) is listed newest first too, so it is a
+    'channel'. Returns None for anything else.
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = f"https://{url}"
+    parsed = urlparse(url)
+    if (parsed.hostname or '').lower() not in _YOUTUBE_HOSTS:
+        return None
+    parts = [part for part in parsed.path.split('/') if part]
+    playlist_id = parse_qs(parsed.query).get('list', [''])[0]
+    if playlist_id and (not parts or parts[0] in ('playlist', 'watch')):
+        kind = 'channel' if playlist_id.startswith('UU') else 'playlist'
+        return kind, f"https://www.youtube.com/playlist?list={playlist_id}"
+    if parts and parts[0].startswith('@'):
+        return 'channel', f"https://www.youtube.com/{parts[0]}/videos"
+    if len(parts) >= 2 and parts[0] in _CHANNEL_PREFIXES:
+        return 'channel', f"https://www.youtube.com/{parts[0]}/{parts[1]}/videos"
+    return None
+
+# Fields of a yt-dlp comment that are stored in Video.top_comments
+COMMENT_FIELDS = ('author', 'text', 'like_count', 'timestamp')
+
+def select_top_comments(comments, k):
+    """Keep the k most liked comments, trimmed to COMMENT_FIELDS.
+
+    Uses a bounded heap over the iterable, so memory stays O(k) and the
+    cost is O(n log k) instead of sorting every comment.
+    """
+    if k <= 0:
+        return []
+    top = heapq.nlargest(
+        k,
+        comments or [],
+        key=lambda c: c.get('like_count') or 0
+    )
+    return [{field: c.get(field) for field in COMMENT_FIELDS} for c in top]
 
 class YouTubeExtractor:
-    def __init__(self):
+    def __init__(self, cache_size=64, top_comments=TOP_COMMENTS,
+                 max_comments=MAX_COMMENTS, comment_sort=COMMENT_SORT, languages=TRANSCRIPT_LANGUAGES):
         self.ydl_opts = {
             'quiet': True,
             'no_warnings': True,
             'extract_flat': True,
         }
+        self.top_comments = top_comments
+        self.max_comments = max_comments
+        self.comment_sort = comment_sort
+        # Full info dicts, keyed by video ID (and by URL for non-standard URLs),
+        # so ID lookup, metadata, comments and audio download share one extraction
+        self.cache_size = cache_size
+        self._info_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Transcript languages in order of preference
+        self.languages = tuple(languages)
+        # Created on first use, so listing sources never opens the transcript cache
+        self._transcripts = None
+
+    def get_info(self, url):
+        """Return the full yt-dlp info dict for a video, extracting it at most once."""
+        key = parse_video_id(url) or url
+        with self._cache_lock:
+            if key in self._info_cache:
+                self._info_cache.move_to_end(key)
+                return self._info_cache[key]
+
+        # Imported on first use; yt-dlp is slow to import
+        import yt_dlp
+        video_id = parse_video_id(url)
+        # Comments are downloaded by the same extraction, so this includes them
+        with metrics.time('metadata', video_id):
+            with yt_dlp.YoutubeDL(self._info_opts()) as ydl:
+                info = ydl.extract_info(url, download=False)
+
+        # Only the top comments are ever used; drop the rest right away
+        with metrics.time('comments', info['id']):
+            comments = info.get('comments') or []
+            metrics.count('comments_fetched', len(comments), info['id'])
+            info['comments'] = select_top_comments(comments, self.top_comments)
+
+        with self._cache_lock:
+            for alias in {key, info['id']}:
+                self._info_cache[alias] = info
+                self._info_cache.move_to_end(alias)
+            while len(self._info_cache) > self.cache_size:
+                self._info_cache.popitem(last=False)
+        return info
+
+    def iter_source(self, url):
+        """Yield {'id', 'url', 'title'} for the videos of a playlist or channel, in listing order.
+
+        Uses flat extraction without processing the playlist, so pages of
+        entries are fetched only as the iteration reaches them; stopping
+        early (at a known video) skips the rest of the channel.
+        """
+        import yt_dlp
+        opts = {**self.ydl_opts, 'extract_flat': 'in_playlist', 'lazy_playlist': True}
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+            # Follow redirects (e.g. a channel ID resolving to its canonical URL)
+            for _ in range(3):
+                if info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, process=False)
+            for entry in info.get('entries') or []:
+                video_id = (entry or {}).get('id')
+                # Skip nested tabs/playlists and anything that is not a video
+                if not video_id or not _VIDEO_ID_RE.match(video_id) or entry.get('_type') == 'playlist':
+                    continue
+                yield {
+                    'id': video_id,
+                    'url': f"https://www.youtube.com/watch?v={video_id}",
+                    'title': entry.get('title')
+                }
+
+    def _info_opts(self):
+        """yt-dlp options for a full extraction with a bounded comment fetch."""
+        fetch_comments = self.top_comments > 0 and self.max_comments != 0
+        opts = {
+            **self.ydl_opts,
+            'getcomments': fetch_comments,
+            'extract_flat': False,
+        }
+        if fetch_comments:
+            # max_comments is "max-comments,max-parents,max-replies,max-replies-per-thread";
+            # replies are skipped since only top-level comments are ranked
+            limit = 'all' if self.max_comments is None or self.max_comments < 0 else str(self.max_comments)
+            opts['extractor_args'] = {
+                'youtube': {
+                    'comment_sort': [self.comment_sort],
+                    'max_comments': [limit, 'all', '0'],
+                }
+            }
+        return opts
+
+    def forget(self, url_or_id):
+        """Drop a cached info dict once every consumer is done with it."""
+        key = parse_video_id(url_or_id) or url_or_id
+        with self._cache_lock:
+            info = self._info_cache.pop(key, None)
+            if info is None:
+                return
+            # Also drop the other alias (video ID or non-standard URL)
+            for alias in [k for k, v in self._info_cache.items() if v is info]:
+                del self._info_cache[alias]
 
     def extract_video_id(self, url):
         """Extract video ID from URL."""
-        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            return info['id']
+        with metrics.time('video_id'):
+            video_id = parse_video_id(url)
+        if video_id:
+            return video_id
+        return self.get_info(url)['id']
 
     def extract_metadata(self, url):
         """Extract title, description, and top comments."""
-        with yt_dlp.YoutubeDL({
-            **self.ydl_opts,
-            'getcomments': True,
-            'extract_flat': False,
-        }) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            # Get top 5 liked comments
-            comments = info.get('comments', [])
-            top_comments = sorted(
-                comments,
-                key=lambda x: x.get('like_count', 0),
-                reverse=True
-            )[:5]
-
-            return {
-                'title': info['title'],
-                'description': info['description'],
-                'top_comments': top_comments
-            }
+        info = self.get_info(url)
+
+        return {
+            'title': info['title'],
+            'description': info['description'],
+            # Already reduced to the top liked comments by get_info
+            'top_comments': info.get('comments') or []
+        }
+
+    @property
+    def transcripts(self):
+        """The TranscriptFetcher behind get_auto_transcript and prefetch_transcripts."""
+        with self._cache_lock:
+            if self._transcripts is None:
+                from src.extractors.transcript_fetcher import TranscriptFetcher
+                self._transcripts = TranscriptFetcher(languages=self.languages)
+            return self._transcripts
 
     def get_auto_transcript(self, video_id):
-        """Get auto-generated transcript."""
-        try:
-            transcript = YouTubeTranscriptApi.get_transcript(video_id)
-            return transcript
-        except Exception as e:
-            print(f"Error getting auto-generated transcript: {e}")
-            return None 
\ No newline at end of file
+        """Get the transcript in the preferred language (manual captions before auto-generated)."""
+        return self.transcripts.fetch(video_id)
+
+    def prefetch_transcripts(self, video_ids):
+        """Start fetching many videos' transcripts in the background, ahead of get_auto_transcript."""
+        self.transcripts.prefetch(video_ids)
+
+    def close(self):
+        """Stop outstanding transcript prefetches."""
+        if self._transcripts is not None:
+            self._transcripts.close()
@@ -1,25 +1,76 @@
+# A timestamped paragraph starts at each change of speaker, and at least this often
+PARAGRAPH_SECONDS = 60
+
+def format_timestamp(seconds):
+    """Convert seconds to HH:MM:SS format."""
+    seconds = seconds or 0
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    seconds = int(seconds % 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
 class MarkdownFormatter:
     def format_transcript(self, transcript_data, timestamps=True):
         """Format transcript and processing report in Markdown."""
+        return "".join(self.iter_transcript(transcript_data, timestamps))
+
+    def iter_transcript(self, transcript_data, timestamps=True):
+        """format_transcript in pieces, so it can be written without building the whole document.
+
+        With timed segments (and `timestamps`), the corrected transcript is
+        rendered from them in paragraphs that start with a timestamp;
+        otherwise the corrected text is used as is.
+        """
+        yield self.format_transcript_header(transcript_data['whisper_used'])
+        segments = transcript_data.get('segments') if timestamps else None
+        if not segments:
+            # Split the transcript text into sections
+            for section in transcript_data['text'].split("# "):
+                if section.strip():
+                    # Add the section header back and the content
+                    yield f"## {section}"
+            return
+
+        yield "## Corrected Transcript\n"
+        paragraph = None
+        for segment in segments:
+            text, paragraph = self.format_segment(segment, paragraph)
+            yield text
+        yield self.format_changes(transcript_data['text'])
+
+    def format_segment(self, segment, paragraph=None):
+        """Markdown for one timed segment; returns (text, paragraph state for the next segment).
+
+        `paragraph` is the (speaker, start time) of the paragraph being
+        written, None before the first segment.
+        """
+        text = " ".join(str(segment['text']).split())
+        if not text:
+            return "", paragraph
+        speaker = segment.get('speaker')
+        start = segment.get('start') or 0
+        if paragraph is not None and speaker == paragraph[0] and start - paragraph[1] < PARAGRAPH_SECONDS:
+            return f" {text}", paragraph
+        label = f"{speaker}: " if speaker and speaker != 'Unknown' else ""
+        opening = "" if paragraph is None else "\n"
+        return f"{opening}\n[{self._format_timestamp(start)}] {label}{text}", (speaker, start)
+
+    def format_changes(self, text):
+        """The '## Changes Made' section of a corrected transcript's text, if it has one."""
+        if "# Changes Made" not in text:
+            return "\n"
+        return "\n\n## Changes Made" + text.split("# Changes Made", 1)[1].rstrip() + "\n"
+
+    def format_transcript_header(self, whisper_used):
+        """Title and processing information that open transcript.md."""
         md_lines = ["# Transcript Analysis\n\n"]
-        
+
         # Add transcription processing information
         md_lines.append("## Processing Information\n")
-        if transcript_data['whisper_used']:
+        if whisper_used:
             md_lines.append("This transcript was processed using both YouTube's auto-generated transcript and Whisper AI transcription.\n")
         else:
             md_lines.append("This transcript was processed using YouTube's auto-generated transcript only.\n")
-
-        # Split the transcript text into sections
-        content = transcript_data['text']
-        sections = content.split("# ")
-        
-        # Process each section
-        for section in sections:
-            if section.strip():
-                # Add the section header back and the content
-                md_lines.append(f"## {section}")
-                
         return "".join(md_lines)
 
     def format_analysis(self, analysis_results):
@@ -51,7 +102,4 @@ class MarkdownFormatter:
 
     def _format_timestamp(self, seconds):
         """Convert seconds to HH:MM:SS format."""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        seconds = int(seconds % 60)
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}" 
\ No newline at end of file
+        return format_timestamp(seconds)
\ No newline at end of file
@@ -0,0 +1,141 @@
+import json
+import os
+import sys
+import uuid
+from contextlib import contextmanager, ExitStack
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from config import TRANSCRIPT_FORMATS
+from src.formatters.markdown_formatter import MarkdownFormatter
+
+# Output file of each transcript format
+TRANSCRIPT_FILES = {
+    'md': "transcript.md",
+    'srt': "transcript.srt",
+    'vtt': "transcript.vtt",
+    'jsonl': "transcript.jsonl",
+}
+
+@contextmanager
+def atomic_open(path, mode='w', encoding='utf-8'):
+    """Write a file through a temporary file that replaces `path` only once complete.
+
+    The temporary file lives in the same directory, so the final rename is
+    atomic: readers and concurrent writers see either the old file or the
+    whole new one. If the block raises, the temporary file is removed and
+    `path` is left untouched.
+    """
+    path = Path(path)
+    # Unique per writer; created with the usual permissions, unlike mkstemp's 0600
+    temp_path = path.parent / f".{path.name}.{uuid.uuid4().hex[:12]}.tmp"
+    try:
+        with open(temp_path, mode.replace('w', 'x'), encoding=None if 'b' in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+def timed_segments(transcript_result, whisper_transcript=None, auto_transcript=None):
+    """The best timed segments for a video: corrected, else Whisper's, else YouTube's."""
+    if transcript_result.get('segments'):
+        return transcript_result['segments']
+    if whisper_transcript and whisper_transcript.get('segments'):
+        return whisper_transcript['segments']
+    return auto_transcript or []
+
+def _seconds(segment):
+    """(start, end) of a segment with either an end time or a duration (auto transcripts)."""
+    start = float(segment.get('start') or 0)
+    end = segment.get('end')
+    if end is None:
+        end = start + float(segment.get('duration') or 0)
+    return start, max(start, float(end))
+
+def _clock(seconds, separator):
+    """HH:MM:SS<separator>mmm, as used by SRT (',') and WebVTT ('.')."""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+class TranscriptWriter:
+    """Write a transcript as Markdown, SRT, WebVTT and JSONL in one pass over its segments.
+
+    Every format is streamed to its own file while the segments are read
+    once, so no output is ever held in memory as a whole; each file is
+    written atomically (see atomic_open).
+    """
+
+    def __init__(self, formats=TRANSCRIPT_FORMATS, formatter=None):
+        unknown = set(formats) - set(TRANSCRIPT_FILES)
+        if unknown:
+            raise ValueError(f"Unknown transcript formats: {', '.join(sorted(unknown))}")
+        self.formats = tuple(formats)
+        self.formatter = formatter or MarkdownFormatter()
+
+    def write(self, video_dir, transcript_result, whisper_transcript=None, auto_transcript=None):
+        """Write the transcript files into `video_dir`; returns {format: path}.
+
+        The Markdown is rendered from the corrected segments when there are
+        any, otherwise from the corrected text. Subtitles and JSONL use the
+        best timed segments available (see timed_segments).
+        """
+        video_dir = Path(video_dir)
+        video_dir.mkdir(parents=True, exist_ok=True)
+        segments = timed_segments(transcript_result, whisper_transcript, auto_transcript)
+        paths = {fmt: video_dir / TRANSCRIPT_FILES[fmt] for fmt in self.formats}
+        # Markdown paragraphs come from the same pass when the segments are the corrected ones
+        md_segments = 'md' in paths and bool(transcript_result.get('segments'))
+
+        with ExitStack() as stack:
+            files = {fmt: stack.enter_context(atomic_open(path)) for fmt, path in paths.items()}
+            md, srt, vtt, jsonl = (files.get(fmt) for fmt in ('md', 'srt', 'vtt', 'jsonl'))
+
+            if md is not None:
+                if md_segments:
+                    md.write(self.formatter.format_transcript_header(transcript_result['whisper_used']))
+                    md.write("## Corrected Transcript\n")
+                else:
+                    for piece in self.formatter.iter_transcript(transcript_result, timestamps=False):
+                        md.write(piece)
+            if vtt is not None:
+                vtt.write("WEBVTT\n")
+
+            paragraph = None
+            index = 0
+            for segment in segments:
+                text = " ".join(str(segment['text']).split())
+                if not text:
+                    continue
+                index += 1
+                start, end = _seconds(segment)
+                speaker = segment.get('speaker')
+                label = speaker if speaker and speaker != 'Unknown' else None
+                if md_segments:
+                    piece, paragraph = self.formatter.format_segment(segment, paragraph)
+                    md.write(piece)
+                if srt is not None:
+                    srt.write(f"{index}\n{_clock(start, ',')} --> {_clock(end, ',')}\n"
+                              f"{label + ': ' if label else ''}{text}\n\n")
+                if vtt is not None:
+                    vtt.write(f"\n{_clock(start, '.')} --> {_clock(end, '.')}\n"
+                              f"{f'<v {label}>' if label else ''}{text}\n")
+                if jsonl is not None:
+                    jsonl.write(json.dumps({
+                        'index': index, 'start': round(start, 3), 'end': round(end, 3),
+                        'speaker': label, 'text': text
+                    }, ensure_ascii=False) + "\n")
+
+            if md_segments:
+                md.write(self.formatter.format_changes(transcript_result['text']))
+        return paths
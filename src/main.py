@@ -1,43 +1,414 @@
 import os
 import sys
 from pathlib import Path
+import argparse
 import json
 from tqdm import tqdm
 import time
 import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Add the project root directory to Python path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from config import OUTPUT_DIR, DEFAULT_VIEWER_PROFILE
-from src.extractors.youtube_extractor import YouTubeExtractor
-from src.extractors.whisper_extractor import WhisperExtractor
-from src.analyzers.transcript_analyzer import TranscriptAnalyzer
+from config import (
+    OUTPUT_DIR, DEFAULT_VIEWER_PROFILE, TOP_COMMENTS, MAX_COMMENTS, COMMENT_SORT, TRANSCRIPT_LANGUAGES,
+    WHISPER_SERVER_URL, WHISPER_MODEL, BUDGET_VIDEO_TOKENS, BUDGET_RUN_TOKENS,
+    BUDGET_MINUTE_TOKENS, BUDGET_VIDEO_COST, BUDGET_RUN_COST, BUDGET_POLICY, LLM_ASYNC,
+    BATCH_API_POLL_SECONDS, BATCH_API_MAX_ROUNDS, METRICS_TRACE_PATH, METRICS_PORT, SYNC_PAGE_SIZE
+)
+from src.extractors.youtube_extractor import YouTubeExtractor, parse_video_id
+from src.analyzers.transcript_analyzer import TranscriptAnalyzer, MODEL
+from src.analyzers.budget import TokenBudget, BudgetDeferred, POLICIES
+from src.analyzers.streaming import ChunkedAnalysis
+from src.analyzers.batch_api import BatchPending, BatchCollector, BatchRunner
 from src.formatters.markdown_formatter import MarkdownFormatter
-from src.database.db_handler import DatabaseHandler
+from src.formatters.transcript_writer import TranscriptWriter, atomic_open
+from src.pipeline import BatchPipeline, Stage
+from src.metrics import metrics, serve_metrics
+from src.sync import SourceSync
 
 class YouTubeAnalyzer:
-    def __init__(self):
-        self.yt_extractor = YouTubeExtractor()
+    def __init__(self, interactive=True, top_comments=TOP_COMMENTS,
+                 max_comments=MAX_COMMENTS, comment_sort=COMMENT_SORT, languages=TRANSCRIPT_LANGUAGES,
+                 use_cache=True, refresh_cache=False, whisper_server=WHISPER_SERVER_URL,
+                 budget=None, async_llm=LLM_ASYNC, stream=False,
+                 trace_path=METRICS_TRACE_PATH, metrics_port=METRICS_PORT):
+        self.yt_extractor = YouTubeExtractor(
+            top_comments=top_comments,
+            max_comments=max_comments,
+            comment_sort=comment_sort,
+            languages=languages
+        )
         self.whisper_extractor = None  # Initialize as None
-        self.analyzer = TranscriptAnalyzer()
+        self.whisper_server = whisper_server
+        self.analyzer = TranscriptAnalyzer(
+            interactive=interactive,
+            use_cache=use_cache,
+            refresh_cache=refresh_cache,
+            budget=budget,
+            async_llm=async_llm
+        )
         self.formatter = MarkdownFormatter()
+        self.transcript_writer = TranscriptWriter(formatter=self.formatter)
+        # Stream completions, overlapping correction and analysis
+        self.stream = stream
+        # SQLAlchemy is imported here rather than at the top, so --help stays fast
+        from src.database.db_handler import DatabaseHandler
         self.db_handler = DatabaseHandler()
+        # Stage timings and counters, tagged with the budget's run ID
+        metrics.configure(run_id=self.analyzer.budget.run_id, trace_path=trace_path)
+        self.metrics_server = serve_metrics(metrics_port) if metrics_port else None
         self.whisper_cancelled = False
+        # The Whisper model is shared between batch workers
+        self._whisper_lock = threading.Lock()
 
     def _init_whisper(self):
         """Initialize Whisper extractor only when needed."""
         if self.whisper_extractor is None:
-            from src.extractors.whisper_extractor import WhisperExtractor
-            self.whisper_extractor = WhisperExtractor()
+            if self.whisper_server:
+                # Models stay loaded in the server; nothing to load here
+                from src.extractors.whisper_server import WhisperClient
+                self.whisper_extractor = WhisperClient(self.whisper_server)
+            else:
+                from src.extractors.whisper_extractor import WhisperExtractor
+                self.whisper_extractor = WhisperExtractor()
 
     def signal_handler(self, signum, frame):
         """Handle interrupt signal"""
         self.whisper_cancelled = True
         print("\nWhisper transcription cancelled. Continuing with auto-generated transcript only...")
 
-    def analyze_video(self, url, viewer_profile=None, use_whisper=True):
-        """Analyze a YouTube video and generate reports."""
+    def _run_stage(self, job, stage, inputs, compute, refresh=False):
+        """Run a stage, or reuse its stored result if its inputs are unchanged.
+
+        Every completed stage is checkpointed in the database as soon as it
+        finishes, so a run that crashes or is stopped resumes from the last
+        completed stage. `refresh` forces the stage to run again.
+        """
+        from src.database.db_handler import content_hash
+        input_hash = content_hash(inputs)
+        stored = None if refresh else self.db_handler.load_stage(job['video_id'], stage, input_hash)
+        if stored is not None:
+            print(f"Skipping {stage} for {job['video_id']}: inputs unchanged")
+            return stored['output']
+        output = compute()
+        # Results cut short by the token budget are redone by a later run
+        if output is not None and not (isinstance(output, dict) and output.get('partial')):
+            self.db_handler.save_stage(job['video_id'], stage, input_hash, output)
+        return output
+
+    def _whisper_inputs(self, job):
+        return {'video_id': job['video_id'], 'model': WHISPER_MODEL}
+
+    def fetch_metadata(self, url, reprocess=False):
+        """Resolve video ID and metadata.
+
+        Returns None if the video was already processed, unless `reprocess`
+        is set, in which case stages whose inputs are unchanged are reused.
+        """
+        # Worker threads are reused; drop the previous video's tag
+        metrics.bind(None)
+        video_id = self.yt_extractor.extract_video_id(url)
+        metrics.bind(video_id)
+
+        # Check if video has been processed before
+        if not reprocess and self.db_handler.video_exists(video_id):
+            print(f"Video {video_id} has already been processed.")
+            return None
+
+        job = {'url': url, 'video_id': video_id, 'reprocess': reprocess}
+        # Resuming reuses the checkpoint; reprocessing fetches fresh metadata
+        job['metadata'] = self._run_stage(
+            job, 'metadata', {'video_id': video_id},
+            lambda: self.yt_extractor.extract_metadata(url),
+            refresh=reprocess
+        )
+        return job
+
+    def _get_auto_transcript(self, job):
+        auto_transcript = self._run_stage(
+            job, 'auto_transcript',
+            {'video_id': job['video_id'], 'languages': list(self.yt_extractor.languages)},
+            lambda: self.yt_extractor.get_auto_transcript(job['video_id']),
+            refresh=job.get('reprocess', False)
+        )
+        if not auto_transcript:
+            print("Warning: Could not get auto-generated transcript")
+        return auto_transcript
+
+    def fetch_transcripts(self, job, use_whisper=True):
+        """Add auto-generated and (optionally) Whisper transcripts to a job."""
+        metrics.bind(job['video_id'])
+        auto_transcript = self._get_auto_transcript(job)
+
+        whisper_transcript = None
+        if use_whisper:
+            def transcribe():
+                with self._whisper_lock:
+                    self._init_whisper()  # Initialize Whisper only if needed
+                if self.whisper_server:
+                    # The server queues jobs itself
+                    return self._get_whisper_transcript(job['url'])
+                with self._whisper_lock:
+                    return self._get_whisper_transcript(job['url'])
+
+            whisper_transcript = self._run_stage(job, 'whisper', self._whisper_inputs(job), transcribe)
+
+        # Nothing after this stage needs the raw yt-dlp info dict
+        self.yt_extractor.forget(job['url'])
+
+        if not auto_transcript and not whisper_transcript:
+            raise Exception("Could not obtain any transcripts")
+
+        job['auto_transcript'] = auto_transcript
+        job['whisper_transcript'] = whisper_transcript
+        return job
+
+    def fetch_audio(self, job):
+        """Batch stage: get the auto transcript and decode audio for the Whisper stage."""
+        metrics.bind(job['video_id'])
+        from src.database.db_handler import content_hash
+        job['auto_transcript'] = self._get_auto_transcript(job)
+        job['audio_job'] = None
+
+        stored = self.db_handler.load_stage(
+            job['video_id'], 'whisper', content_hash(self._whisper_inputs(job))
+        )
+        if stored is not None:
+            print(f"Skipping whisper for {job['video_id']}: inputs unchanged")
+            job['whisper_transcript'] = stored['output']
+            self.yt_extractor.forget(job['url'])
+            return job
+
+        with self._whisper_lock:
+            self._init_whisper()
+        try:
+            job['audio_job'] = self.whisper_extractor.fetch_audio(
+                job['url'],
+                self.yt_extractor.get_info(job['url'])
+            )
+        except Exception as e:
+            print(f"Error fetching audio for {job['video_id']}: {str(e)}")
+            job['audio_job'] = None
+        self.yt_extractor.forget(job['url'])
+        return job
+
+    def transcribe_audio(self, job):
+        """Batch stage: run Whisper on audio fetched by fetch_audio."""
+        metrics.bind(job['video_id'])
+        from src.database.db_handler import content_hash
+        audio_job = job.pop('audio_job', None)
+        job.setdefault('whisper_transcript', None)
+        if audio_job:
+            try:
+                job['whisper_transcript'] = self.whisper_extractor.transcribe_audio(audio_job['audio'])
+                self.db_handler.save_stage(
+                    job['video_id'], 'whisper',
+                    content_hash(self._whisper_inputs(job)), job['whisper_transcript']
+                )
+            except Exception as e:
+                print(f"Error in Whisper transcription for {job['video_id']}: {str(e)}")
+            finally:
+                self.whisper_extractor.release_audio(audio_job)
+
+        if not job['auto_transcript'] and not job['whisper_transcript']:
+            raise Exception("Could not obtain any transcripts")
+        return job
+
+    def _get_whisper_transcript(self, url):
+        """Run Whisper, allowing Ctrl+C to skip it when on the main thread."""
+        # Reuse the metadata extraction for the audio format choice
+        info = self.yt_extractor.get_info(url)
+        if threading.current_thread() is not threading.main_thread():
+            return self.whisper_extractor.get_whisper_transcript(url, info=info)
+
+        print("\nGetting Whisper transcript... (Press Ctrl+C to skip)")
+        # Set up signal handler for Ctrl+C
+        signal.signal(signal.SIGINT, self.signal_handler)
+        try:
+            return self.whisper_extractor.get_whisper_transcript(url, info=info)
+        except KeyboardInterrupt:
+            print("\nWhisper transcription cancelled.")
+            return None
+        finally:
+            # Reset signal handler
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    def _correction_inputs(self, job):
+        return {
+            'auto': job['auto_transcript'],
+            'whisper': job['whisper_transcript'],
+            'model': MODEL
+        }
+
+    def _analysis_inputs(self, job, viewer_profile):
+        return {
+            'title': job['metadata']['title'],
+            'description': job['metadata']['description'],
+            'transcript': job['transcript_result']['text'],
+            'profile': viewer_profile,
+            'model': MODEL
+        }
+
+    def correct_transcript(self, job):
+        """Compare the transcripts and keep the corrected result on the job."""
+        metrics.bind(job['video_id'])
+        transcript_result = self._run_stage(
+            job, 'correction', self._correction_inputs(job),
+            lambda: self.analyzer.compare_transcripts(
+                job['auto_transcript'], job['whisper_transcript'], video_id=job['video_id']
+            )
+        )
+        if transcript_result is None:
+            raise Exception("Transcript analysis cancelled by user")
+        job['transcript_result'] = transcript_result
+        return job
+
+    def analyze_transcript(self, job, viewer_profile):
+        """Analyze the corrected transcript for the viewer profile."""
+        metrics.bind(job['video_id'])
+        analysis = self._run_stage(
+            job, 'analysis', self._analysis_inputs(job, viewer_profile),
+            lambda: self.analyzer.analyze_content(
+                job['metadata'],
+                job['transcript_result']['text'],
+                viewer_profile,
+                video_id=job['video_id']
+            )
+        )
+        if analysis is None:
+            raise Exception("Content analysis cancelled by user")
+        job['analysis'] = analysis
+        job['viewer_profile'] = viewer_profile
+        return job
+
+    def correct_and_analyze_streaming(self, job, viewer_profile):
+        """Correct and analyze with streamed completions, overlapping the two.
+
+        Corrected text is appended to transcript.md.partial as it is
+        generated (transcript.md is written by save_results at the end), and
+        content analysis starts on each piece of about chunk_max_tokens
+        tokens as soon as it is complete; the per-piece analyses are merged
+        at the end. If the correction was already stored for these inputs,
+        this falls back to the regular stages.
+        """
+        metrics.bind(job['video_id'])
+        from src.database.db_handler import content_hash
+        correction_hash = content_hash(self._correction_inputs(job))
+        stored = self.db_handler.load_stage(job['video_id'], 'correction', correction_hash)
+        if stored is not None:
+            print(f"Skipping correction for {job['video_id']}: inputs unchanged")
+            job['transcript_result'] = stored['output']
+            return self.analyze_transcript(job, viewer_profile)
+
+        video_dir = Path(OUTPUT_DIR) / job['video_id']
+        video_dir.mkdir(parents=True, exist_ok=True)
+        whisper_used = bool(job['whisper_transcript'])
+
+        # transcript.md itself is only ever replaced whole, by save_results
+        partial_file = video_dir / "transcript.md.partial"
+        try:
+            with open(partial_file, 'w', encoding='utf-8') as f, \
+                    ThreadPoolExecutor(max_workers=self.analyzer.chunk_concurrency) as executor:
+                f.write(self.formatter.format_transcript_header(whisper_used) + "## Corrected Transcript\n")
+                f.flush()
+                analysis = ChunkedAnalysis(
+                    lambda text, part: self.analyzer.analyze_content(
+                        job['metadata'], text, viewer_profile, video_id=job['video_id'], part=part
+                    ),
+                    self.analyzer.count_tokens,
+                    self.analyzer.chunk_max_tokens,
+                    executor
+                )
+
+                def on_text(text):
+                    f.write(text)
+                    f.flush()
+                    analysis.add(text)
+
+                transcript_result = self.analyzer.compare_transcripts_streaming(
+                    job['auto_transcript'], job['whisper_transcript'], on_text, video_id=job['video_id']
+                )
+                if transcript_result is None:
+                    raise Exception("Transcript analysis cancelled by user")
+                merged = analysis.finish()
+        finally:
+            partial_file.unlink(missing_ok=True)
+        if merged is None:
+            raise Exception("Content analysis cancelled by user")
+
+        job['transcript_result'] = transcript_result
+        job['analysis'] = merged
+        job['viewer_profile'] = viewer_profile
+        # Checkpoint both stages, unless the budget cut the correction short
+        if not transcript_result.get('partial'):
+            self.db_handler.save_stage(job['video_id'], 'correction', correction_hash, transcript_result)
+            self.db_handler.save_stage(
+                job['video_id'], 'analysis',
+                content_hash(self._analysis_inputs(job, viewer_profile)), merged
+            )
+        return job
+
+    def save_results(self, job, buffered=False):
+        """Write the transcript files and analysis report and record the video in the database.
+
+        With `buffered`, the database row is queued for a bulk write instead
+        of being written immediately.
+        """
+        metrics.bind(job['video_id'])
+        # Create output directory structure
+        video_dir = Path(OUTPUT_DIR) / job['video_id']
+        video_dir.mkdir(parents=True, exist_ok=True)
+
+        analysis_file = video_dir / "analysis.md"
+
+        with metrics.time('format'):
+            # Markdown, subtitles and JSONL in one pass; each file appears only once complete
+            paths = self.transcript_writer.write(
+                video_dir,
+                job['transcript_result'],
+                job.get('whisper_transcript'),
+                job.get('auto_transcript')
+            )
+            with atomic_open(analysis_file) as f:
+                f.write(self.formatter.format_analysis(job['analysis']))
+        transcript_file = paths.get('md') or next(iter(paths.values()), None)
+
+        # Extract scores and save to database
+        scores = self._extract_scores(job['analysis'])
+        video_data = {
+            'video_id': job['video_id'],
+            'url': job['url'],
+            'metadata': job['metadata'],
+            'transcript_file': str(transcript_file) if transcript_file else None,
+            'analysis_file': str(analysis_file),
+            'info_quality_score': scores['info_quality'],
+            'viewer_interest_score': scores['viewer_interest']
+        }
+        with metrics.time('db_write'):
+            # Searchable copies of the transcripts and analysis
+            self.db_handler.save_transcripts(
+                job['video_id'],
+                job.get('auto_transcript'),
+                job.get('whisper_transcript'),
+                job['transcript_result'].get('segments')
+            )
+            self.db_handler.save_analysis(job['video_id'], job.get('viewer_profile'), job['analysis'])
+
+            if buffered:
+                self.db_handler.buffer_video(video_data)
+            else:
+                self.db_handler.add_video(video_data)
+        return job
+
+    def analyze_video(self, url, viewer_profile=None, use_whisper=True, reprocess=False):
+        """Analyze a YouTube video and generate reports.
+
+        With `reprocess`, an already processed video is run again, re-running
+        only the stages whose inputs (e.g. the viewer profile) changed.
+        """
         try:
             if viewer_profile is None:
                 viewer_profile = DEFAULT_VIEWER_PROFILE
@@ -46,94 +417,33 @@ class YouTubeAnalyzer:
             steps = ['Extracting metadata', 'Getting transcripts', 'Analyzing content', 'Saving results']
             with tqdm(total=len(steps), desc="Overall progress", position=0) as pbar:
                 print("\nExtracting video ID and metadata...")
-                video_id = self.yt_extractor.extract_video_id(url)
-                
-                # Check if video has been processed before
-                if self.db_handler.video_exists(video_id):
-                    print(f"Video {video_id} has already been processed.")
+                job = self.fetch_metadata(url, reprocess=reprocess)
+                if job is None:
                     return
-                
-                metadata = self.yt_extractor.extract_metadata(url)
                 pbar.update(1)
                 pbar.set_description(f"Completed: {steps[0]}")
 
-                print("\nGetting auto-generated transcript...")
-                auto_transcript = self.yt_extractor.get_auto_transcript(video_id)
-                if not auto_transcript:
-                    print("Warning: Could not get auto-generated transcript")
-
-                whisper_transcript = None
-                if use_whisper:
-                    self._init_whisper()  # Initialize Whisper only if needed
-                    print("\nGetting Whisper transcript... (Press Ctrl+C to skip)")
-                    # Set up signal handler for Ctrl+C
-                    signal.signal(signal.SIGINT, self.signal_handler)
-                    try:
-                        whisper_transcript = self.whisper_extractor.get_whisper_transcript(url)
-                    except KeyboardInterrupt:
-                        print("\nWhisper transcription cancelled.")
-                        whisper_transcript = None
-                    finally:
-                        # Reset signal handler
-                        signal.signal(signal.SIGINT, signal.default_int_handler)
-
-                if not auto_transcript and not whisper_transcript:
-                    raise Exception("Could not obtain any transcripts")
+                print("\nGetting transcripts...")
+                job = self.fetch_transcripts(job, use_whisper=use_whisper)
                 pbar.update(1)
                 pbar.set_description(f"Completed: {steps[1]}")
 
                 print("\nComparing and analyzing transcripts...")
-                with tqdm(total=2, desc="Analysis progress") as analysis_pbar:
-                    transcript_result = self.analyzer.compare_transcripts(
-                        auto_transcript, 
-                        whisper_transcript
-                    )
-                    if transcript_result is None:
-                        raise Exception("Transcript analysis cancelled by user")
-                    analysis_pbar.update(1)
-
-                    analysis = self.analyzer.analyze_content(
-                        metadata,
-                        transcript_result['text'],
-                        viewer_profile
-                    )
-                    if analysis is None:
-                        raise Exception("Content analysis cancelled by user")
-                    analysis_pbar.update(1)
+                if self.stream:
+                    job = self.correct_and_analyze_streaming(job, viewer_profile)
+                else:
+                    with tqdm(total=2, desc="Analysis progress") as analysis_pbar:
+                        job = self.correct_transcript(job)
+                        analysis_pbar.update(1)
+
+                        job = self.analyze_transcript(job, viewer_profile)
+                        analysis_pbar.update(1)
                 pbar.update(1)
                 pbar.set_description(f"Completed: {steps[2]}")
 
-                # Create output directory structure
-                video_dir = OUTPUT_DIR / video_id
-                video_dir.mkdir(exist_ok=True)
-
                 # Save outputs
                 print("\nSaving outputs...")
-                transcript_file = video_dir / "transcript.md"
-                analysis_file = video_dir / "analysis.md"
-
-                with tqdm(total=3, desc="Saving files") as save_pbar:
-                    with open(transcript_file, 'w') as f:
-                        f.write(self.formatter.format_transcript(transcript_result))
-                    save_pbar.update(1)
-                    
-                    with open(analysis_file, 'w') as f:
-                        f.write(self.formatter.format_analysis(analysis))
-                    save_pbar.update(1)
-
-                    # Extract scores and save to database
-                    scores = self._extract_scores(analysis)
-                    video_data = {
-                        'video_id': video_id,
-                        'url': url,
-                        'metadata': metadata,
-                        'transcript_file': str(transcript_file),
-                        'analysis_file': str(analysis_file),
-                        'info_quality_score': scores['info_quality'],
-                        'viewer_interest_score': scores['viewer_interest']
-                    }
-                    self.db_handler.add_video(video_data)
-                    save_pbar.update(1)
+                self.save_results(job)
                 pbar.update(1)
                 pbar.set_description(f"Completed: {steps[3]}")
 
@@ -142,8 +452,227 @@ class YouTubeAnalyzer:
         except Exception as e:
             print(f"\nError during video analysis: {str(e)}")
             raise
+
+    def analyze_many(self, urls, viewer_profile=None, use_whisper=False,
+                     metadata_workers=8, transcript_workers=4,
+                     analysis_workers=4, save_workers=1, queue_size=8, audio_prefetch=2,
+                     reprocess=False):
+        """Analyze many videos with the stages running concurrently.
+
+        Each stage (metadata, transcripts, analysis, save) has its own pool
+        of worker threads, connected by bounded queues, so network and LLM
+        waits for different videos overlap. With local Whisper, audio is
+        fetched in the transcripts stage and a single Whisper worker
+        transcribes it, with at most `audio_prefetch` decoded videos
+        waiting. Returns the pipeline summary.
+        """
+        if viewer_profile is None:
+            viewer_profile = DEFAULT_VIEWER_PROFILE
+
+        waiting, deferred = [], []
+
+        def analyze(job):
+            try:
+                if self.stream:
+                    return self.correct_and_analyze_streaming(job, viewer_profile)
+                job = self.correct_transcript(job)
+                return self.analyze_transcript(job, viewer_profile)
+            except BatchPending:
+                # Batch API mode: picked up again once the batch is answered
+                waiting.append(job['url'])
+                return None
+            except BudgetDeferred as e:
+                # Over budget under the 'defer' policy: left for a later run, not failed
+                print(f"{job['url']}: {e}")
+                deferred.append(job['url'])
+                return None
+
+        stages = [Stage('metadata', lambda url: self.fetch_metadata(url, reprocess), metadata_workers)]
+        if use_whisper and not self.whisper_server:
+            # Download and decode the next videos while the model works on the current one
+            stages += [
+                Stage('transcripts', self.fetch_audio, transcript_workers),
+                Stage('whisper', self.transcribe_audio, 1, queue_size=audio_prefetch),
+            ]
+        else:
+            stages.append(
+                Stage('transcripts', lambda job: self.fetch_transcripts(job, use_whisper), transcript_workers)
+            )
+        stages += [
+            Stage('analysis', analyze, analysis_workers),
+            Stage('save', lambda job: self.save_results(job, buffered=True), save_workers),
+        ]
+        pipeline = BatchPipeline(stages, queue_size=queue_size)
+
+        start_time = time.time()
+        urls = list(dict.fromkeys(url.strip() for url in urls if url.strip()))
+
+        # Drop already processed videos with one query instead of one per URL
+        ids = {url: parse_video_id(url) for url in urls}
+        done = set()
+        if not reprocess:
+            done = self.db_handler.existing_ids(video_id for video_id in ids.values() if video_id)
+        already = [url for url in urls if ids[url] in done]
+        if already:
+            print(f"Skipping {len(already)} already processed videos")
+        urls = [url for url in urls if ids[url] not in done]
+        # Transcripts are fetched concurrently from the start; the transcripts stage waits for each
+        self.yt_extractor.prefetch_transcripts(ids[url] for url in urls if ids[url])
+
+        # On SIGTERM/SIGINT, stop taking new videos and let in-flight stages
+        # finish; their checkpoints let the next run resume where this one stopped
+        def stop(signum, frame):
+            print("\nStopping: finishing in-flight stages. Rerun the same batch to resume.")
+            pipeline.stop()
+
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                handlers[signum] = signal.signal(signum, stop)
+
+        try:
+            results = pipeline.run(urls)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            with metrics.time('db_write', flush=True):
+                self.db_handler.flush()
+        results['waiting'] = waiting
+        results['deferred'] = deferred
+        results['skipped'] = already + [
+            url for url in results['skipped'] if url not in waiting and url not in deferred
+        ]
+        elapsed = time.time() - start_time
+
+        print(
+            f"\nBatch {'stopped' if results['cancelled'] else 'complete'} in {elapsed:.1f}s: "
+            f"{len(results['completed'])} analyzed, "
+            f"{len(results['skipped'])} skipped, "
+            f"{len(results['failed'])} failed, "
+            f"{len(results['cancelled'])} not started"
+            + (f", {len(waiting)} waiting for the Batch API" if waiting else "")
+            + (f", {len(deferred)} deferred by the budget" if deferred else "")
+        )
+        for failure in results['failed']:
+            print(f"  {failure['item']} ({failure['stage']}): {failure['error']}")
+        if self.analyzer.cache is not None:
+            stats = self.analyzer.cache.stats()
+            print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses")
+        if self.analyzer.llm is not None and self.analyzer.llm.retries:
+            print(f"LLM retries: {self.analyzer.llm.retries}")
+        spent = self.analyzer.budget.spent()
+        print(f"LLM spend (run {self.analyzer.budget.run_id}): "
+              f"{spent['run_tokens']} tokens, ${spent['run_cost']:.2f}")
+        for status in ('completed', 'skipped', 'failed', 'cancelled', 'waiting', 'deferred'):
+            metrics.count('videos', len(results[status]), status=status)
+        slowest = list(metrics.stage_totals().items())[:5]
+        if slowest:
+            print("Slowest stages (total time): " + ", ".join(
+                f"{stage} {total:.1f}s/{runs}" for stage, (runs, total) in slowest
+            ) + " - details: python -m src.metrics")
+        return results
+
+    def analyze_batch_api(self, urls, viewer_profile=None, use_whisper=False,
+                          poll_interval=BATCH_API_POLL_SECONDS, max_rounds=BATCH_API_MAX_ROUNDS,
+                          **pipeline_options):
+        """Analyze many videos through the OpenAI Batch API instead of live requests.
+
+        Each round runs analyze_many with the analyzer collecting its LLM
+        requests instead of sending them: videos whose requests are all
+        answered by the response cache are saved as usual, the rest wait.
+        The collected requests are submitted as JSONL batch jobs and polled
+        until done, the answers are stored in the response cache, and the
+        next round continues the waiting videos (correction answers lead to
+        analysis requests, and those to saved results). Batches submitted by
+        an interrupted run are awaited first. Returns the last round's summary.
+        """
+        if self.analyzer.cache is None or self.analyzer.cache.bypass:
+            raise ValueError("Batch API mode needs the LLM response cache (drop --no-cache/--refresh-cache)")
+        runner = BatchRunner(self.analyzer.cache, self.analyzer.budget, self.db_handler, MODEL, poll_interval)
+        runner.resume()
+
+        # Answers arrive whole, so streaming has nothing to overlap
+        stream, self.stream = self.stream, False
+        try:
+            for round_number in range(1, max_rounds + 2):
+                collector = BatchCollector()
+                self.analyzer.batch = collector
+                try:
+                    results = self.analyze_many(urls, viewer_profile, use_whisper, **pipeline_options)
+                finally:
+                    self.analyzer.batch = None
+                if not collector.requests:
+                    break
+                if round_number > max_rounds:
+                    for request in collector.requests.values():
+                        self.analyzer.budget.release(request['reservation'])
+                    print(f"Stopping after {max_rounds} Batch API rounds; "
+                          f"{len(results['waiting'])} video(s) still need LLM requests")
+                    break
+                print(f"\nRound {round_number}: submitting {len(collector.requests)} requests to the Batch API")
+                runner.wait(runner.submit(collector.requests))
+                urls = results['waiting']
         finally:
-            self.db_handler.close()
+            self.stream = stream
+        return results
+
+    def sync(self, sources, viewer_profile=None, use_whisper=False, page_size=SYNC_PAGE_SIZE,
+             **pipeline_options):
+        """Process the videos added to playlists and channels since their last sync.
+
+        The new, unseen videos of every source are found with SourceSync and
+        run through analyze_many `page_size` at a time. Every source's mark
+        then advances; failed videos are retried by the next syncs up to
+        SYNC_MAX_ATTEMPTS times, and unfinished ones (cancelled, waiting,
+        deferred, not reached) until they are processed. Returns the number of videos
+        per outcome.
+        """
+        syncer = SourceSync(self.yt_extractor, self.db_handler)
+        start_time = time.time()
+        listings = syncer.poll(sources)
+
+        # A video in several sources is processed once
+        queue, queued = [], set()
+        for listing in listings:
+            for entry in listing['new']:
+                if entry['id'] not in queued:
+                    queued.add(entry['id'])
+                    queue.append(entry)
+        print(f"Listed {len(listings)} sources in {time.time() - start_time:.1f}s: {len(queue)} new videos")
+
+        totals = {'completed': 0, 'skipped': 0, 'failed': 0, 'cancelled': 0, 'waiting': 0, 'deferred': 0}
+        failed, unfinished = set(), set()
+        pages = (len(queue) + page_size - 1) // page_size
+        for page_number, offset in enumerate(range(0, len(queue), page_size), 1):
+            page = queue[offset:offset + page_size]
+            print(f"\nPage {page_number}/{pages}: {len(page)} videos")
+            results = self.analyze_many(
+                [entry['url'] for entry in page], viewer_profile, use_whisper, **pipeline_options
+            )
+            for status in totals:
+                totals[status] += len(results[status])
+            failed.update(failure['item'] for failure in results['failed'])
+            unfinished.update(results['cancelled'], results['waiting'], results['deferred'])
+            if results['cancelled']:
+                # Stopped: the remaining pages are picked up by the next sync
+                unfinished.update(entry['url'] for entry in queue[offset + page_size:])
+                break
+
+        for listing in listings:
+            syncer.advance(listing, failed, unfinished)
+        print(f"\nSync finished in {time.time() - start_time:.1f}s: "
+              + ", ".join(f"{count} {status}" for status, count in totals.items()))
+        return totals
+
+    def close(self):
+        """Release the database session, the caches, transcript prefetches and the metrics endpoint."""
+        self.yt_extractor.close()
+        self.db_handler.close()
+        self.analyzer.close()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+        metrics.close()
 
     def _extract_scores(self, analysis):
         """Extract scores from analysis text."""
@@ -161,17 +690,190 @@ class YouTubeAnalyzer:
                 'viewer_interest': 0
             }
 
-if __name__ == "__main__":
+def _read_urls(source):
+    """Read URLs from a file path, or from stdin when source is '-'."""
+    if source == '-':
+        return [line for line in sys.stdin if line.strip() and not line.startswith('#')]
+    with open(source) as f:
+        return [line for line in f if line.strip() and not line.startswith('#')]
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Analyze YouTube videos.")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="File with one URL per line ('-' for stdin)")
+    parser.add_argument('--sync', metavar='FILE',
+                        help="Process new videos of the playlist/channel URLs in FILE ('-' for stdin)")
+    parser.add_argument('--watch', type=float, default=None, metavar='SECONDS',
+                        help="With --sync: sync again every SECONDS until interrupted")
+    parser.add_argument('--sync-page-size', type=int, default=SYNC_PAGE_SIZE,
+                        help="New videos processed per pipeline run")
+    parser.add_argument('--profile', default=None, help="Viewer profile for the analysis")
+    parser.add_argument('--whisper', action='store_true', help="Also transcribe with Whisper")
+    parser.add_argument('--top-comments', type=int, default=TOP_COMMENTS,
+                        help="Number of most liked comments to keep per video")
+    parser.add_argument('--max-comments', type=int, default=MAX_COMMENTS,
+                        help="Maximum comments to fetch per video (0 disables, -1 for all)")
+    parser.add_argument('--comment-sort', choices=['top', 'new'], default=COMMENT_SORT)
+    parser.add_argument('--languages', type=lambda value: tuple(value.split(',')), default=TRANSCRIPT_LANGUAGES,
+                        help="Transcript languages in order of preference, e.g. en,de")
+    parser.add_argument('--whisper-server', default=WHISPER_SERVER_URL, metavar='URL',
+                        help="Send Whisper jobs to a running whisper_server instead of loading models")
+    parser.add_argument('--reprocess', action='store_true',
+                        help="Re-run processed videos, skipping stages whose inputs are unchanged")
+    parser.add_argument('--no-cache', action='store_true', help="Do not use the LLM response cache")
+    parser.add_argument('--refresh-cache', action='store_true',
+                        help="Ignore cached LLM responses but store the fresh ones")
+    parser.add_argument('--budget-policy', choices=POLICIES, default=None,
+                        help=f"What to do with over-budget LLM calls (default: ask when "
+                             f"interactive, {BUDGET_POLICY} in batch mode)")
+    parser.add_argument('--video-tokens', type=int, default=BUDGET_VIDEO_TOKENS,
+                        help="Token limit per video (0 for none)")
+    parser.add_argument('--run-tokens', type=int, default=BUDGET_RUN_TOKENS,
+                        help="Token limit for the whole run (0 for none)")
+    parser.add_argument('--minute-tokens', type=int, default=BUDGET_MINUTE_TOKENS,
+                        help="Tokens per rolling minute across all workers (0 for none)")
+    parser.add_argument('--video-cost', type=float, default=BUDGET_VIDEO_COST,
+                        help="USD limit per video (0 for none)")
+    parser.add_argument('--run-cost', type=float, default=BUDGET_RUN_COST,
+                        help="USD limit for the whole run (0 for none)")
+    parser.add_argument('--run-id', default=None,
+                        help="Share per-run limits between processes started with the same ID")
+    parser.add_argument('--sync-llm', action='store_true',
+                        help="Use the synchronous OpenAI client (no shared pool or retries)")
+    parser.add_argument('--batch-api', action='store_true',
+                        help="With --batch: send LLM requests through the OpenAI Batch API "
+                             "(cheaper, results within the completion window)")
+    parser.add_argument('--batch-poll', type=float, default=BATCH_API_POLL_SECONDS, metavar='SECONDS',
+                        help="Seconds between Batch API status checks")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream completions: write transcript.md.partial as it is corrected "
+                             "and start the analysis on each finished piece")
+    parser.add_argument('--trace', default=str(METRICS_TRACE_PATH), metavar='FILE',
+                        help="JSONL trace of stage timings (summarize with python -m src.metrics)")
+    parser.add_argument('--no-trace', action='store_true', help="Do not write a metrics trace")
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT, metavar='PORT',
+                        help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--metadata-workers', type=int, default=8)
+    parser.add_argument('--transcript-workers', type=int, default=4)
+    parser.add_argument('--analysis-workers', type=int, default=4)
+    parser.add_argument('--save-workers', type=int, default=1)
+    parser.add_argument('--queue-size', type=int, default=8,
+                        help="Maximum number of videos waiting between two stages")
+    parser.add_argument('--audio-prefetch', type=int, default=2,
+                        help="Maximum decoded videos waiting for local Whisper")
+    return parser
+
+def _make_budget(args, interactive):
+    """Build the token budget from the command line; a limit of 0 disables it."""
+    return TokenBudget(
+        run_id=args.run_id,
+        video_tokens=args.video_tokens or None,
+        run_tokens=args.run_tokens or None,
+        minute_tokens=args.minute_tokens or None,
+        video_cost=args.video_cost or None,
+        run_cost=args.run_cost or None,
+        policy=args.budget_policy or ('ask' if interactive else BUDGET_POLICY)
+    )
+
+def _sync(analyzer, args, pipeline_options):
+    """Sync the sources once, or every --watch seconds until stopped; returns the last totals."""
+    while True:
+        totals = analyzer.sync(
+            _read_urls(args.sync),
+            viewer_profile=args.profile,
+            use_whisper=args.whisper,
+            page_size=args.sync_page_size,
+            **pipeline_options
+        )
+        if not args.watch or totals['cancelled']:
+            return totals
+        print(f"Next sync in {args.watch:.0f}s (Ctrl+C to stop)")
+        try:
+            time.sleep(args.watch)
+        except KeyboardInterrupt:
+            return totals
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.batch or args.sync:
+        analyzer = YouTubeAnalyzer(
+            interactive=False,
+            top_comments=args.top_comments,
+            max_comments=args.max_comments,
+            comment_sort=args.comment_sort,
+            languages=args.languages,
+            use_cache=not args.no_cache,
+            refresh_cache=args.refresh_cache,
+            whisper_server=args.whisper_server,
+            budget=_make_budget(args, interactive=False),
+            async_llm=not args.sync_llm,
+            stream=args.stream,
+            trace_path=None if args.no_trace else args.trace,
+            metrics_port=args.metrics_port
+        )
+        pipeline_options = dict(
+            metadata_workers=args.metadata_workers,
+            transcript_workers=args.transcript_workers,
+            analysis_workers=args.analysis_workers,
+            save_workers=args.save_workers,
+            queue_size=args.queue_size,
+            audio_prefetch=args.audio_prefetch,
+            reprocess=args.reprocess
+        )
+        try:
+            if args.sync:
+                results = _sync(analyzer, args, pipeline_options)
+            elif args.batch_api:
+                results = analyzer.analyze_batch_api(
+                    _read_urls(args.batch),
+                    viewer_profile=args.profile,
+                    use_whisper=args.whisper,
+                    poll_interval=args.batch_poll,
+                    **pipeline_options
+                )
+            else:
+                results = analyzer.analyze_many(
+                    _read_urls(args.batch),
+                    viewer_profile=args.profile,
+                    use_whisper=args.whisper,
+                    **pipeline_options
+                )
+        finally:
+            analyzer.close()
+        return 1 if results['failed'] or results.get('waiting') or results.get('deferred') else 0
+
+    analyzer = YouTubeAnalyzer(
+        top_comments=args.top_comments,
+        max_comments=args.max_comments,
+        comment_sort=args.comment_sort,
+        languages=args.languages,
+        use_cache=not args.no_cache,
+        refresh_cache=args.refresh_cache,
+        whisper_server=args.whisper_server,
+        budget=_make_budget(args, interactive=True),
+        async_llm=not args.sync_llm,
+        stream=args.stream,
+        trace_path=None if args.no_trace else args.trace,
+        metrics_port=args.metrics_port
+    )
     try:
-        analyzer = YouTubeAnalyzer()
         url = input("Enter YouTube URL: ")
         viewer_profile = input("Enter viewer profile (or press Enter for default): ").strip()
         use_whisper = input("Use Whisper for additional transcription? (y/N): ").strip().lower() == 'y'
-        
+
         analyzer.analyze_video(
-            url, 
+            url,
             viewer_profile if viewer_profile else None,
-            use_whisper=use_whisper
+            use_whisper=use_whisper,
+            reprocess=args.reprocess
         )
     except Exception as e:
-        print(f"Program terminated with error: {str(e)}") 
\ No newline at end of file
+        print(f"Program terminated with error: {str(e)}")
+        return 1
+    finally:
+        analyzer.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
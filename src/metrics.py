@@ -0,0 +1,279 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import METRICS_TRACE_PATH, METRICS_HOST
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Prefix of every exported Prometheus metric
+PREFIX = 'yta'
+
+class Metrics:
+    """Per-stage durations and counters for every video, for finding bottlenecks.
+
+    Stages are timed with `time(stage)`; counters (bytes downloaded, tokens,
+    cache hits) are added with `count(name, value)`. Totals are kept in
+    memory for the Prometheus endpoint (see serve_metrics), and every
+    observation is appended to a JSONL trace for `python -m src.metrics`.
+    Observations are tagged with the video being worked on: pass
+    `video_id`, or `bind()` it to the current thread at the start of a
+    stage. Safe to use from any number of threads.
+    """
+
+    def __init__(self):
+        self.run_id = None
+        self.trace_path = None
+        self.durations = {}  # stage -> {'count', 'sum', 'buckets'}
+        self.counters = defaultdict(float)  # (name, sorted label items) -> value
+        self._trace = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def configure(self, run_id=None, trace_path=METRICS_TRACE_PATH):
+        """Set the run ID that tags trace events and (re)open the trace file (None disables it)."""
+        with self._lock:
+            self.run_id = run_id
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+            self.trace_path = Path(trace_path) if trace_path else None
+            if self.trace_path is not None:
+                self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+                # Line buffered, so the trace survives a crash up to the last event
+                self._trace = open(self.trace_path, 'a', encoding='utf-8', buffering=1)
+
+    def bind(self, video_id):
+        """Tag later observations from this thread with `video_id`."""
+        self._local.video_id = video_id
+
+    def _video(self, video_id):
+        return video_id if video_id is not None else getattr(self._local, 'video_id', None)
+
+    @contextmanager
+    def time(self, stage, video_id=None, **fields):
+        """Time the enclosed block as one run of `stage`; failures are recorded too."""
+        start = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, video_id, ok, **fields)
+
+    def observe(self, stage, seconds, video_id=None, ok=True, **fields):
+        """Record one run of `stage` that took `seconds`."""
+        with self._lock:
+            entry = self.durations.setdefault(
+                stage, {'count': 0, 'sum': 0.0, 'buckets': [0] * len(DURATION_BUCKETS)}
+            )
+            entry['count'] += 1
+            entry['sum'] += seconds
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    entry['buckets'][i] += 1
+        self._write({
+            'type': 'stage', 'stage': stage, 'seconds': round(seconds, 6), 'ok': ok,
+            'video': self._video(video_id), **fields
+        })
+
+    def count(self, name, value=1, video_id=None, **labels):
+        """Add `value` to counter `name` (e.g. 'bytes_downloaded', 'llm_cache_hits')."""
+        if not value:
+            return
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+        self._write({'type': 'count', 'name': name, 'value': value, 'video': self._video(video_id), **labels})
+
+    def _write(self, event):
+        if self._trace is None:
+            return
+        event = {'ts': round(time.time(), 3), 'run': self.run_id, **event}
+        line = json.dumps(event, default=str) + "\n"
+        with self._lock:
+            if self._trace is not None:
+                self._trace.write(line)
+
+    def stage_totals(self):
+        """{stage: (runs, total seconds)}, slowest total first."""
+        with self._lock:
+            totals = {stage: (entry['count'], entry['sum']) for stage, entry in self.durations.items()}
+        return dict(sorted(totals.items(), key=lambda item: -item[1][1]))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {PREFIX}_stage_duration_seconds Time spent in each pipeline stage.",
+            f"# TYPE {PREFIX}_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage, entry in sorted(self.durations.items()):
+                label = f'stage="{_escape(stage)}"'
+                for bound, count in zip(DURATION_BUCKETS, entry['buckets']):
+                    lines.append(f'{PREFIX}_stage_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{PREFIX}_stage_duration_seconds_bucket{{{label},le="+Inf"}} {entry["count"]}')
+                lines.append(f'{PREFIX}_stage_duration_seconds_sum{{{label}}} {entry["sum"]:.6f}')
+                lines.append(f'{PREFIX}_stage_duration_seconds_count{{{label}}} {entry["count"]}')
+
+            by_name = defaultdict(list)
+            for (name, labels), value in self.counters.items():
+                by_name[name].append((labels, value))
+        for name, series in sorted(by_name.items()):
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            for labels, value in sorted(series):
+                label = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+                lines.append(f"{PREFIX}_{name}_total{{{label}}} {value:g}" if label
+                             else f"{PREFIX}_{name}_total {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Shared by every component of the process
+metrics = Metrics()
+
+def _make_handler(registry):
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') not in ('', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve_metrics(port, host=METRICS_HOST, registry=None):
+    """Serve GET /metrics for Prometheus from a background thread; returns the server."""
+    # Imported here so the CLI does not pay for http.server at startup
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer((host, port), _make_handler(registry or metrics))
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    print(f"Metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+def read_trace(path, run_id=None):
+    """Events from a trace file; `run_id` 'last' keeps the most recent run, None keeps all."""
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue  # A line cut short by a crash
+    if run_id == 'last':
+        run_id = events[-1].get('run') if events else None
+        if run_id is None:
+            return events
+    if run_id is not None:
+        events = [e for e in events if e.get('run') == run_id]
+    return events
+
+def summarize(events):
+    """Per-stage duration statistics and counter totals for a list of trace events."""
+    seconds = defaultdict(list)
+    failures = defaultdict(int)
+    counters = defaultdict(float)
+    videos = set()
+    for event in events:
+        if event.get('video'):
+            videos.add(event['video'])
+        if event.get('type') == 'stage':
+            seconds[event['stage']].append(event['seconds'])
+            if not event.get('ok', True):
+                failures[event['stage']] += 1
+        elif event.get('type') == 'count':
+            counters[event['name']] += event['value']
+
+    busy = sum(sum(values) for values in seconds.values()) or 1
+    stages = {}
+    for stage, values in seconds.items():
+        values.sort()
+        stages[stage] = {
+            'runs': len(values),
+            'failed': failures[stage],
+            'total': sum(values),
+            'mean': sum(values) / len(values),
+            'p50': values[len(values) // 2],
+            'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+            'max': values[-1],
+            'share': sum(values) / busy,
+        }
+    span = (max(e['ts'] for e in events) - min(e['ts'] for e in events)) if events else 0
+    return {
+        'videos': len(videos),
+        'span': span,
+        'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['total'])),
+        'counters': dict(sorted(counters.items())),
+    }
+
+def format_report(summary):
+    lines = [f"{summary['videos']} videos, {summary['span']:.1f}s from first to last event", ""]
+    lines.append(f"{'Stage':<20} {'Runs':>6} {'Failed':>6} {'Total (s)':>10} {'Mean':>8} "
+                 f"{'p50':>8} {'p95':>8} {'Max':>8} {'Share':>6}")
+    for stage, s in summary['stages'].items():
+        lines.append(f"{stage:<20} {s['runs']:>6} {s['failed']:>6} {s['total']:>10.1f} {s['mean']:>8.2f} "
+                     f"{s['p50']:>8.2f} {s['p95']:>8.2f} {s['max']:>8.2f} {s['share']:>6.1%}")
+    if summary['stages']:
+        slowest = next(iter(summary['stages']))
+        lines.append(f"\nMost time is spent in '{slowest}'. Stages run concurrently in batch mode, "
+                     f"so shares are of busy time, not wall time.")
+    if summary['counters']:
+        lines.append("")
+        for name, value in summary['counters'].items():
+            lines.append(f"{name:<28} {value:>14,.0f}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a metrics trace: time per stage and totals.")
+    parser.add_argument('--trace', default=str(METRICS_TRACE_PATH), help="JSONL trace file")
+    parser.add_argument('--run', default='last',
+                        help="Run ID to summarize, 'last' (default) or 'all'")
+    parser.add_argument('--video', help="Only this video ID")
+    parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        events = read_trace(args.trace, None if args.run == 'all' else args.run)
+    except FileNotFoundError:
+        print(f"No trace at {args.trace}")
+        return 1
+    if args.video:
+        events = [e for e in events if e.get('video') == args.video]
+    if not events:
+        print("No events")
+        return 1
+
+    summary = summarize(events)
+    print(json.dumps(summary, indent=2) if args.json else format_report(summary))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
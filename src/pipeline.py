@@ -0,0 +1,119 @@
+import queue
+import threading
+import traceback
+
+# Marks the end of the input for a stage's workers
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name, func, workers=1, queue_size=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        # Size of this stage's input queue; None uses the pipeline default
+        self.queue_size = queue_size
+
+
+class BatchPipeline:
+    """Run items through a chain of stages, each with its own worker pool.
+
+    Stages are connected by bounded queues, so a slow stage applies
+    back-pressure to the ones before it while still overlapping with them.
+    A stage function receives the item produced by the previous stage and
+    returns the item for the next one. Returning None drops the item
+    (e.g. an already processed video); raising records it as failed.
+    """
+
+    def __init__(self, stages, queue_size=8):
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop taking new items; stage calls already running are allowed to finish."""
+        self._stop.set()
+
+    def run(self, items, key=None):
+        """Push items through every stage and return a summary dict."""
+        key = key or (lambda item: item)
+        queues = [queue.Queue(maxsize=stage.queue_size or self.queue_size) for stage in self.stages]
+        queues.append(queue.Queue(maxsize=self.queue_size))
+        results = {'completed': [], 'skipped': [], 'failed': [], 'cancelled': []}
+        remaining = [stage.workers for stage in self.stages]
+        threads = []
+
+        def worker(index):
+            stage = self.stages[index]
+            inbox, outbox = queues[index], queues[index + 1]
+            while True:
+                entry = inbox.get()
+                if entry is _DONE:
+                    # Let sibling workers see the marker too
+                    inbox.put(_DONE)
+                    with self._lock:
+                        remaining[index] -= 1
+                        last = remaining[index] == 0
+                    if last:
+                        outbox.put(_DONE)
+                    return
+
+                source, item = entry
+                if self._stop.is_set():
+                    with self._lock:
+                        results['cancelled'].append(source)
+                    continue
+                try:
+                    item = stage.func(item)
+                except Exception as e:
+                    print(f"\nError in stage '{stage.name}' for {source}: {str(e)}")
+                    with self._lock:
+                        results['failed'].append({
+                            'item': source,
+                            'stage': stage.name,
+                            'error': str(e),
+                            'traceback': traceback.format_exc()
+                        })
+                    continue
+
+                if item is None:
+                    with self._lock:
+                        results['skipped'].append(source)
+                    continue
+                outbox.put((source, item))
+
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=worker,
+                    args=(index,),
+                    name=f"{stage.name}-{n}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        # Drain the final queue concurrently so the last stage never blocks
+        def collector():
+            while True:
+                entry = queues[-1].get()
+                if entry is _DONE:
+                    return
+                results['completed'].append(entry[1])
+
+        collector_thread = threading.Thread(target=collector, name="collector", daemon=True)
+        collector_thread.start()
+
+        for item in items:
+            if self._stop.is_set():
+                with self._lock:
+                    results['cancelled'].append(key(item))
+                continue
+            queues[0].put((key(item), item))
+        queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+        collector_thread.join()
+        return results
@@ -0,0 +1,38 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.database.db_handler import DatabaseHandler
+from src.formatters.markdown_formatter import format_timestamp
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search stored transcripts.")
+    parser.add_argument('query', help='FTS5 query, e.g. climate, "neural network", optim*')
+    parser.add_argument('--source', choices=['auto', 'whisper', 'corrected'],
+                        help="Only search one transcript source")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    db_handler = DatabaseHandler()
+    try:
+        hits = db_handler.search(args.query, limit=args.limit, source=args.source)
+    except Exception as e:
+        print(f"Search failed: {str(e)}")
+        return 1
+    finally:
+        db_handler.close()
+
+    if not hits:
+        print("No matches")
+    for hit in hits:
+        start = int(hit['start_time'] or 0)
+        speaker = f" {hit['speaker']}" if hit['speaker'] else ""
+        print(f"{hit['video_id']}  {format_timestamp(start)}  [{hit['source']}{speaker}]  {hit['snippet']}")
+        print(f"    https://youtu.be/{hit['video_id']}?t={start}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
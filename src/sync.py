@@ -0,0 +1,159 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import SYNC_INITIAL_LIMIT, SYNC_MAX_SCAN, SYNC_WORKERS, SYNC_MARK_IDS, SYNC_MAX_ATTEMPTS
+from src.extractors.youtube_extractor import parse_source
+from src.metrics import metrics
+
+class SourceSync:
+    """Find the videos added to playlists and channels since they were last synced.
+
+    Each source keeps a mark in the database: the IDs at the top of its
+    listing as of the last sync. Channels list uploads newest first, so a
+    poll stops at the first marked video and an unchanged channel costs
+    one page request. A playlist stops there too when videos were added at
+    its top; when its top is unchanged, new videos can only have been
+    appended, and it is listed to the end, since YouTube cannot list a
+    playlist from the middle. Several IDs are kept, so removing the top
+    video does not lose the mark. Sources are listed concurrently with
+    lazy flat extraction, the listed IDs are checked against the videos
+    table in one query, and only unseen videos are returned.
+
+    Videos that fail are recorded with their source and retried by later
+    syncs, up to `max_attempts` times, so one broken video never holds
+    its source back.
+    """
+
+    def __init__(self, yt_extractor, db_handler, initial_limit=SYNC_INITIAL_LIMIT,
+                 max_scan=SYNC_MAX_SCAN, workers=SYNC_WORKERS, mark_ids=SYNC_MARK_IDS,
+                 max_attempts=SYNC_MAX_ATTEMPTS):
+        self.yt_extractor = yt_extractor
+        self.db_handler = db_handler
+        # Newest videos taken from a channel on its first sync (None takes all)
+        self.initial_limit = initial_limit
+        # Most entries listed per source and poll
+        self.max_scan = max_scan
+        self.workers = max(1, int(workers))
+        self.mark_ids = mark_ids
+        self.max_attempts = max_attempts
+
+    def poll(self, sources):
+        """List the sources and return one listing per source.
+
+        A listing is {'url', 'kind', 'new', 'seen_ids', 'attempts'}: `new`
+        holds the unseen videos, oldest first, after the earlier failures
+        being retried; `seen_ids` and `attempts` are what advance() stores
+        once they have been processed.
+        """
+        kinds = {}
+        for source in sources:
+            parsed = parse_source(source)
+            if parsed is None:
+                print(f"Not a playlist or channel URL, skipping: {source.strip()}")
+                continue
+            kind, url = parsed
+            kinds[url] = kind
+
+        marks = self.db_handler.sync_sources(kinds)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            listings = list(executor.map(
+                lambda url: self._list(url, kinds[url], marks.get(url) or {}), kinds
+            ))
+
+        # One lookup for every listed video
+        done = self.db_handler.existing_ids(
+            entry['id'] for listing in listings for entry in listing['entries']
+        )
+        for listing in listings:
+            # Failed videos processed since, e.g. through another source, are no longer owed
+            attempts = {video_id: count for video_id, count in listing['attempts'].items() if video_id not in done}
+            listing['attempts'] = attempts
+            new = [entry for entry in listing.pop('entries')
+                   if entry['id'] not in done and attempts.get(entry['id'], 0) < self.max_attempts]
+            listing['new'] = list({entry['id']: entry for entry in new}.values())
+        return listings
+
+    def _list(self, url, kind, mark):
+        """A source's retried and newly listed entries, and the IDs to store as its mark."""
+        seen_ids = mark.get('seen_ids') or []
+        attempts = mark.get('attempts') or {}
+        # Videos that failed before come first, whatever the listing finds
+        retries = [{'id': video_id, 'url': f"https://www.youtube.com/watch?v={video_id}", 'title': None}
+                   for video_id, count in attempts.items() if count < self.max_attempts]
+        listing = {'url': url, 'kind': kind, 'entries': retries, 'seen_ids': seen_ids, 'attempts': attempts}
+        try:
+            with metrics.time('sync_list', source=url):
+                if kind == 'channel':
+                    entries, top = self._list_channel(url, set(seen_ids))
+                else:
+                    entries, top = self._list_playlist(url, set(seen_ids))
+        except Exception as e:
+            # The mark stays; the retries still run
+            print(f"Error listing {url}: {str(e)}")
+            return listing
+        listing['entries'] = retries + entries
+        listing['seen_ids'] = list(dict.fromkeys(top + seen_ids))[:self.mark_ids]
+        return listing
+
+    def _list_channel(self, url, seen):
+        limit = self.max_scan if seen else self.initial_limit
+        entries = []
+        reached = not seen
+        for entry in self.yt_extractor.iter_source(url):
+            if entry['id'] in seen:
+                reached = True
+                break
+            entries.append(entry)
+            if limit and len(entries) >= limit:
+                break
+        if not reached:
+            # Every marked video may have been removed; older unseen uploads are left out
+            print(f"{url}: last synced videos not found in the newest {len(entries)} uploads")
+        top = [entry['id'] for entry in entries]
+        # Uploads are listed newest first; process them in upload order
+        entries.reverse()
+        return entries, top
+
+    def _list_playlist(self, url, seen):
+        listing = islice(self.yt_extractor.iter_source(url), self.max_scan)
+        entries = []
+        for entry in listing:
+            if entry['id'] not in seen:
+                entries.append(entry)
+                continue
+            if entries:
+                # Videos were added at the top: the rest was listed before
+                top = [entry['id'] for entry in entries]
+                entries.reverse()
+                return entries, top
+            # The top is unchanged, so anything new was appended further down;
+            # existing_ids drops what was already processed
+            entries = [entry, *listing]
+            break
+        return entries, [entry['id'] for entry in entries[:self.mark_ids]]
+
+    def advance(self, listing, failed=(), unfinished=()):
+        """Store a source's mark and the attempts of the videos it still owes.
+
+        `failed` and `unfinished` hold video URLs. Processed videos are
+        dropped; failed ones count one more attempt and are retried by the
+        next syncs until max_attempts; unfinished ones (cancelled, waiting
+        for budget or a batch, or not reached) are retried without counting.
+        """
+        attempts = dict(listing['attempts'])
+        for entry in listing['new']:
+            video_id = entry['id']
+            if entry['url'] in failed:
+                attempts[video_id] = attempts.get(video_id, 0) + 1
+                if attempts[video_id] >= self.max_attempts:
+                    print(f"Giving up on {video_id} after {attempts[video_id]} failed syncs")
+            elif entry['url'] in unfinished:
+                attempts.setdefault(video_id, 0)
+            else:
+                attempts.pop(video_id, None)
+        self.db_handler.save_sync_source(listing['url'], listing['kind'], listing['seen_ids'], attempts)
@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+import pytest
+
+# The database engine is created when src.database.models is first imported,
+# so point it at a scratch database before any test module loads the project
+os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp(prefix='yt-tests-')}/videos.db"
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+class WordEncoding:
+    """Counts words as tokens, so the tests need no tokenizer download."""
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+@pytest.fixture
+def word_encoding():
+    return WordEncoding()
@@ -0,0 +1,59 @@
+import random
+import sys
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.analyzers.alignment import align_transcripts, disagreements
+
+SECONDS_PER_WORD = 0.4
+
+def _segments(words, start, auto):
+    """Ten-word segments in the shape of auto (duration) or Whisper (end) transcripts."""
+    segments = []
+    for n in range(0, len(words), 10):
+        chunk = words[n:n + 10]
+        begin = start + n * SECONDS_PER_WORD
+        length = len(chunk) * SECONDS_PER_WORD
+        segment = {'text': " ".join(chunk), 'start': begin}
+        segment.update({'duration': length} if auto else {'end': begin + length})
+        segments.append(segment)
+    return segments
+
+def _agreed_words(units):
+    return sum(len(unit['text'].split()) for unit in units if unit['agree'])
+
+def _body(words, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"word{n}" for n in range(5000)]
+    return [rng.choice(vocabulary) for _ in range(words)]
+
+def test_long_whisper_only_stretch_stays_in_step():
+    body, extra = _body(3000), _body(600, seed=1)
+    cut = 1200
+    # The captions skip a 600-word section Whisper heard, but keep real times after it
+    auto = _segments(body[:cut], 0, True) + _segments(body[cut:], (cut + 600) * SECONDS_PER_WORD, True)
+    whisper = _segments(body[:cut] + extra + body[cut:], 0, False)
+
+    units = align_transcripts(auto, whisper)
+
+    assert _agreed_words(units) == 3000
+    disputed = disagreements(units)
+    assert len(disputed) == 1
+    assert disputed[0]['auto'] == ""
+    assert disputed[0]['whisper'] == " ".join(extra)
+
+def test_long_caption_only_stretch_stays_in_step():
+    body, extra = _body(3000), _body(600, seed=1)
+    cut = 1200
+    auto = _segments(body[:cut] + extra + body[cut:], 0, True)
+    whisper = _segments(body[:cut], 0, False) + _segments(body[cut:], (cut + 600) * SECONDS_PER_WORD, False)
+
+    units = align_transcripts(auto, whisper)
+
+    assert _agreed_words(units) == 3000
+    disputed = disagreements(units)
+    assert len(disputed) == 1
+    assert disputed[0]['auto'] == " ".join(extra)
+    assert disputed[0]['whisper'] == ""
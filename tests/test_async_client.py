@@ -0,0 +1,133 @@
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from src.analyzers.async_client import AsyncLLMClient
+from src.analyzers.llm_stub_server import StubLLM, _make_handler
+
+REQUEST = {
+    'model': "gpt-4o-mini",
+    'messages': [
+        {'role': "system", 'content': "Correct the transcript."},
+        {'role': "user", 'content': "Section Auto: hello there world Whisper: hello their world"}
+    ]
+}
+
+class FlakyStub(StubLLM):
+    """Answers the first `failures` requests with a server error, then normally."""
+
+    def __init__(self, failures, **options):
+        self.failures = failures
+        super().__init__(latency=0.01, **options)
+
+    @property
+    def error_rate(self):
+        with self._lock:
+            self.failures -= 1
+            return 1.0 if self.failures >= 0 else 0.0
+
+    @error_rate.setter
+    def error_rate(self, value):
+        pass
+
+class RateLimitedStub(StubLLM):
+    """Rejects the first request with a 429 asking for a `retry_after` second wait."""
+
+    def __init__(self, retry_after=1):
+        super().__init__(latency=0.01)
+        self.retry_after = retry_after
+        self.rejected = False
+
+    def admit(self, tokens):
+        accepted, headers = super().admit(tokens)
+        if not self.rejected:
+            self.rejected = True
+            headers.update({'retry-after': str(self.retry_after),
+                            'x-ratelimit-remaining-requests': '0',
+                            'x-ratelimit-reset-requests': f"{self.retry_after}s"})
+            return False, headers
+        return accepted, headers
+
+@pytest.fixture
+def serve():
+    servers, clients = [], []
+
+    def start(stub, **options):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(stub))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        client = AsyncLLMClient(api_key="stub", base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                                backoff_base=0.01, backoff_max=0.05, **options)
+        clients.append(client)
+        return client
+
+    yield start
+    for client in clients:
+        client.close()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_server_errors_are_retried(serve):
+    stub = FlakyStub(failures=2)
+    client = serve(stub, max_retries=3)
+
+    completion = client.run(client.complete(**REQUEST))
+
+    assert "Corrected Transcript" in completion.choices[0].message.content
+    assert client.retries == 2
+    assert stub.counts['errors'] == 2 and stub.counts['ok'] == 1
+
+def test_tokens_are_taken_once_per_request(serve):
+    client = serve(FlakyStub(failures=2), max_retries=3, tokens_per_minute=100000)
+
+    completion = client.run(client.complete(estimated_tokens=10000, **REQUEST))
+
+    # Three attempts, but only the completion's real usage is gone from the bucket
+    level = client.bucket.level['tokens']
+    assert level >= 100000 - completion.usage.total_tokens - 1
+
+def test_failed_request_returns_its_tokens(serve):
+    from openai import APIStatusError
+    client = serve(FlakyStub(failures=10), max_retries=1, tokens_per_minute=100000)
+
+    with pytest.raises(APIStatusError):
+        client.run(client.complete(estimated_tokens=10000, **REQUEST))
+
+    assert client.bucket.level['tokens'] >= 100000 - 1
+
+def test_rate_limit_pauses_for_retry_after(serve):
+    client = serve(RateLimitedStub(retry_after=1), max_retries=2)
+    start = time.monotonic()
+
+    client.run(client.complete(**REQUEST))
+
+    assert time.monotonic() - start >= 1
+    assert client.retries == 1
+    # The 429 held back every request, not just the one that got it
+    assert client.bucket.blocked_until >= start + 1
+
+def test_stream_callbacks_run_off_the_event_loop(serve):
+    client = serve(StubLLM(latency=0.01))
+    received, threads = [], set()
+
+    def on_delta(delta):
+        threads.add(threading.current_thread().name)
+        time.sleep(0.01)
+        received.append(delta)
+
+    content, usage = client.run(client.stream(on_delta, **REQUEST))
+
+    assert "".join(received) == content
+    assert usage is not None
+    assert threads and client._thread.name not in threads
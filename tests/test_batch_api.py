@@ -0,0 +1,171 @@
+import json
+import sys
+import threading
+import uuid
+from functools import partial
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+pytest.importorskip("openai")
+pytest.importorskip("sqlalchemy")
+
+from src.analyzers import batch_api
+from src.analyzers.batch_api import BatchRunner, BATCH_API_PRICE_FACTOR
+from src.analyzers.budget import TokenBudget
+from src.analyzers.llm_stub_server import StubLLM, _make_handler
+from src.analyzers.response_cache import ResponseCache
+from src.analyzers.transcript_analyzer import MODEL
+from src.database.db_handler import DatabaseHandler
+
+@pytest.fixture
+def stub():
+    stub = StubLLM(latency=0, batch_delay=0)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub.base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def runner(stub, tmp_path):
+    from openai import OpenAI
+    db_handler = DatabaseHandler()
+    budget = TokenBudget(run_id=uuid.uuid4().hex[:12], video_tokens=None, minute_tokens=None,
+                         video_cost=None, policy='skip', db_handler=db_handler)
+    cache = ResponseCache(tmp_path / 'llm_cache.db')
+    runner = BatchRunner(cache, budget, db_handler, MODEL, poll_interval=0.01,
+                         batch_dir=tmp_path / 'batches', client=OpenAI(api_key="stub", base_url=stub.base_url))
+    yield runner
+    cache.close()
+    db_handler.close()
+
+def _requests(runner, count, words=10):
+    """Collected requests in BatchCollector's shape, each with a live reservation."""
+    requests = {}
+    for n in range(count):
+        body = {'model': MODEL, 'messages': [
+            {'role': "system", 'content': "Correct the transcript."},
+            {'role': "user", 'content': f"Section Auto: {' '.join(['word'] * words)} request {n}"}
+        ]}
+        reservation = runner.budget.reserve(MODEL, f"video{n:06d}", 'correction', words + 8, 100)
+        requests[f"key-{uuid.uuid4().hex}"] = {'body': body, 'reservation': reservation}
+    return requests
+
+def _output_line(custom_id, status_code=200, content="Corrected", prompt_tokens=30, completion_tokens=10):
+    body = {'choices': [{'message': {'role': "assistant", 'content': content}}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens}}
+    if status_code != 200:
+        body = {'error': {'message': "server error"}}
+    return json.dumps({'custom_id': custom_id, 'response': {'status_code': status_code, 'body': body}})
+
+def test_write_files_splits_at_the_request_limit(runner, monkeypatch):
+    monkeypatch.setattr(batch_api, 'BATCH_API_MAX_REQUESTS', 2)
+    requests = _requests(runner, 5)
+
+    files = runner.write_files(requests)
+
+    assert [len(reservations) for _, reservations in files] == [2, 2, 1]
+    for path, reservations in files:
+        ids = [json.loads(line)['custom_id'] for line in path.read_text(encoding='utf-8').splitlines()]
+        assert ids == list(reservations)
+        assert all(reservations[key] == requests[key]['reservation'] for key in ids)
+    for request in requests.values():
+        runner.budget.release(request['reservation'])
+
+def test_write_files_splits_at_the_size_limit(runner, monkeypatch):
+    requests = _requests(runner, 4)
+    (path, _), = runner.write_files(requests)
+    line_size = max(len(line) for line in path.read_bytes().splitlines(keepends=True))
+    # Room for two lines per file, not three
+    monkeypatch.setattr(batch_api, 'BATCH_API_MAX_BYTES', int(line_size * 2.5))
+
+    files = runner.write_files(requests)
+
+    assert [len(reservations) for _, reservations in files] == [2, 2]
+    assert all(path.stat().st_size <= line_size * 2.5 for path, _ in files)
+    for request in requests.values():
+        runner.budget.release(request['reservation'])
+
+def test_ingest_stores_answers_and_settles_at_the_batch_price(runner, stub):
+    requests = _requests(runner, 2)
+    keys = list(requests)
+    reservations = {key: request['reservation'] for key, request in requests.items()}
+    lines = [_output_line(key, content=f"Answer {key}") for key in keys]
+    output = stub.add_file("\n".join(lines).encode(), 'batch_output')
+    batch = SimpleNamespace(id=f"batch_{uuid.uuid4().hex}", status='completed', output_file_id=output['id'])
+    runner.db_handler.save_llm_batch(batch.id, reservations)
+
+    stored = runner.ingest(batch, dict(reservations))
+
+    assert stored == 2
+    for key in keys:
+        assert runner.cache.get(key) == {'content': f"Answer {key}", 'tokens_used': 40}
+    spent = runner.budget.spent()
+    assert spent['run_tokens'] == 80
+    assert spent['run_cost'] == pytest.approx(2 * runner.budget.cost(MODEL, 30, 10) * BATCH_API_PRICE_FACTOR)
+    assert batch.id not in runner.db_handler.pending_llm_batches()
+
+def test_ingest_releases_failed_and_missing_requests(runner, stub):
+    requests = _requests(runner, 3)
+    answered, failed, missing = requests
+    output = stub.add_file(
+        (_output_line(answered) + "\n" + _output_line(failed, status_code=500)).encode(), 'batch_output'
+    )
+    batch = SimpleNamespace(id=f"batch_{uuid.uuid4().hex}", status='completed', output_file_id=output['id'])
+
+    stored = runner.ingest(batch, {key: request['reservation'] for key, request in requests.items()})
+
+    assert stored == 1
+    assert runner.cache.get(failed) is None and runner.cache.get(missing) is None
+    # Only the answered request is still charged; the others were given back
+    assert runner.budget.spent()['run_tokens'] == 40
+    assert runner.budget.spent(video_id="video000001")['video_tokens'] == 0
+
+def test_resume_ingests_batches_submitted_by_an_earlier_run(runner, stub):
+    requests = _requests(runner, 3)
+    batch_ids = runner.submit(requests)
+    assert set(batch_ids) <= set(runner.db_handler.pending_llm_batches())
+
+    # A new run (new runner, same database) picks the batches up
+    resumed = BatchRunner(runner.cache, runner.budget, runner.db_handler, MODEL, poll_interval=0.01,
+                          batch_dir=runner.batch_dir, client=runner.client)
+    resumed.resume()
+
+    assert not set(batch_ids) & set(runner.db_handler.pending_llm_batches())
+    assert all(runner.cache.get(key) is not None for key in requests)
+    assert stub.counts['batched'] == 3
+
+def test_batch_api_rounds_correct_analyze_and_save(runner, stub, tmp_path, monkeypatch, word_encoding):
+    from benchmarks.pipeline import FakeYouTubeExtractor, synthetic_video
+    from src import main
+    # Reports are written to OUTPUT_DIR, relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, 'BatchRunner', partial(BatchRunner, batch_dir=runner.batch_dir, client=runner.client))
+    videos = [synthetic_video(f"batch{n:06d}", 1) for n in range(2)]
+    analyzer = main.YouTubeAnalyzer(interactive=False, use_cache=False, whisper_server=None,
+                                    budget=runner.budget, async_llm=False, trace_path=None, metrics_port=None)
+    analyzer.yt_extractor = FakeYouTubeExtractor(videos, latency=0)
+    analyzer.analyzer._encoding = word_encoding
+    analyzer.analyzer.cache = runner.cache
+    try:
+        results = analyzer.analyze_batch_api(
+            [f"https://www.youtube.com/watch?v={video['id']}" for video in videos], poll_interval=0.01
+        )
+    finally:
+        analyzer.analyzer.cache = None
+        analyzer.close()
+
+    assert sorted(job['video_id'] for job in results['completed']) == [video['id'] for video in videos]
+    assert not results['waiting'] and not results['failed']
+    # One correction and one analysis request per video, each answered through a batch
+    assert stub.counts['batched'] == 4 and stub.counts['ok'] == 0
+    assert all((tmp_path / 'output' / video['id']).is_dir() for video in videos)
+    assert analyzer.db_handler.existing_ids(video['id'] for video in videos) == {video['id'] for video in videos}
@@ -0,0 +1,196 @@
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+pytest.importorskip("sqlalchemy")
+
+from src.analyzers.budget import TokenBudget, BudgetExceeded, BudgetDeferred
+
+MODEL = "gpt-4-1106-preview"
+SYSTEM_PROMPT = "Correct the transcript."
+
+def _budget(**limits):
+    options = {'video_tokens': None, 'run_tokens': None, 'minute_tokens': None,
+               'video_cost': None, 'run_cost': None, 'policy': 'skip'}
+    options.update(limits)
+    return TokenBudget(run_id=uuid.uuid4().hex[:12], **options)
+
+def _words(count):
+    return " ".join(f"word{n}" for n in range(count))
+
+def _age_spend(seconds, spend_id=None):
+    """Move recorded calls `seconds` into the past, out of the per-minute window if 60 or more."""
+    from src.database.models import SessionFactory, TokenSpend
+    with SessionFactory() as session:
+        rows = session.query(TokenSpend)
+        if spend_id is not None:
+            rows = rows.filter_by(id=spend_id)
+        rows.update({'created_at': TokenSpend.created_at - seconds})
+        session.commit()
+
+class NeverAgreesDatabase:
+    """Rejects every reservation while its totals show room for it."""
+
+    def reserve_spend(self, *args, **kwargs):
+        return None
+
+    def spend_totals(self, run_id, video_id=None):
+        return {'video_tokens': 0, 'video_cost': 0.0, 'run_tokens': 0, 'run_cost': 0.0}
+
+def test_concurrent_reservations_never_overshoot():
+    budget = _budget(video_tokens=1000)
+    videos = [f"video{n}" for n in range(4)]
+
+    def reserve(n):
+        try:
+            budget.reserve(MODEL, videos[n % len(videos)], 'correction', 300, 100)
+            return videos[n % len(videos)]
+        except BudgetExceeded:
+            return None
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        admitted = Counter(video for video in executor.map(reserve, range(40)) if video)
+
+    assert admitted == {video: 2 for video in videos}
+    assert all(budget.spent(video)['video_tokens'] == 800 for video in videos)
+
+def test_settle_and_release_adjust_the_totals():
+    budget = _budget()
+    settled = budget.reserve(MODEL, "video", 'correction', 300, 100)
+    released = budget.reserve(MODEL, "video", 'analysis', 300, 100)
+    assert budget.spent("video")['video_tokens'] == 800
+
+    budget.settle(settled, MODEL, 250, 50)
+    budget.release(released)
+
+    spent = budget.spent("video")
+    assert spent['video_tokens'] == 300
+    assert spent['video_cost'] == pytest.approx(budget.cost(MODEL, 250, 50))
+    assert spent['run_tokens'] == 300
+
+def test_full_minute_window_is_waited_out():
+    budget = _budget(minute_tokens=500)
+    # The window spans every run in the database; only this test's calls count
+    _age_spend(60)
+    first = budget.reserve(MODEL, "video", 'correction', 300, 100)
+    # About to age out of the window
+    _age_spend(59.5, first)
+
+    start = time.monotonic()
+    second = budget.reserve(MODEL, "video", 'correction', 300, 100)
+
+    assert second is not None
+    assert time.monotonic() - start >= 0.5
+
+def test_minute_window_gives_up_after_max_wait():
+    budget = _budget(minute_tokens=500)
+    budget.max_wait = 0
+    _age_spend(60)
+    budget.reserve(MODEL, "video", 'correction', 300, 100)
+
+    with pytest.raises(BudgetExceeded) as raised:
+        budget.reserve(MODEL, "video", 'correction', 300, 100)
+    assert raised.value.limit == 'minute_tokens'
+
+def test_reserve_stops_retrying_at_the_deadline():
+    budget = TokenBudget(run_id="never", video_tokens=1000, minute_tokens=None, video_cost=None,
+                         policy='defer', db_handler=NeverAgreesDatabase(), max_wait=0.3)
+    start = time.monotonic()
+
+    with pytest.raises(BudgetDeferred):
+        budget.reserve(MODEL, "video", 'correction', 300, 100)
+    assert time.monotonic() - start < 5
+
+@pytest.fixture
+def stub_llm():
+    pytest.importorskip("openai")
+    pytest.importorskip("httpx")
+    from src.analyzers.async_client import AsyncLLMClient
+    from src.analyzers.llm_stub_server import StubLLM, _make_handler
+
+    class RecordingStub(StubLLM):
+        def respond(self, request):
+            self.requests.append(request)
+            return super().respond(request)
+
+    stub = RecordingStub(latency=0, tokens_per_minute=10 ** 9)
+    stub.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub.client = AsyncLLMClient(api_key="stub", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+    yield stub
+    stub.client.close()
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def make_analyzer(word_encoding, stub_llm):
+    from src.analyzers.transcript_analyzer import TranscriptAnalyzer
+    analyzers = []
+
+    def make(policy, **limits):
+        analyzer = TranscriptAnalyzer(interactive=False, use_cache=False, async_llm=False,
+                                      budget=_budget(policy=policy, **limits))
+        analyzer._encoding = word_encoding
+        analyzer.llm = stub_llm.client
+        analyzers.append(analyzer)
+        return analyzer
+
+    yield make
+    for analyzer in analyzers:
+        analyzer.llm = None
+        analyzer.close()
+
+@pytest.mark.parametrize('policy, error', [('skip', BudgetExceeded), ('defer', BudgetDeferred)])
+def test_skip_and_defer_raise_without_calling(make_analyzer, stub_llm, policy, error):
+    analyzer = make_analyzer(policy, video_tokens=500)
+
+    with pytest.raises(error) as raised:
+        analyzer._chat_completion(SYSTEM_PROMPT, _words(1000), confirm=False, video_id="video")
+
+    assert raised.type is error
+    assert not stub_llm.requests
+    assert analyzer.budget.spent("video")['video_tokens'] == 0
+
+def test_truncate_shortens_the_prompt_to_fit(make_analyzer, stub_llm):
+    analyzer = make_analyzer('truncate', video_tokens=600)
+    prompt = _words(1000)
+
+    completion = analyzer._chat_completion(SYSTEM_PROMPT, prompt, confirm=False, video_id="video")
+
+    assert completion is not None
+    sent = stub_llm.requests[0]['messages'][-1]['content']
+    assert prompt.startswith(sent)
+    assert 100 <= len(sent.split()) <= 300 - len(SYSTEM_PROMPT.split())
+
+def test_chunk_falls_back_to_chunked_correction(make_analyzer, stub_llm, monkeypatch):
+    analyzer = make_analyzer('chunk', video_tokens=500)
+    chunked = []
+    compare_in_chunks = analyzer._compare_in_chunks
+
+    def spy(*args):
+        chunked.append(args)
+        return compare_in_chunks(*args)
+
+    monkeypatch.setattr(analyzer, '_compare_in_chunks', spy)
+    words = _words(400).split()
+    transcript = [{'text': " ".join(words[n:n + 10]), 'start': n * 0.4, 'duration': 4.0}
+                  for n in range(0, len(words), 10)]
+
+    result = analyzer.compare_transcripts(transcript, None, video_id="video")
+
+    assert chunked
+    # The budget covers no window, so the text is kept uncorrected and marked partial
+    assert result['partial']
+    assert " ".join(words) in " ".join(result['text'].split())
+    assert not stub_llm.requests
@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+pytest.importorskip("sqlalchemy")
+
+from benchmarks.pipeline import FakeYouTubeExtractor, synthetic_video
+
+PLAYLIST = "https://www.youtube.com/playlist?list=PL{}"
+
+class FakeSourceExtractor(FakeYouTubeExtractor):
+    """Lists every fixture as the playlist's contents."""
+
+    def iter_source(self, url):
+        for video_id in self.videos:
+            yield {'id': video_id, 'url': f"https://www.youtube.com/watch?v={video_id}", 'title': None}
+
+def _analyzer(videos, policy, encoding):
+    from src.main import YouTubeAnalyzer
+    from src.analyzers.budget import TokenBudget
+    budget = TokenBudget(video_tokens=50, minute_tokens=None, video_cost=None, policy=policy)
+    analyzer = YouTubeAnalyzer(interactive=False, use_cache=False, whisper_server=None,
+                               budget=budget, async_llm=False, trace_path=None, metrics_port=None)
+    analyzer.yt_extractor = FakeSourceExtractor(videos, latency=0)
+    analyzer.analyzer._encoding = encoding
+    return analyzer
+
+def test_deferred_video_is_retried_without_counting_an_attempt(word_encoding):
+    video = synthetic_video("defer000001", 1)
+    playlist = PLAYLIST.format("deferred")
+    analyzer = _analyzer([video], 'defer', word_encoding)
+    try:
+        totals = analyzer.sync([playlist])
+        marks = analyzer.db_handler.sync_sources([playlist])
+    finally:
+        analyzer.close()
+
+    assert totals['deferred'] == 1 and totals['failed'] == 0
+    assert marks[playlist]['attempts'] == {video['id']: 0}
+
+def test_failed_video_counts_an_attempt(word_encoding):
+    video = synthetic_video("skip0000001", 1)
+    playlist = PLAYLIST.format("skipped")
+    analyzer = _analyzer([video], 'skip', word_encoding)
+    try:
+        totals = analyzer.sync([playlist])
+        marks = analyzer.db_handler.sync_sources([playlist])
+    finally:
+        analyzer.close()
+
+    assert totals['failed'] == 1 and totals['deferred'] == 0
+    assert marks[playlist]['attempts'] == {video['id']: 1}